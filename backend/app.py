@@ -1,172 +1,487 @@
-from flask import Flask, Response, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-import cv2
+from flask_sock import Sock
 import numpy as np
 from sign_detector import SignLanguageDetector
+from detector_pool import DetectorPool, PoolExhausted
+from inference_workers import InferenceWorkerPool
+from frame_capture import FrameCapture
 from sign_classifier import SignClassifier
+from profile_cache import ClassifierCache
+from prediction_smoother import PredictionSmoother
+from motion_gate import MotionGate, SkipCounter
+from client_registry import ClientRegistry
+from sequence_matcher import SequenceBuffer
+from image_codec import decode_data_url, decode_image_bytes, decode_raw_rgb
+from stream_session import StreamSession
+from metrics import Registry
+from micro_batch import MicroBatchScheduler
+from request_profiler import RequestProfiler
+import contextlib
 import json
-import base64
 import logging
 import os
+import threading
+import time
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize detector and classifier
-detector = SignLanguageDetector()
-classifier = SignClassifier()
+# Request and per-stage metrics, served by /metrics
+metrics = Registry()
+request_seconds = metrics.histogram(
+    'signbuddy_request_seconds', 'Request latency by endpoint', labels=('endpoint',))
+stage_seconds = metrics.histogram(
+    'signbuddy_stage_seconds', 'Time spent in each processing stage', labels=('stage',))
+frames_total = metrics.counter('signbuddy_frames_total', 'Frames submitted for detection')
+frames_with_hands_total = metrics.counter('signbuddy_frames_with_hands_total', 'Frames in which a hand was found')
+detection_queue_depth = metrics.histogram(
+    'signbuddy_detection_queue_depth', 'Detections already in progress when a frame arrives',
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+classify_batch_size = metrics.histogram(
+    'signbuddy_classify_batch_size', 'Requests classified together in one batch',
+    buckets=(1, 2, 4, 8, 16, 32, 64))
+classify_queue_wait_seconds = metrics.histogram(
+    'signbuddy_classify_queue_wait_seconds', 'Time a request waited for its classification batch to start')
 
-def generate_frames():
+# Sampled cProfile profiling of requests, listed by /debug/profiles. With
+# PROFILE_ON_DEMAND=1 a request can also ask for it with X-Debug-Profile: 1.
+profiler = RequestProfiler(sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)))
+PROFILE_ON_DEMAND = os.environ.get('PROFILE_ON_DEMAND') == '1'
+
+# Hands MediaPipe looks for unless a request or session asks for fewer (or more)
+DEFAULT_MAX_HANDS = int(os.environ.get('DETECTOR_MAX_HANDS', 2))
+MAX_HANDS_LIMIT = 4
+
+def make_detector(max_num_hands=DEFAULT_MAX_HANDS):
+    return SignLanguageDetector(max_num_hands=max_num_hands)
+
+# Debouncing of streamed predictions: a letter becomes stable after
+# SMOOTHING_ENTER_VOTES of the last SMOOTHING_WINDOW frames
+smoother_options = {
+    'window': int(os.environ.get('SMOOTHING_WINDOW', 8)),
+    'enter_votes': int(os.environ.get('SMOOTHING_ENTER_VOTES', 5)),
+    'exit_votes': int(os.environ.get('SMOOTHING_EXIT_VOTES', 3)),
+    'alpha': float(os.environ.get('SMOOTHING_ALPHA', 0.3))
+}
+
+# Skip detection and classification while the frame or hand stays still
+motion_gate_options = {
+    'frame_threshold': float(os.environ.get('MOTION_FRAME_THRESHOLD', 6.0)),
+    'landmark_threshold': float(os.environ.get('MOTION_LANDMARK_THRESHOLD', 0.02)),
+    'totals': SkipCounter()
+}
+
+# Landmarks of concurrent requests are classified in shared batches of up
+# to CLASSIFY_BATCH_SIZE requests; CLASSIFY_BATCH_SIZE=1 classifies each
+# request on its own thread
+def observe_batch(size, waits):
+    classify_batch_size.observe(size)
+    for wait in waits:
+        classify_queue_wait_seconds.observe(wait)
+
+classify_batch_max_size = int(os.environ.get('CLASSIFY_BATCH_SIZE', 32))
+classify_batcher = MicroBatchScheduler(
+    max_batch_size=classify_batch_max_size,
+    max_wait_ms=float(os.environ.get('CLASSIFY_BATCH_WAIT_MS', 0)),
+    on_batch=observe_batch
+) if classify_batch_max_size > 1 else None
+
+def recognize_signs(sign_classifier, landmarks):
+    """Recognize (N, 21, 3) landmarks, batched with concurrent requests when enabled"""
+    if classify_batcher is None:
+        return sign_classifier.recognize_signs(landmarks)
+    return classify_batcher.recognize_signs(sign_classifier, landmarks)
+
+# Polling clients that send a client id get their own smoother and motion gate
+max_clients = int(os.environ.get('SMOOTHING_MAX_CLIENTS', 1024))
+client_smoothers = ClientRegistry(lambda: PredictionSmoother(**smoother_options), max_clients)
+client_gates = ClientRegistry(lambda: MotionGate(**motion_gate_options), max_clients)
+# and their recent landmarks for motion signs
+client_sequences = ClientRegistry(SequenceBuffer, max_clients)
+
+# Nothing below loads a model: detectors are built when first checked out
+# and the classifier when first used, or ahead of traffic by warm_up().
+# MediaPipe detectors keep per-stream tracking state, so concurrent
+# requests each check one out.
+detector_pool = DetectorPool(
+    max_size=int(os.environ.get('DETECTOR_POOL_SIZE', os.cpu_count() or 1)),
+    idle_timeout=float(os.environ.get('DETECTOR_IDLE_TIMEOUT', 300)),
+    checkout_timeout=float(os.environ.get('DETECTOR_CHECKOUT_TIMEOUT', 5)),
+    factory=make_detector
+)
+
+# The shared classifier and per-profile calibrations, loaded on first use
+# and evicted least recently used first. Requests without a profile id use
+# the shared classifier. CLASSIFIER_ENGINE=softmax classifies with a model
+# trained by /train_model where one is saved.
+classifier_engine = os.environ.get('CLASSIFIER_ENGINE', 'nearest')
+classifiers = ClassifierCache(
+    lambda: SignClassifier(stage_timer=stage_seconds.time, engine=classifier_engine),
+    profile_dir=os.environ.get('PROFILE_DIR', 'profiles'),
+    max_profiles=int(os.environ.get('PROFILE_CACHE_SIZE', 64)),
+    max_bytes=int(os.environ.get('PROFILE_CACHE_BYTES', 256 * 1024 * 1024))
+)
+
+def get_classifier():
+    """Return the shared classifier, loading it if needed"""
+    return classifiers.default_classifier
+
+# One background capture thread feeds /video_feed and calibration.
+# CAMERA_SOURCE may be a camera index, a video file or 'synthetic'.
+frame_capture = FrameCapture(
+    os.environ.get('CAMERA_SOURCE', '0'),
+    SignLanguageDetector,
+    get_classifier,
+    idle_timeout=float(os.environ.get('CAMERA_IDLE_TIMEOUT', 5)),
+    jpeg_quality=int(os.environ.get('VIDEO_FEED_QUALITY', 95)),
+    smoother=PredictionSmoother(**smoother_options),
+    motion_gate=MotionGate(landmark_threshold=motion_gate_options['landmark_threshold'], frame_threshold=0)
+)
+
+# Optional pool of worker processes that run hand detection off the request
+# thread. Started on first use so worker processes importing this module
+# don't start pools of their own.
+inference_workers = None
+inference_workers_lock = threading.Lock()
+
+def get_inference_workers():
+    """Return the inference worker pool, or None when detection runs in-process"""
+    global inference_workers
+    num_workers = int(os.environ.get('INFERENCE_WORKERS', 0))
+    if num_workers <= 0:
+        return None
+    with inference_workers_lock:
+        if inference_workers is None:
+            inference_workers = InferenceWorkerPool(
+                num_workers,
+                max_queue_depth=int(os.environ.get('INFERENCE_QUEUE_DEPTH', 2 * num_workers)),
+                max_frame_bytes=int(os.environ.get('INFERENCE_MAX_FRAME_BYTES', 1280 * 720 * 3)),
+                detectors_per_worker=int(os.environ.get('DETECTOR_POOL_SIZE', 4)),
+                idle_timeout=float(os.environ.get('DETECTOR_IDLE_TIMEOUT', 300))
+            )
+        return inference_workers
+
+# Progress of warm_up(), reported by /readyz
+warm_up_state = {'started': None, 'finished': None, 'seconds': None, 'error': None}
+warm_up_lock = threading.Lock()
+
+def warm_up():
+    """Load the classifier and run one detector on a blank frame
+    
+    MediaPipe builds its graph on a detector's first frame, which would
+    otherwise land on the first request. Safe to call more than once; later
+    calls only touch models that are already loaded.
+    """
+    started = time.perf_counter()
+    warm_up_state.update(started=time.strftime('%Y-%m-%dT%H:%M:%S'), error=None)
+    try:
+        get_classifier()
+        blank = np.zeros((240, 320, 3), dtype=np.uint8)
+        workers = get_inference_workers()
+        if workers is not None:
+            workers.detect_all_landmarks(blank, max_num_hands=DEFAULT_MAX_HANDS)
+        else:
+            with detector_pool.checkout(max_num_hands=DEFAULT_MAX_HANDS) as detector:
+                detector.detect_all_landmarks(blank)
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}")
+        warm_up_state['error'] = str(e)
+        raise
+    warm_up_state['seconds'] = time.perf_counter() - started
+    warm_up_state['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    logger.info(f"Models loaded in {warm_up_state['seconds']:.2f}s")
+
+def start_warm_up():
+    """Run warm_up() in a background thread unless it is running or has succeeded"""
+    with warm_up_lock:
+        if warm_up_state['finished'] is not None or (
+                warm_up_state['started'] is not None and warm_up_state['error'] is None):
+            return
+        # Claim the run before the thread starts so concurrent probes don't start another
+        warm_up_state.update(started=time.strftime('%Y-%m-%dT%H:%M:%S'), error=None)
+    threading.Thread(target=warm_up_in_background, name='warm-up', daemon=True).start()
+
+def warm_up_in_background():
+    try:
+        warm_up()
+    except Exception:
+        # Already logged and reported by /readyz, which retries
+        pass
+
+def get_client_id(data=None):
+    """Identify the calling client for detector affinity"""
+    client_id = request.headers.get('X-Client-Id')
+    if client_id is None and isinstance(data, dict):
+        client_id = data.get('client_id')
+    return client_id
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    forced = PROFILE_ON_DEMAND and request.headers.get('X-Debug-Profile') == '1'
+    # WebSocket sessions last as long as the connection, too long to profile
+    g.request_profile = None if request.path.startswith('/ws/') else profiler.start(forced)
+
+@app.after_request
+def finish_request_timing(response):
+    duration = time.perf_counter() - g.request_start
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_seconds.observe(duration, endpoint)
+    if g.get('request_profile') is not None:
+        profiler.finish(g.request_profile, f'{request.method} {request.full_path}', duration)
+        g.request_profile = None
+    return response
+
+def get_max_hands(data=None):
+    """Number of hands to detect, from a 'max_hands' JSON field or ?max_hands= query parameter
+    
+    Raises ValueError, answered with 400, when it is not a whole number.
+    """
+    max_hands = data.get('max_hands') if isinstance(data, dict) else None
+    if max_hands is None:
+        max_hands = request.args.get('max_hands', DEFAULT_MAX_HANDS)
+    try:
+        if isinstance(max_hands, (bool, float)):
+            raise TypeError
+        max_hands = int(max_hands)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid max_hands {max_hands!r}')
+    return min(max(1, max_hands), MAX_HANDS_LIMIT)
+
+def get_profile_id(data=None):
+    """The calling profile, from the X-Profile-Id header, a 'profile_id' JSON field or ?profile="""
+    profile_id = request.headers.get('X-Profile-Id')
+    if profile_id is None and isinstance(data, dict):
+        profile_id = data.get('profile_id')
+    if profile_id is None:
+        profile_id = request.args.get('profile')
+    return profile_id
+
+def get_profile_classifier(data=None):
+    """Return the classifier for the calling profile
+    
+    The profile stays checked out of the cache until the request ends (for
+    /ws/detect, until the connection closes), so it is never evicted while
+    the request is still using or changing it. An invalid profile id raises
+    ValueError, answered with 400, so routes look the profile up before
+    their own error handling.
+    """
+    if 'profile_leases' not in g:
+        g.profile_leases = contextlib.ExitStack()
+    return g.profile_leases.enter_context(classifiers.checkout(get_profile_id(data)))
+
+@app.teardown_request
+def release_profile_classifiers(exc=None):
+    leases = g.pop('profile_leases', None)
+    if leases is not None:
+        leases.close()
+
+@app.errorhandler(ValueError)
+def invalid_request(e):
+    return jsonify({'success': False, 'error': str(e)}), 400
+
+def get_feed_options():
+    """Per-client ?fps=, ?width= and ?quality= of the video and detection feeds"""
+    fps = request.args.get('fps', type=float)
+    width = request.args.get('width', type=int)
+    quality = request.args.get('quality', type=int)
+    return {
+        'fps': fps if fps and fps > 0 else None,
+        'width': max(32, width) if width else None,
+        'quality': min(max(1, quality), 100) if quality else None
+    }
+
+def wait_for_feed_frame(last_seq, last_sent, fps):
+    """Wait out the client's frame interval, then return the newest frame
+    
+    Frames published meanwhile are dropped, so a client that reads slowly
+    or asked for a low frame rate always gets the most recent one.
+    """
+    if fps:
+        time.sleep(max(0.0, last_sent + 1.0 / fps - time.monotonic()))
+    return frame_capture.wait_for_frame(last_seq)
+
+def generate_frames(fps=None, width=None, quality=None):
     logger.info("Client connected to video feed")
-    cap = cv2.VideoCapture(0)
+    last_seq = 0
+    last_sent = 0.0
     
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                logger.error("Failed to capture frame")
-                break
+        # All clients share one capture thread; each just reads its frames
+        with frame_capture.subscription(images=True):
+            while True:
+                captured = wait_for_feed_frame(last_seq, last_sent, fps)
+                if captured is None:
+                    logger.error("Failed to capture frame")
+                    break
+                last_seq = captured.seq
+                jpeg = frame_capture.encode(captured, width, quality)
+                if jpeg is None:
+                    # Processed before this client subscribed, so never annotated
+                    continue
+                last_sent = time.monotonic()
                 
-            # Flip the frame horizontally before detection
-            frame = cv2.flip(frame, 1)
-            
-            # Detect hands and get landmarks
-            frame, landmarks = detector.detect_hands(frame)
-            
-            # Flip the frame for display (after detection)
-            frame = cv2.flip(frame, 1)
-            
-            # Add status text
-            status_text = "No hand detected"
-            detected_sign = None
-            confidence = 0.0
-            
-            if landmarks is not None:
-                status_text = "Hand detected"
-                # Recognize sign
-                sign, conf = classifier.recognize_sign(landmarks)
-                if sign:
-                    detected_sign = sign
-                    confidence = conf
-                    status_text = f"Detected: {sign} ({conf:.2f})"
-                    
-            # Add text to frame
-            cv2.putText(frame, status_text, 
-                        (10, frame.shape[0] - 20),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-            
-            # Convert frame to bytes
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame_bytes = buffer.tobytes()
-            
-            # Yield the frame and detection data
-            data = {
-                'status': status_text,
-                'detected_sign': detected_sign,
-                'confidence': float(confidence) if confidence else 0.0
-            }
-            
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n'
-                   b'X-Detection-Data: ' + json.dumps(data).encode() + b'\r\n\r\n' + 
-                   frame_bytes + b'\r\n')
+                # Yield the frame and detection data
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n'
+                       b'X-Detection-Data: ' + json.dumps(captured.detection).encode() + b'\r\n\r\n' + 
+                       jpeg + b'\r\n')
                    
     except GeneratorExit:
         logger.info("Client disconnected from video feed")
-    finally:
-        logger.info("Releasing camera")
-        cap.release()
+
+def generate_detections(fps=None):
+    logger.info("Client connected to detection feed")
+    last_seq = 0
+    last_sent = 0.0
+    
+    try:
+        # Without image subscribers the capture thread skips annotation and encoding
+        with frame_capture.subscription():
+            while True:
+                captured = wait_for_feed_frame(last_seq, last_sent, fps)
+                if captured is None:
+                    logger.error("Failed to capture frame")
+                    break
+                last_seq = captured.seq
+                last_sent = time.monotonic()
+                yield f'id: {captured.seq}\ndata: {json.dumps(captured.detection)}\n\n'
+                
+    except GeneratorExit:
+        logger.info("Client disconnected from detection feed")
 
 @app.route('/video_feed')
 def video_feed():
+    """MJPEG stream of the annotated camera frames
+    
+    ?fps= caps the frame rate, ?width= scales frames down to that width and
+    ?quality= sets the JPEG quality (1-100). Frames the client is too slow
+    for are dropped rather than queued.
+    """
     logger.info("New video feed request")
-    return Response(generate_frames(),
+    return Response(generate_frames(**get_feed_options()),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/detection_feed')
+def detection_feed():
+    """Server-sent events with each frame's detection data and no images
+    
+    Each event carries the JSON /video_feed sends as X-Detection-Data.
+    ?fps= caps the event rate.
+    """
+    logger.info("New detection feed request")
+    return Response(generate_detections(get_feed_options()['fps']), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/calibrate/<letter>', methods=['POST'])
 def calibrate_letter(letter):
-    cap = cv2.VideoCapture(0)
-    ret, frame = cap.read()
-    cap.release()
+    """Calibrate a letter from the camera
+    
+    With ?frames=N a burst of N frames showing a hand is captured and kept
+    as samples (or prototypes) for the letter instead of a single frame.
+    """
+    profile_classifier = get_profile_classifier()
+    frames = request.args.get('frames', type=int, default=1)
+    if frames > 1:
+        samples = frame_capture.grab_landmarks(frames)
+        if not samples:
+            return jsonify({'success': False, 'error': 'No hand detected'})
+        added = profile_classifier.add_reference_samples(letter, np.stack(samples))
+        if added:
+            return jsonify({'success': True, 'message': f'Calibrated letter {letter} from {added} frames'})
+        return jsonify({'success': False, 'error': 'Failed to add reference sign'})
     
-    if not ret:
+    # Use the shared capture thread's latest frame instead of opening the camera
+    captured = frame_capture.grab()
+    
+    if captured is None:
         return jsonify({'success': False, 'error': 'Failed to capture frame'})
     
-    frame = cv2.flip(frame, 1)
-    frame, landmarks = detector.detect_hands(frame)
+    landmarks = captured.landmarks
     
     if landmarks is None:
         return jsonify({'success': False, 'error': 'No hand detected'})
     
-    if classifier.add_reference_sign(letter, landmarks):
+    if profile_classifier.add_reference_sign(letter, landmarks):
         return jsonify({'success': True, 'message': f'Calibrated letter {letter}'})
     else:
         return jsonify({'success': False, 'error': 'Failed to add reference sign'})
 
+@app.route('/calibrate_motion/<letter>', methods=['POST'])
+def calibrate_motion(letter):
+    """Record a motion sign such as J or Z from the camera
+    
+    Captures ?frames=N consecutive frames showing a hand (default 30) while
+    the sign is performed. Pass ?append=1 to keep the letter's earlier
+    recordings.
+    """
+    profile_classifier = get_profile_classifier()
+    samples = frame_capture.grab_landmarks(request.args.get('frames', type=int, default=30))
+    if not samples:
+        return jsonify({'success': False, 'error': 'No hand detected'})
+    if profile_classifier.add_motion_template(
+            letter, np.stack(samples), replace=not request.args.get('append', type=int, default=0)):
+        return jsonify({'success': True, 'message': f'Recorded motion for letter {letter} from {len(samples)} frames'})
+    return jsonify({'success': False, 'error': 'Failed to add motion template'})
+
+@app.route('/train_model', methods=['POST'])
+def train_model():
+    """Train the softmax engine's model on the profile's reference samples
+    
+    ?hidden=N adds a hidden layer of N units (default: softmax regression).
+    The model is saved with the calibration by /save_calibration.
+    """
+    profile_classifier = get_profile_classifier()
+    try:
+        report = profile_classifier.train_model(hidden_units=request.args.get('hidden', type=int, default=0))
+        return jsonify({'success': True, 'engine': classifier_engine, 'report': report})
+    except Exception as e:
+        logger.error(f"Error in train_model: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
 @app.route('/save_calibration', methods=['POST'])
 def save_calibration():
-    if classifier.save_references():
+    if get_profile_classifier().save_references():
         return jsonify({'success': True, 'message': 'Calibration saved'})
     return jsonify({'success': False, 'error': 'Failed to save calibration'})
 
 @app.route('/save_default', methods=['POST'])
 def save_default():
-    if classifier.save_as_default():
+    """Save the shared calibration as the default that every profile falls back to"""
+    if get_profile_id() is not None:
+        return jsonify({'success': False, 'error': 'Profiles cannot replace the default calibration'}), 403
+    if get_classifier().save_as_default():
         return jsonify({'success': True, 'message': 'Saved as default'})
     return jsonify({'success': False, 'error': 'Failed to save as default'})
 
 @app.route('/reset_default', methods=['POST'])
 def reset_default():
-    if classifier.reset_to_default():
+    if get_profile_classifier().reset_to_default():
         return jsonify({'success': True, 'message': 'Reset to default'})
     return jsonify({'success': False, 'error': 'No default calibration available'})
 
 @app.route('/detect_letter', methods=['POST'])
 def detect_letter():
-    logger.info("Received detect_letter request")
+    logger.debug("Received detect_letter request")
+    data = request.get_json(silent=True)
+    profile_classifier = get_profile_classifier(data)
+    max_num_hands = get_max_hands(data)
     try:
-        # Get image data from request
-        image_data = request.get_json()['image']
-        
-        # Convert base64 image to numpy array
-        encoded_data = image_data.split(',')[1]
-        nparr = np.frombuffer(base64.b64decode(encoded_data), np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Flip the frame horizontally before detection
-        frame = cv2.flip(frame, 1)
-        
-        # Detect hands and get landmarks
-        frame, landmarks = detector.detect_hands(frame)
+        # Convert base64 image to an RGB numpy array
+        with stage_seconds.time('decode'):
+            frame = decode_data_url(data['image'], rgb=True)
         
-        # Flip the frame for display (after detection)
-        frame = cv2.flip(frame, 1)
-        
-        if landmarks is None:
-            logger.info("No hand detected")
-            return jsonify({
-                'success': False,
-                'error': 'No hand detected'
-            })
-        
-        # Recognize sign
-        sign, confidence = classifier.recognize_sign(landmarks)
-        
-        # Ensure consistent uppercase for letter responses
-        if sign:
-            sign = sign.upper()
-            
-        logger.info(f"Detected sign: {sign} with confidence: {confidence}")
-        
-        return jsonify({
-            'success': True,
-            'letter': sign,
-            'confidence': float(confidence) if confidence else 0.0
-        })
+        return jsonify(classify_frame(frame, client_id=get_client_id(data),
+                                      sign_classifier=profile_classifier, max_num_hands=max_num_hands))
         
     except Exception as e:
         logger.error(f"Error in detect_letter: {str(e)}")
@@ -175,58 +490,440 @@ def detect_letter():
             'error': str(e)
         })
 
+def classify_frame(rgb_frame, top_k=None, hand_detector=None, client_id=None, sign_classifier=None,
+                   smoother=None, motion_gate=None, sequence=None, max_num_hands=DEFAULT_MAX_HANDS):
+    """Run headless detection and recognition on an RGB frame and build the JSON response
+    
+    Nothing is drawn and the frame is not flipped: the detector mirrors the
+    landmark coordinates instead, matching the selfie view used elsewhere.
+    Every detected hand is classified in one batch; the response's letter
+    is the most confident hand's and 'hands' lists them all. max_num_hands
+    is ignored when the caller passes its own detector, which was built for
+    a number of hands already.
+    sign_classifier defaults to the shared classifier. The stream's smoother,
+    motion gate and sequence buffer default to the client's own when a
+    client id is given.
+    """
+    sign_classifier = sign_classifier or get_classifier()
+    if client_id is not None:
+        smoother = smoother or client_smoothers.get(client_id)
+        motion_gate = motion_gate or client_gates.get(client_id)
+        sequence = sequence or client_sequences.get(client_id)
+    
+    frames_total.inc()
+    
+    # Reuse the last result while the frame, or else the hands, have not moved,
+    # as long as it came from the same classifier and calibration
+    gate_key = (id(sign_classifier), sign_classifier.revision, top_k, max_num_hands)
+    thumbnail = motion_gate.thumbnail(rgb_frame) if motion_gate is not None else None
+    response = motion_gate.check_frame(thumbnail, key=gate_key) if motion_gate is not None else None
+    if response is None:
+        landmarks, handedness = detect_frame_landmarks(rgb_frame, hand_detector, client_id, max_num_hands)
+        response = motion_gate.check_landmarks(landmarks, key=gate_key) if motion_gate is not None else None
+        if response is None:
+            response = recognize_landmarks(landmarks, handedness, sign_classifier, top_k)
+            if motion_gate is not None:
+                motion_gate.store(landmarks, response, key=gate_key, thumbnail=thumbnail)
+        if sequence is not None:
+            sequence.push(landmarks)
+            response = match_motion(response, sequence, sign_classifier)
+    
+    if response.get('success'):
+        frames_with_hands_total.inc()
+    return add_smoothing(dict(response), smoother, response.get('letter'), response.get('confidence'))
+
+def detect_frame_landmarks(rgb_frame, hand_detector=None, client_id=None, max_num_hands=DEFAULT_MAX_HANDS):
+    """Detect every hand with the caller's detector, a worker process or a pooled detector
+    
+    Returns (H, 21, 3) landmarks and the hands' handedness, or (None, []).
+    """
+    workers = get_inference_workers() if hand_detector is None else None
+    if workers is not None:
+        detection_queue_depth.observe(workers.queue_depth)
+        with stage_seconds.time('detect'):
+            return workers.detect_all_landmarks(rgb_frame, client_id=client_id, max_num_hands=max_num_hands)
+    if hand_detector is not None:
+        # The caller's own detector
+        with stage_seconds.time('detect'):
+            return hand_detector.detect_all_landmarks(rgb_frame)
+    detection_queue_depth.observe(detector_pool.stats()['in_use'])
+    with detector_pool.checkout(client_id, max_num_hands) as detector:
+        with stage_seconds.time('detect'):
+            return detector.detect_all_landmarks(rgb_frame)
+
+def recognize_landmarks(landmarks, handedness, sign_classifier, top_k=None):
+    """Recognize the signs of (H, 21, 3) hand landmarks and build the JSON response"""
+    if landmarks is None:
+        logger.debug("No hand detected")
+        return {
+            'success': False,
+            'error': 'No hand detected'
+        }
+    
+    # Recognize every hand in one batch
+    signs, confidences = recognize_signs(sign_classifier, landmarks)
+    
+    # Ensure consistent uppercase for letter responses
+    hands = [
+        {'letter': sign.upper() if sign else None, 'confidence': float(confidence), 'handedness': hand}
+        for sign, confidence, hand in zip(signs, confidences, handedness)
+    ]
+    best = int(np.argmax(confidences))
+        
+    logger.debug(f"Detected sign: {hands[best]['letter']} with confidence: {hands[best]['confidence']}")
+    
+    response = {
+        'success': True,
+        'letter': hands[best]['letter'],
+        'confidence': hands[best]['confidence'],
+        'handedness': hands[best]['handedness'],
+        'hands': hands
+    }
+    
+    # Optionally include the most confident hand's ranked candidates with their distances
+    if top_k:
+        response['candidates'] = [
+            {'letter': letter.upper(), 'distance': distance}
+            for letter, distance in sign_classifier.rank_signs(landmarks[best], int(top_k))
+        ]
+    
+    return response
+
+def match_motion(response, sequence, sign_classifier):
+    """Report a motion sign instead of the static one when the stream's recent frames match one"""
+    if not sequence.due():
+        return response
+    with stage_seconds.time('motion_match'):
+        match = sign_classifier.recognize_motion(sequence.frames())
+    if match is None:
+        return response
+    # Start over so the same gesture is not reported again
+    sequence.clear()
+    logger.debug(f"Detected motion sign: {match.letter} with confidence: {match.confidence}")
+    return dict(response, success=True, letter=match.letter.upper(), confidence=match.confidence, motion=True)
+
+def add_smoothing(response, smoother, sign, confidence):
+    """Feed a frame's prediction to the stream's smoother and report its stable letter"""
+    if smoother is not None:
+        stable = smoother.update(sign, confidence or 0.0)
+        response['stable_letter'] = stable.letter
+        response['stable_confidence'] = stable.confidence
+        response['emitted_letter'] = stable.emitted
+        # A motion sign is matched once per gesture, so it is emitted right away
+        if response.get('motion'):
+            response['emitted_letter'] = sign
+    return response
+
 @app.route('/api/detect', methods=['POST'])
 def detect_sign():
-    logger.info("Received detect request")
+    logger.debug("Received detect request")
+    data = request.get_json(silent=True)
+    profile_classifier = get_profile_classifier(data)
+    max_num_hands = get_max_hands(data)
     try:
-        # Get image data from request
-        data = request.get_json()
         if not data or 'image' not in data:
             logger.error("No image data provided")
             return jsonify({'success': False, 'error': 'No image data provided'})
             
-        image_data = data['image']
-        
-        # Convert base64 image to numpy array
-        encoded_data = image_data.split(',')[1]
-        nparr = np.frombuffer(base64.b64decode(encoded_data), np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Convert base64 image to an RGB numpy array
+        with stage_seconds.time('decode'):
+            frame = decode_data_url(data['image'], rgb=True)
         
-        # Flip the frame horizontally before detection
-        frame = cv2.flip(frame, 1)
+        return jsonify(classify_frame(frame, top_k=data.get('top_k'), client_id=get_client_id(data),
+                                      sign_classifier=profile_classifier, max_num_hands=max_num_hands))
         
-        # Detect hands and get landmarks
-        frame, landmarks = detector.detect_hands(frame)
+    except Exception as e:
+        logger.error(f"Error in detect_sign: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/detect_frame', methods=['POST'])
+def detect_frame():
+    """Detect a sign from a raw binary frame upload
+    
+    Accepts encoded JPEG/PNG bytes either as the request body
+    (application/octet-stream, image/jpeg, ...) or as the 'image' field of a
+    multipart form. With ?format=rgb&width=W&height=H the body is instead a
+    packed RGB frame of exactly W*H*3 bytes.
+    """
+    logger.debug("Received detect_frame request")
+    profile_classifier = get_profile_classifier()
+    max_num_hands = get_max_hands()
+    try:
+        if request.files:
+            upload = request.files.get('image') or next(iter(request.files.values()))
+            payload = upload.read()
+        else:
+            payload = request.get_data(cache=False)
+            
+        if not payload:
+            logger.error("No image data provided")
+            return jsonify({'success': False, 'error': 'No image data provided'})
+            
+        if request.args.get('format') == 'rgb':
+            width = request.args.get('width', type=int, default=0)
+            height = request.args.get('height', type=int, default=0)
+            with stage_seconds.time('decode'):
+                frame = decode_raw_rgb(payload, width, height)
+            return jsonify(classify_frame(frame, top_k=request.args.get('top_k'), client_id=get_client_id(),
+                                          sign_classifier=profile_classifier, max_num_hands=max_num_hands))
+            
+        with stage_seconds.time('decode'):
+            frame = decode_image_bytes(payload, rgb=True)
+        return jsonify(classify_frame(frame, top_k=request.args.get('top_k'), client_id=get_client_id(),
+                                      sign_classifier=profile_classifier, max_num_hands=max_num_hands))
         
-        if landmarks is None:
-            logger.info("No hand detected")
-            return jsonify({
-                'success': False,
-                'error': 'No hand detected'
-            })
+    except Exception as e:
+        logger.error(f"Error in detect_frame: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@sock.route('/ws/detect')
+def detect_stream(ws):
+    """Continuous recognition over one persistent WebSocket connection
+    
+    Clients send frames as binary JPEG/PNG messages, or as JSON text messages
+    with an 'image' data URL, and receive the /api/detect JSON for each
+    processed frame plus its 'frame' number. Each connection checks a
+    detector out of the pool for as long as it stays open, so MediaPipe
+    tracking carries over between its frames; once every detector is taken,
+    new connections get an error and are closed. With inference workers,
+    the connection's frames all go to the same worker process instead. The
+    profile and number of hands are chosen once, with ?profile= and
+    ?max_hands= on the connection URL.
+    """
+    logger.info("Client connected to detection stream")
+    profile_classifier = get_profile_classifier()
+    max_num_hands = get_max_hands()
+    session = StreamSession(PredictionSmoother(**smoother_options), MotionGate(**motion_gate_options),
+                            SequenceBuffer())
+    try:
+        if get_inference_workers() is not None:
+            serve_stream(ws, session, profile_classifier, max_num_hands=max_num_hands)
+        else:
+            with detector_pool.checkout(session.client_id, max_num_hands) as detector:
+                serve_stream(ws, session, profile_classifier, detector)
+    except PoolExhausted as e:
+        logger.warning(f"Refused detection stream: {str(e)}")
+        ws.send(json.dumps({'success': False, 'error': str(e)}))
+    finally:
+        skips = session.motion_gate.counter.snapshot()
+        logger.info(f"Detection stream closed after {session.frames_received} frames "
+                    f"({session.frames_dropped} dropped, {skips['detections_skipped']} detections "
+                    f"and {skips['classifications_skipped']} classifications skipped)")
+
+def serve_stream(ws, session, sign_classifier, hand_detector=None, max_num_hands=DEFAULT_MAX_HANDS):
+    """Answer a WebSocket session's frames until the client disconnects
+    
+    Without a detector of its own, the session's frames are sent to the
+    inference workers under its client id.
+    """
+    while True:
+        message = session.next_message(ws)
+        if message is None:
+            break
+            
+        try:
+            with stage_seconds.time('decode'):
+                if isinstance(message, (bytes, bytearray)):
+                    frame = decode_image_bytes(message, rgb=True)
+                else:
+                    frame = decode_data_url(json.loads(message)['image'], rgb=True)
+            response = classify_frame(frame, hand_detector=hand_detector, client_id=session.client_id,
+                                      sign_classifier=sign_classifier, smoother=session.smoother,
+                                      motion_gate=session.motion_gate, sequence=session.sequence,
+                                      max_num_hands=max_num_hands)
+        except Exception as e:
+            logger.error(f"Error in detect_stream: {str(e)}")
+            response = {'success': False, 'error': str(e)}
+            
+        response['frame'] = session.frames_received
+        ws.send(json.dumps(response))
+
+def parse_landmark_payload():
+    """Read one or more 21x3 landmark arrays from the request as an (N, 21, 3) array
+    
+    JSON bodies carry a 'landmarks' list of shape (21, 3) or (N, 21, 3).
+    Any other body is read as packed little-endian float32 values, 63 per hand.
+    Coordinates normalized to [0, 1] (as MediaPipe reports them) can be
+    scaled to pixels by passing the frame width and height, which keeps the
+    x/y aspect ratio the references were calibrated with.
+    The server detects hands on mirrored (selfie view) frames, so by default
+    the landmarks are assumed to come from an unmirrored camera frame and
+    their x coordinates are mirrored to match: x becomes width - x, or
+    1 - x without a width. Clients that track a mirrored frame pass
+    mirror=0 (a JSON field or ?mirror= query parameter).
+    """
+    if request.is_json:
+        data = request.get_json()
+        landmarks = np.asarray(data.get('landmarks', []), dtype=np.float32)
+        width = data.get('width')
+        height = data.get('height')
+        mirror = data.get('mirror')
+    else:
+        payload = request.get_data(cache=False)
+        if len(payload) % (63 * 4) != 0:
+            raise ValueError(f'Binary landmark payload must be a multiple of {63 * 4} bytes')
+        landmarks = np.frombuffer(payload, dtype='<f4')
+        width = request.args.get('width', type=float)
+        height = request.args.get('height', type=float)
+        mirror = None
+    if mirror is None:
+        mirror = request.args.get('mirror', type=int, default=1)
         
-        # Recognize sign
-        sign, confidence = classifier.recognize_sign(landmarks)
+    if landmarks.size == 0 or landmarks.size % 63 != 0:
+        raise ValueError('Landmarks must have shape (21, 3) or (N, 21, 3)')
+    landmarks = landmarks.reshape(-1, 21, 3).astype(np.float32)
+    
+    if width and height:
+        landmarks *= np.array([width, height, width], dtype=np.float32)
+    if mirror:
+        landmarks[:, :, 0] = (width if width and height else 1.0) - landmarks[:, :, 0]
+    return landmarks
+
+@app.route('/api/classify_landmarks', methods=['POST'])
+def classify_landmarks():
+    """Recognize signs from landmarks tracked on the client, skipping image upload"""
+    profile_classifier = get_profile_classifier(request.get_json(silent=True))
+    try:
+        landmarks = parse_landmark_payload()
+        signs, confidences = recognize_signs(profile_classifier, landmarks)
         
-        # Ensure consistent uppercase for letter responses
-        if sign:
-            sign = sign.upper()
-            
-        logger.info(f"Detected sign: {sign} with confidence: {confidence}")
+        results = [
+            {'letter': sign.upper() if sign else None, 'confidence': float(confidence)}
+            for sign, confidence in zip(signs, confidences)
+        ]
+        best = results[int(np.argmax(confidences))]
         
         return jsonify({
             'success': True,
-            'letter': sign,
-            'confidence': float(confidence) if confidence else 0.0
+            'letter': best['letter'],
+            'confidence': best['confidence'],
+            'results': results
         })
         
     except Exception as e:
-        logger.error(f"Error in detect_sign: {str(e)}")
+        logger.error(f"Error in classify_landmarks: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/calibrate_landmarks/<letter>', methods=['POST'])
+def calibrate_landmarks(letter):
+    """Calibrate a letter from a burst of landmarks tracked on the client
+    
+    Takes the same payload as /api/classify_landmarks. Pass ?append=1 to add
+    the samples to the letter's existing ones instead of replacing them.
+    """
+    profile_classifier = get_profile_classifier(request.get_json(silent=True))
+    try:
+        landmarks = parse_landmark_payload()
+        added = profile_classifier.add_reference_samples(
+            letter, landmarks, replace=not request.args.get('append', type=int, default=0))
+        if added:
+            return jsonify({'success': True, 'message': f'Calibrated letter {letter} from {added} frames'})
+        return jsonify({'success': False, 'error': 'Failed to add reference sign'})
+        
+    except Exception as e:
+        logger.error(f"Error in calibrate_landmarks: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/calibrate_motion/<letter>', methods=['POST'])
+def calibrate_motion_landmarks(letter):
+    """Record a motion sign from a sequence of landmarks tracked on the client
+    
+    Takes the /api/classify_landmarks payload with the frames in order.
+    Pass ?append=1 to keep the letter's earlier recordings.
+    """
+    profile_classifier = get_profile_classifier(request.get_json(silent=True))
+    try:
+        landmarks = parse_landmark_payload()
+        if profile_classifier.add_motion_template(
+                letter, landmarks, replace=not request.args.get('append', type=int, default=0)):
+            return jsonify({'success': True, 'message': f'Recorded motion for letter {letter} from {len(landmarks)} frames'})
+        return jsonify({'success': False, 'error': 'Failed to add motion template'})
+        
+    except Exception as e:
+        logger.error(f"Error in calibrate_motion_landmarks: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+# Values kept by other components are read when /metrics is scraped
+metrics.gauge('signbuddy_detector_pool_size', 'Detectors in the pool',
+              function=lambda: detector_pool.stats()['size'])
+metrics.gauge('signbuddy_detector_pool_in_use', 'Detectors checked out',
+              function=lambda: detector_pool.stats()['in_use'])
+metrics.gauge('signbuddy_inference_queue_depth', 'Frames queued or in flight in the inference workers',
+              function=lambda: inference_workers.queue_depth if inference_workers is not None else 0)
+metrics.gauge('signbuddy_profiles_loaded', 'Calibration profiles held in memory',
+              function=lambda: classifiers.stats()['profiles'])
+metrics.gauge('signbuddy_profiles_bytes', 'Reference matrix bytes of the loaded profiles',
+              function=lambda: classifiers.stats()['bytes'])
+metrics.counter('signbuddy_motion_gate_skipped_total', 'Stages skipped because the input had not changed',
+                labels=('stage',),
+                function=lambda: {
+                    ('detect',): motion_gate_options['totals'].snapshot()['detections_skipped'],
+                    ('classify',): motion_gate_options['totals'].snapshot()['classifications_skipped']
+                })
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the server is up and answering, models loaded or not"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 200 once warm_up() has loaded the models, else 503
+    
+    A probe that finds the models unloaded starts the warm-up in the
+    background, so the probe alone is enough to get a server ready.
+    """
+    ready = warm_up_state['finished'] is not None
+    if not ready:
+        start_warm_up()
+    return jsonify({
+        'ready': ready,
+        'classifier_loaded': classifiers.default_loaded,
+        'detectors': detector_pool.stats()['size'],
+        'warm_up': warm_up_state
+    }), 200 if ready else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profiles')
+def debug_profiles():
+    """The most recent request profiles, newest last"""
+    return jsonify({'sample_rate': profiler.sample_rate, 'profiles': profiler.recent()})
+
+@app.route('/api/stats')
+def stats():
+    """Pool, profile cache, batching, video feed and motion gating counters"""
+    return jsonify({
+        'detector_pool': detector_pool.stats(),
+        'classify_batching': classify_batcher.stats() if classify_batcher is not None else None,
+        'profiles': classifiers.stats(),
+        'motion_gate': motion_gate_options['totals'].snapshot(),
+        'video_feed': frame_capture.stats(),
+        'video_feed_motion_gate': frame_capture.motion_gate.counter.snapshot()
+    })
+
 if __name__ == '__main__':
+    # The server accepts connections right away; /readyz reports when the
+    # models are loaded
+    if os.environ.get('WARM_UP', '1') == '1':
+        start_warm_up()
     port = int(os.environ.get('PORT', 3001))
     app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
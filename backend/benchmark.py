@@ -0,0 +1,485 @@
+"""Benchmarks for the SignBuddy backend
+
+Usage:
+    python benchmark.py upload [--image PATH] [--repeat N] [--endpoints]
+    python benchmark.py downscale [--video PATH] [--inference-width W]
+    python benchmark.py storage [--repeat N]
+    python benchmark.py record --video PATH --output LANDMARKS.npy
+    python benchmark.py replay [--video PATH] [--landmarks LANDMARKS.npy] [--endpoints]
+                               [--save-baseline FILE] [--baseline FILE]
+    python benchmark.py batching [--concurrency 1,8,32] [--max-wait-ms 0,1]
+
+replay runs recorded video frames and landmark arrays through each stage
+(detection, preprocessing, recognition and optionally the Flask endpoints)
+and reports per-stage latency percentiles, frames per second and peak
+memory. Without --landmarks it uses landmarks synthesized from the
+calibration references. A saved baseline can be compared against later
+runs; the exit code is 1 when a stage's p50 or p95 regressed beyond
+--tolerance.
+
+batching compares classifying each request on its own thread with the
+micro-batch scheduler, at several numbers of concurrent clients.
+"""
+import argparse
+import base64
+import json
+import platform
+import resource
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from image_codec import decode_data_url, decode_image_bytes
+
+
+def synthetic_frame(width=640, height=480):
+    """Build a deterministic, JPEG-unfriendly test frame"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    cv2.circle(frame, (width // 2, height // 2), min(width, height) // 4, (40, 180, 220), -1)
+    return frame
+
+
+def time_call(fn, repeat):
+    """Call fn repeat times and return the per-call durations in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return np.array(durations)
+
+
+def print_timing(name, durations):
+    print(f"  {name:<28} mean {durations.mean():8.3f} ms   "
+          f"p50 {np.percentile(durations, 50):8.3f} ms   p95 {np.percentile(durations, 95):8.3f} ms")
+
+
+def bench_upload(args):
+    """Compare the base64 JSON upload path against the binary upload path"""
+    frame = cv2.imread(args.image) if args.image else synthetic_frame()
+    if frame is None:
+        raise SystemExit(f"Could not read image {args.image}")
+    ok, encoded = cv2.imencode('.jpg', frame)
+    jpeg = encoded.tobytes()
+    body = json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()}).encode()
+
+    def base64_path():
+        return decode_data_url(json.loads(body)['image'])
+
+    def binary_path():
+        return decode_image_bytes(jpeg)
+
+    from_base64 = base64_path()
+    from_binary = binary_path()
+    identical = from_base64.shape == from_binary.shape and np.array_equal(from_base64, from_binary)
+
+    print(f"Frame {frame.shape[1]}x{frame.shape[0]}, {args.repeat} iterations")
+    print(f"  payload: base64 JSON {len(body)} bytes, binary {len(jpeg)} bytes "
+          f"({len(body) / len(jpeg) - 1:+.1%})")
+    print(f"  decoded frames byte-for-byte identical: {identical}")
+    print_timing('decode base64 JSON', time_call(base64_path, args.repeat))
+    print_timing('decode binary', time_call(binary_path, args.repeat))
+
+    if args.endpoints:
+        from app import app
+        client = app.test_client()
+        print_timing('POST /api/detect', time_call(
+            lambda: client.post('/api/detect', data=body, content_type='application/json'),
+            args.repeat))
+        print_timing('POST /api/detect_frame', time_call(
+            lambda: client.post('/api/detect_frame', data=jpeg, content_type='image/jpeg'),
+            args.repeat))
+    return 0 if identical else 1
+
+
+def read_video_frames(path, max_frames=None):
+    """Yield RGB frames from a video file"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video {path}")
+    count = 0
+    try:
+        while max_frames is None or count < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            count += 1
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        cap.release()
+
+
+def bench_downscale(args):
+    """Compare downscaled detection against full-frame detection on a video or synthetic frames
+
+    The detector hands MediaPipe full frames, which it resizes to its models'
+    input size itself. This measures what resizing frames to
+    --inference-width first would trade: the time it saves or costs against
+    the hands it misses and the landmark offset it adds.
+    """
+    from sign_detector import SignLanguageDetector
+
+    if args.video:
+        frames_source = read_video_frames(args.video, args.max_frames)
+    else:
+        # No hand to find, so MediaPipe runs palm detection on every frame
+        frame = cv2.cvtColor(synthetic_frame(args.width, args.height), cv2.COLOR_BGR2RGB)
+        frames_source = (frame for _ in range(args.max_frames or 200))
+
+    baseline = SignLanguageDetector()
+    tuned = SignLanguageDetector()
+    baseline_times, tuned_times, errors = [], [], []
+    baseline_hits = tuned_hits = frames = 0
+
+    for frame in frames_source:
+        frames += 1
+        start = time.perf_counter()
+        expected = baseline.detect_landmarks(frame)
+        baseline_times.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        scale = min(1.0, args.inference_width / width)
+        small = cv2.resize(frame, (round(width * scale), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        actual = tuned.detect_landmarks(small)
+        if actual is not None:
+            # Back to full-frame pixels; z is in units of width like x
+            actual = actual / scale
+        tuned_times.append((time.perf_counter() - start) * 1000)
+
+        baseline_hits += expected is not None
+        tuned_hits += actual is not None
+        if expected is not None and actual is not None:
+            errors.append(np.linalg.norm(expected[:, :2] - actual[:, :2], axis=1).mean())
+
+    if not frames:
+        raise SystemExit("No frames read")
+    print(f"{frames} frames, inference width {args.inference_width}")
+    print_timing('full frame', np.array(baseline_times))
+    print_timing('downscaled', np.array(tuned_times))
+    print(f"  hand detected: full frame {baseline_hits / frames:.1%}, downscaled {tuned_hits / frames:.1%}")
+    if errors:
+        errors = np.array(errors)
+        print(f"  mean landmark offset vs full frame: {errors.mean():.2f} px (p95 {np.percentile(errors, 95):.2f} px)")
+    return 0
+
+
+def bench_storage(args):
+    """Compare load time and size of the JSON + pickle and binary calibration formats"""
+    import os
+    import tempfile
+
+    import calibration_store
+    # Reads the pickled scaler without scikit-learn, as the classifier does
+    from sign_classifier import _LegacyScalerUnpickler
+
+    with open(args.json) as f:
+        references = json.load(f)
+    with open(args.scaler, 'rb') as f:
+        scaler = _LegacyScalerUnpickler(f).load()
+
+    def load_legacy():
+        with open(args.json) as f:
+            loaded = json.load(f)
+        with open(args.scaler, 'rb') as f:
+            _LegacyScalerUnpickler(f).load()
+        return np.asarray(list(loaded.values()), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'references.sbcal')
+        labels = list(references.keys())
+        calibration_store.save(path, labels, [references[label] for label in labels],
+                               scaler.mean_, scaler.scale_)
+        identical = np.array_equal(load_legacy(), calibration_store.load(path).matrix)
+
+        legacy_size = os.path.getsize(args.json) + os.path.getsize(args.scaler)
+        binary_size = os.path.getsize(path)
+        print(f"{len(labels)} references, {args.repeat} iterations")
+        print(f"  size: JSON + pickle {legacy_size} bytes, binary {binary_size} bytes "
+              f"({binary_size / legacy_size - 1:+.1%})")
+        print(f"  loaded matrices identical: {identical}")
+        print_timing('load JSON + pickle', time_call(load_legacy, args.repeat))
+        print_timing('load binary', time_call(lambda: calibration_store.load(path), args.repeat))
+        print_timing('load binary (checksum)',
+                     time_call(lambda: calibration_store.load(path, verify=True), args.repeat))
+    return 0 if identical else 1
+
+
+def record_landmarks(args):
+    """Record the landmarks of every frame of a video that shows a hand"""
+    from sign_detector import SignLanguageDetector
+
+    detector = SignLanguageDetector(max_num_hands=1)
+    recorded = []
+    frames = 0
+    for frame in read_video_frames(args.video, args.max_frames):
+        frames += 1
+        landmarks = detector.detect_landmarks(frame)
+        if landmarks is not None:
+            recorded.append(landmarks)
+    detector.close()
+    if not recorded:
+        raise SystemExit(f"No hand detected in {frames} frames")
+    np.save(args.output, np.stack(recorded).astype(np.float32))
+    print(f"Saved landmarks of {len(recorded)} of {frames} frames to {args.output}")
+    return 0
+
+
+def synthetic_landmarks(classifier, count, seed=0):
+    """Build (count, 21, 3) pixel landmarks by undoing the preprocessing of the references"""
+    matrix = np.asarray(classifier.reference_matrix, dtype=np.float32)
+    if not len(matrix):
+        raise SystemExit("No calibration references to synthesize landmarks from")
+    rng = np.random.default_rng(seed)
+    features = matrix[rng.integers(0, len(matrix), count)]
+    if classifier._scaler_params is not None:
+        mean, scale = classifier._scaler_params
+        features = features * scale + mean
+    features = features + rng.normal(0, 0.01, features.shape).astype(np.float32)
+    # Unit-length wrist-relative vectors back to a hand of about 200 px at a random position
+    landmarks = features.reshape(count, 21, 3) * 200.0
+    landmarks[:, :, :2] += rng.uniform(150, 450, (count, 1, 2))
+    return landmarks.astype(np.float32)
+
+
+def summarize(durations, frames_per_item=1):
+    """Latency percentiles and frame throughput for per-item durations in milliseconds"""
+    durations = np.asarray(durations)
+    return {
+        'count': int(len(durations)),
+        'p50_ms': float(np.percentile(durations, 50)),
+        'p95_ms': float(np.percentile(durations, 95)),
+        'p99_ms': float(np.percentile(durations, 99)),
+        'fps': float(1000.0 * frames_per_item / durations.mean()) if durations.mean() > 0 else float('inf')
+    }
+
+
+def peak_memory(fn, items):
+    """Peak bytes allocated by Python and NumPy while running fn over items"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        for item in items:
+            fn(item)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_stage(results, name, fn, items, memory_items, frames_per_item=1):
+    """Time fn on every item, then measure its peak memory on a few of them"""
+    durations = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        durations.append((time.perf_counter() - start) * 1000)
+    stage = summarize(durations, frames_per_item)
+    # Tracing slows allocation down, so memory is measured in a separate pass
+    stage['peak_kib'] = peak_memory(fn, items[:memory_items]) / 1024 if memory_items else None
+    results[name] = stage
+    memory = f"{stage['peak_kib']:10.1f} KiB" if stage['peak_kib'] is not None else ''
+    print(f"  {name:<28} p50 {stage['p50_ms']:8.3f}  p95 {stage['p95_ms']:8.3f}  p99 {stage['p99_ms']:8.3f} ms"
+          f"  {stage['fps']:9.1f} fps {memory}")
+
+
+def compare_baseline(results, baseline, tolerance):
+    """Print each stage's change against a baseline; returns the regressed stages"""
+    regressions = []
+    print(f"Compared with baseline from {baseline.get('created', 'unknown time')} "
+          f"({baseline.get('machine', 'unknown machine')}):")
+    for name, stage in results.items():
+        previous = baseline['stages'].get(name)
+        if previous is None:
+            print(f"  {name:<28} new stage")
+            continue
+        changes = {key: stage[key] / previous[key] - 1 for key in ('p50_ms', 'p95_ms') if previous[key] > 0}
+        regressed = any(change > tolerance for change in changes.values())
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<28} " + "  ".join(f"{key[:3]} {change:+7.1%}" for key, change in changes.items())
+              + ("  REGRESSED" if regressed else ""))
+    return regressions
+
+
+def bench_replay(args):
+    """Replay recorded frames and landmarks through every stage"""
+    from sign_classifier import SignClassifier
+
+    classifier = SignClassifier()
+    if args.landmarks:
+        landmarks = np.load(args.landmarks).astype(np.float32).reshape(-1, 21, 3)
+    else:
+        landmarks = synthetic_landmarks(classifier, args.synthetic_count)
+    landmarks = list(landmarks)
+    memory_items = 0 if args.no_memory else args.memory_items
+    results = {}
+
+    print(f"{len(landmarks)} landmark frames" + (f", video {args.video}" if args.video else ""))
+    if args.video:
+        from sign_detector import SignLanguageDetector
+
+        frames = list(read_video_frames(args.video, args.max_frames))
+        if not frames:
+            raise SystemExit("No frames read")
+        bgr_frames = [cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) for frame in frames]
+        # Fresh detectors for each stage, so tracking state starts the same way
+        detector = SignLanguageDetector()
+        run_stage(results, 'detect_hands', lambda frame: detector.detect_hands(frame.copy()),
+                  bgr_frames, memory_items)
+        detector.close()
+        detector = SignLanguageDetector()
+        run_stage(results, 'detect_landmarks', detector.detect_landmarks, frames, memory_items)
+        detector.close()
+
+    run_stage(results, 'preprocess_landmarks', classifier.preprocess_landmarks, landmarks, memory_items)
+    run_stage(results, 'recognize_sign', classifier.recognize_sign, landmarks, memory_items)
+    batches = [np.stack(landmarks[i:i + args.batch_size]) for i in range(0, len(landmarks), args.batch_size)]
+    run_stage(results, f'recognize_signs x{args.batch_size}', classifier.recognize_signs, batches, memory_items,
+              frames_per_item=args.batch_size)
+
+    if args.endpoints:
+        from app import app
+        client = app.test_client()
+        run_stage(results, 'POST /api/classify_landmarks',
+                  lambda hand: client.post('/api/classify_landmarks', data=hand.astype('<f4').tobytes(),
+                                           content_type='application/octet-stream'),
+                  landmarks, memory_items)
+        if args.video:
+            jpegs = [cv2.imencode('.jpg', frame)[1].tobytes() for frame in bgr_frames]
+            # The same JPEGs as base64 JSON, the baseline the binary upload is measured against
+            bodies = [json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()})
+                      for jpeg in jpegs]
+            run_stage(results, 'POST /api/detect',
+                      lambda body: client.post('/api/detect', data=body, content_type='application/json'),
+                      bodies, memory_items)
+            run_stage(results, 'POST /api/detect_frame',
+                      lambda jpeg: client.post('/api/detect_frame', data=jpeg, content_type='image/jpeg'),
+                      jpegs, memory_items)
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mib = max_rss / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+    print(f"  peak resident memory: {max_rss_mib:.1f} MiB")
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': f"{platform.node()} {platform.machine()} {platform.python_version()}",
+        'max_rss_mib': max_rss_mib,
+        'stages': results
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare_baseline(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+def bench_batching(args):
+    """Throughput and latency of per-request vs micro-batched classification"""
+    from micro_batch import MicroBatchScheduler
+    from sign_classifier import SignClassifier
+
+    classifier = SignClassifier()
+    landmarks = synthetic_landmarks(classifier, args.requests)
+
+    def run(classify, clients):
+        durations = []
+        def client(items):
+            for item in items:
+                start = time.perf_counter()
+                classify(item[np.newaxis])
+                durations.append((time.perf_counter() - start) * 1000)
+        threads = [threading.Thread(target=client, args=(landmarks[i::clients],)) for i in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stage = summarize(durations)
+        print(f"    p50 {stage['p50_ms']:8.3f}  p95 {stage['p95_ms']:8.3f}  p99 {stage['p99_ms']:8.3f} ms"
+              f"  {len(durations) / elapsed:9.1f} requests/s")
+
+    for clients in (int(value) for value in args.concurrency.split(',')):
+        print(f"{clients} concurrent clients")
+        print("  per request")
+        run(classifier.recognize_signs, clients)
+        for max_wait_ms in (float(value) for value in args.max_wait_ms.split(',')):
+            scheduler = MicroBatchScheduler(args.max_batch_size, max_wait_ms)
+            print(f"  batched, max wait {max_wait_ms:g} ms")
+            run(lambda item: scheduler.recognize_signs(classifier, item), clients)
+            print(f"    mean batch size {scheduler.stats()['mean_batch_size']:.1f}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    upload = subparsers.add_parser('upload', help='base64 JSON vs binary frame upload')
+    upload.add_argument('--image', help='image file to use instead of a synthetic frame')
+    upload.add_argument('--repeat', type=int, default=200)
+    upload.add_argument('--endpoints', action='store_true',
+                        help='also time both endpoints through the Flask test client')
+    upload.set_defaults(func=bench_upload)
+
+    downscale = subparsers.add_parser('downscale', help='downscaled detection vs full-frame detection')
+    downscale.add_argument('--video', help='video file with a visible hand (default: synthetic frames)')
+    downscale.add_argument('--inference-width', type=int, default=320)
+    downscale.add_argument('--width', type=int, default=1280, help='synthetic frame width')
+    downscale.add_argument('--height', type=int, default=720, help='synthetic frame height')
+    downscale.add_argument('--max-frames', type=int)
+    downscale.set_defaults(func=bench_downscale)
+
+    storage = subparsers.add_parser('storage', help='JSON + pickle vs binary calibration files')
+    storage.add_argument('--json', default='default_asl_references.json')
+    storage.add_argument('--scaler', default='default_scaler.pkl')
+    storage.add_argument('--repeat', type=int, default=200)
+    storage.set_defaults(func=bench_storage)
+
+    record = subparsers.add_parser('record', help='record landmarks from a video as a replay fixture')
+    record.add_argument('--video', required=True, help='video file with a visible hand')
+    record.add_argument('--output', required=True, help='.npy file for the (N, 21, 3) landmarks')
+    record.add_argument('--max-frames', type=int)
+    record.set_defaults(func=record_landmarks)
+
+    replay = subparsers.add_parser('replay', help='per-stage latency, throughput and memory')
+    replay.add_argument('--video', help='video file to replay through hand detection')
+    replay.add_argument('--landmarks', help='.npy landmarks recorded with the record command')
+    replay.add_argument('--synthetic-count', type=int, default=500,
+                        help='landmark frames to synthesize when --landmarks is not given')
+    replay.add_argument('--max-frames', type=int, default=300)
+    replay.add_argument('--batch-size', type=int, default=16)
+    replay.add_argument('--endpoints', action='store_true',
+                        help='also replay through the Flask endpoints with the test client')
+    replay.add_argument('--memory-items', type=int, default=20,
+                        help='items per stage replayed again with tracemalloc for peak memory')
+    replay.add_argument('--no-memory', action='store_true', help='skip the peak memory pass')
+    replay.add_argument('--save-baseline', help='write the results to this JSON file')
+    replay.add_argument('--baseline', help='compare the results with this JSON file')
+    replay.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative p50/p95 slowdown that counts as a regression')
+    replay.set_defaults(func=bench_replay)
+
+    batching = subparsers.add_parser('batching', help='per-request vs micro-batched classification')
+    batching.add_argument('--requests', type=int, default=5000)
+    batching.add_argument('--concurrency', default='1,8,32', help='comma-separated numbers of clients')
+    batching.add_argument('--max-batch-size', type=int, default=32)
+    batching.add_argument('--max-wait-ms', default='0,1', help='comma-separated scheduler waits to try')
+    batching.set_defaults(func=bench_batching)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
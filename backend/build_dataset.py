@@ -0,0 +1,286 @@
+"""Build landmark datasets and calibrations from labelled videos and images
+
+Usage:
+    python build_dataset.py extract INPUT_DIR [INPUT_DIR ...] --dataset DIR
+                                    [--workers N] [--frame-step N] [--no-mirror]
+    python build_dataset.py references --dataset DIR [--output FILE] [--merge]
+                                       [--train-model] [--hidden-units N]
+    python build_dataset.py stats --dataset DIR
+
+Input directories hold one subdirectory per label, named after the letter,
+with video clips and/or images showing it:
+
+    clips/A/clip1.mp4
+    clips/A/photo1.jpg
+    clips/J/clip7.mov
+
+extract decodes the files in parallel worker processes, runs headless hand
+detection on them and streams the landmarks into a chunked dataset (see
+landmark_dataset.py). Files already in the dataset and unchanged since are
+skipped, so an interrupted or repeated run only processes new and modified
+files. Files that no longer exist are dropped from the dataset.
+
+references builds a calibration from the dataset. Static letters get up to
+max_samples_per_letter k-means prototypes of all their frames, as with a
+burst calibration. For motion letters (J and Z by default) a few clips,
+spread over all of the letter's clips, become motion templates. By
+default the output is the default calibration,
+default_asl_references.sbcal, and its motion templates. --train-model
+also trains the model of the 'softmax' classifier engine on every frame
+and saves it next to the calibration.
+"""
+import argparse
+import concurrent.futures
+import os
+import time
+
+import cv2
+import numpy as np
+
+from landmark_dataset import LandmarkDataset
+
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+# Per-process detector for images, built for the first image a worker gets
+_image_detector = None
+
+
+def find_sources(input_dirs):
+    """Yield (name, path, label) for every video and image under the input directories
+
+    name is the path relative to its input directory, which identifies the
+    file in the dataset; label is its first directory component.
+    """
+    for input_dir in input_dirs:
+        for root, dirs, files in os.walk(input_dir):
+            dirs.sort()
+            for filename in sorted(files):
+                if os.path.splitext(filename)[1].lower() not in VIDEO_EXTENSIONS | IMAGE_EXTENSIONS:
+                    continue
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, input_dir).replace(os.sep, '/')
+                if '/' not in name:
+                    # Files directly in an input directory have no label
+                    continue
+                yield name, path, name.split('/', 1)[0]
+
+
+def _init_worker():
+    # One process per core already; OpenCV's own threads would oversubscribe
+    cv2.setNumThreads(1)
+
+
+def _extract(path, frame_step, max_frames, mirror):
+    """Detect the first hand in every frame_step-th frame of a video, or in an image
+
+    Returns the number of frames read and the (N, 21, 3) landmarks of the
+    frames with a hand.
+    """
+    global _image_detector
+    from sign_detector import SignLanguageDetector
+
+    landmarks = []
+    if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+        frame = cv2.imread(path)
+        if frame is None:
+            raise ValueError(f'Could not read image {path}')
+        if _image_detector is None:
+            _image_detector = SignLanguageDetector(max_num_hands=1, static_image_mode=True)
+        found = _image_detector.detect_landmarks(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), mirror=mirror)
+        if found is not None:
+            landmarks.append(found)
+        frames = 1
+    else:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f'Could not open video {path}')
+        # A fresh detector per clip, so tracking never carries over from the last one
+        detector = SignLanguageDetector(max_num_hands=1)
+        frames = 0
+        try:
+            while max_frames is None or len(landmarks) < max_frames:
+                # grab() skips decoding the frames in between
+                if not cap.grab():
+                    break
+                frames += 1
+                if (frames - 1) % frame_step:
+                    continue
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                found = detector.detect_landmarks(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), mirror=mirror)
+                if found is not None:
+                    landmarks.append(found)
+        finally:
+            cap.release()
+            detector.close()
+    array = np.stack(landmarks).astype(np.float32) if landmarks else np.empty((0, 21, 3), dtype=np.float32)
+    return frames, array
+
+
+def extract(args):
+    """Add new and modified files to the dataset"""
+    dataset = LandmarkDataset(args.dataset, chunk_frames=args.chunk_frames)
+    motion_letters = set(args.motion_letters)
+    options = {'mirror': not args.no_mirror, 'frame_step': args.frame_step,
+               'max_frames_per_file': args.max_frames_per_file}
+    extracted_with = dict(dataset.manifest['options'])
+    # Datasets from before downscaling was dropped record it; unset, it changed nothing
+    if extracted_with.get('inference_width', 0) is None:
+        del extracted_with['inference_width']
+    if extracted_with and extracted_with != options:
+        raise SystemExit(f"Dataset {args.dataset} was extracted with {dataset.manifest['options']}; "
+                         f"use the same options or a new dataset directory")
+    dataset.manifest['options'] = options
+
+    sources = list(find_sources(args.inputs))
+    present = {name for name, _, _ in sources}
+    removed = [name for name in dataset.files if name not in present]
+    for name in removed:
+        dataset.remove(name)
+
+    pending = []
+    for name, path, label in sources:
+        stat = os.stat(path)
+        if not dataset.is_current(name, stat.st_size, stat.st_mtime_ns):
+            pending.append((name, path, label, stat.st_size, stat.st_mtime_ns))
+    print(f"{len(sources)} files, {len(sources) - len(pending)} already extracted, {len(pending)} to process"
+          + (f", {len(removed)} removed" if removed else ""))
+    if not pending:
+        dataset.save_manifest()
+        return 0
+
+    started = time.perf_counter()
+    frames_read = frames_kept = failures = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(_extract, path, 1 if label in motion_letters else args.frame_step,
+                            args.max_frames_per_file, not args.no_mirror): (name, path, label, size, mtime_ns)
+            for name, path, label, size, mtime_ns in pending
+        }
+        try:
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                name, path, label, size, mtime_ns = futures[future]
+                try:
+                    frames, landmarks = future.result()
+                    dataset.add(name, label, size, mtime_ns, frames, landmarks)
+                    frames_read += frames
+                    frames_kept += len(landmarks)
+                except Exception as e:
+                    # Left out of the manifest, so the next run tries it again
+                    failures += 1
+                    print(f"  {name}: {str(e)}")
+                if done % 100 == 0 or done == len(futures):
+                    elapsed = time.perf_counter() - started
+                    print(f"  {done}/{len(futures)} files, {frames_kept} hands in {frames_read} frames, "
+                          f"{frames_read / elapsed:.0f} frames/s")
+        finally:
+            # Keep what was extracted even when interrupted, without waiting for the rest
+            executor.shutdown(wait=False, cancel_futures=True)
+            dataset.flush()
+    print(f"Extracted {frames_kept} hands from {frames_read} frames in {time.perf_counter() - started:.1f}s"
+          + (f", {failures} files failed" if failures else ""))
+    return 1 if failures else 0
+
+
+def build_references(args):
+    """Build a calibration from the dataset"""
+    from sign_classifier import SignClassifier
+
+    dataset = LandmarkDataset(args.dataset)
+    if not dataset.files:
+        raise SystemExit(f"No dataset in {args.dataset}")
+    classifier = SignClassifier(reference_file=args.output, use_defaults=False)
+    if not args.merge:
+        classifier.clear_references()
+    motion_letters = set(args.motion_letters)
+
+    static_landmarks = {label: np.array(dataset.landmarks(label))
+                        for label in dataset.labels() if label not in motion_letters}
+    frames = [landmarks for landmarks in static_landmarks.values() if len(landmarks)]
+    if frames and not (args.merge and classifier.is_scaler_fitted):
+        # Fit the scaler on every static frame. Left to add_reference_samples
+        # it would be fitted on the first frame alone. A merged calibration
+        # keeps its scaler, which its existing references are scaled with.
+        features, valid = classifier.normalize_landmarks_batch(np.concatenate(frames))
+        classifier.fit_scaler(features[valid])
+
+    for label in dataset.labels():
+        if label in motion_letters:
+            # Each clip is one recording of the motion; only a few templates
+            # are kept per letter, so they are spread over all the clips
+            clips = [name for name, entry in sorted(dataset.files.items())
+                     if entry['label'] == label and entry['count']]
+            limit = classifier.sequence_matcher.max_templates_per_letter
+            chosen = sorted(set(np.linspace(0, len(clips) - 1, min(limit, len(clips))).round().astype(int)))
+            recorded = sum(classifier.add_motion_template(label, np.array(dataset.file_landmarks(clips[i])),
+                                                          replace=False)
+                           for i in chosen)
+            print(f"  {label}: {recorded} of {len(clips)} clips recorded as motion templates")
+        else:
+            added = classifier.add_reference_samples(label, static_landmarks[label], replace=not args.merge)
+            print(f"  {label}: {len(classifier.sign_references.get(label, []))} references from {added} frames")
+
+    if args.train_model:
+        # On every frame of the dataset rather than the prototypes kept as references
+        report = classifier.train_model(static_landmarks, hidden_units=args.hidden_units)
+        print(f"Trained model on {report['samples']} frames in {report['epochs']} epochs: "
+              f"held-out accuracy {report['validation_accuracy']:.1%}, "
+              f"calibration error {report['calibration_error']:.3f}, temperature {report['temperature']:.2f}")
+
+    if not classifier.save_references():
+        return 1
+    print(f"Saved {args.output}")
+    return 0
+
+
+def show_stats(args):
+    stats = LandmarkDataset(args.dataset).stats()
+    print(f"{stats['files']} files, {stats['chunks']} chunks, {stats['frames']} hands")
+    for label, count in stats['frames_per_label'].items():
+        print(f"  {label}: {count}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser('extract', help='detect landmarks in new and modified files')
+    extract_parser.add_argument('inputs', nargs='+', help='directories with one subdirectory per label')
+    extract_parser.add_argument('--dataset', required=True, help='dataset directory to create or update')
+    extract_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    extract_parser.add_argument('--frame-step', type=int, default=2,
+                                help='detect every Nth video frame of static letters')
+    extract_parser.add_argument('--max-frames-per-file', type=int,
+                                help='stop reading a video once this many hands were found')
+    extract_parser.add_argument('--no-mirror', action='store_true',
+                                help='the files are already mirrored like a selfie view')
+    extract_parser.add_argument('--chunk-frames', type=int, default=8192, help='hands per chunk file')
+    extract_parser.add_argument('--motion-letters', default='JZ',
+                                help='letters whose clips are motions; every one of their frames is kept')
+    extract_parser.set_defaults(func=extract)
+
+    references = subparsers.add_parser('references', help='build a calibration from the dataset')
+    references.add_argument('--dataset', required=True)
+    references.add_argument('--output', default='default_asl_references.sbcal')
+    references.add_argument('--merge', action='store_true',
+                            help="add to the output calibration's references instead of replacing it")
+    references.add_argument('--motion-letters', default='JZ', help='letters to record as motion templates')
+    references.add_argument('--train-model', action='store_true',
+                            help="also train the 'softmax' engine's model on every frame")
+    references.add_argument('--hidden-units', type=int, default=0,
+                            help='hidden layer size of the model; 0 trains softmax regression')
+    references.set_defaults(func=build_references)
+
+    stats = subparsers.add_parser('stats', help='files and hands per label in the dataset')
+    stats.add_argument('--dataset', required=True)
+    stats.set_defaults(func=show_stats)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
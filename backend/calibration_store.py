@@ -0,0 +1,112 @@
+"""Versioned binary calibration files
+
+Layout (little-endian):
+
+    header   32 bytes: magic, version, flags, row count, feature dim,
+             label width, CRC32 of everything after the header
+    matrix   count x dim float32 reference features
+    mean     dim float32 scaler mean   (only with FLAG_SCALER)
+    scale    dim float32 scaler scale  (only with FLAG_SCALER)
+    labels   count fixed-width UTF-8 labels, NUL padded
+
+Files are read through a memory map, so loading maps the matrix instead of
+parsing it, and are written to a temporary file that is renamed over the
+target so readers never see a half-written calibration. The checksum is
+only checked when asked for: it is a second pass over the whole file on
+top of the one the classifier makes to index the matrix.
+"""
+import collections
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+MAGIC = b'SBCALIB\0'
+VERSION = 1
+FLAG_SCALER = 1
+HEADER = struct.Struct('<8sHHIIII4x')
+
+CalibrationData = collections.namedtuple(
+    'CalibrationData', ['labels', 'matrix', 'scaler_mean', 'scaler_scale'])
+
+
+class CalibrationStoreError(ValueError):
+    """Raised when a calibration file is missing, corrupt or of an unknown version"""
+
+
+def save(path, labels, matrix, scaler_mean=None, scaler_scale=None):
+    """Atomically write references and scaler parameters to path"""
+    if len(labels):
+        matrix = np.ascontiguousarray(matrix, dtype='<f4').reshape(len(labels), -1)
+    else:
+        matrix = np.empty((0, 63), dtype='<f4')
+    count, dim = matrix.shape
+    encoded = [str(label).encode('utf-8') for label in labels]
+    label_width = max([len(label) for label in encoded] + [1])
+
+    sections = [matrix.tobytes()]
+    flags = 0
+    if scaler_mean is not None and scaler_scale is not None:
+        flags |= FLAG_SCALER
+        sections.append(np.asarray(scaler_mean, dtype='<f4').reshape(dim).tobytes())
+        sections.append(np.asarray(scaler_scale, dtype='<f4').reshape(dim).tobytes())
+    sections.append(np.array(encoded, dtype=f'S{label_width}').tobytes())
+    payload = b''.join(sections)
+
+    header = HEADER.pack(MAGIC, VERSION, flags, count, dim, label_width, zlib.crc32(payload))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.calibration-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def load(path, verify=False):
+    """Memory-map a calibration file and return its CalibrationData
+
+    The header and file size are always checked; verify=True also checks
+    the CRC32 of the contents.
+    """
+    try:
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+    except (OSError, ValueError) as e:
+        raise CalibrationStoreError(f'Could not open {path}: {e}')
+    if len(data) < HEADER.size:
+        raise CalibrationStoreError(f'{path} is too short to be a calibration file')
+
+    magic, version, flags, count, dim, label_width, checksum = HEADER.unpack(data[:HEADER.size].tobytes())
+    if magic != MAGIC:
+        raise CalibrationStoreError(f'{path} is not a calibration file')
+    if version != VERSION:
+        raise CalibrationStoreError(f'{path} has unsupported version {version}')
+
+    has_scaler = bool(flags & FLAG_SCALER)
+    expected = HEADER.size + 4 * (count * dim + (2 * dim if has_scaler else 0)) + count * label_width
+    if len(data) != expected:
+        raise CalibrationStoreError(f'{path} is {len(data)} bytes, expected {expected}')
+    if verify and zlib.crc32(data[HEADER.size:]) != checksum:
+        raise CalibrationStoreError(f'{path} failed its checksum')
+
+    offset = HEADER.size
+    matrix = np.frombuffer(data, dtype='<f4', count=count * dim, offset=offset).reshape(count, dim)
+    offset += matrix.nbytes
+    scaler_mean = scaler_scale = None
+    if has_scaler:
+        scaler_mean = np.frombuffer(data, dtype='<f4', count=dim, offset=offset)
+        scaler_scale = np.frombuffer(data, dtype='<f4', count=dim, offset=offset + 4 * dim)
+        offset += 8 * dim
+    raw_labels = np.frombuffer(data, dtype=f'S{label_width}', count=count, offset=offset)
+    labels = [label.decode('utf-8') for label in raw_labels]
+    return CalibrationData(labels, matrix, scaler_mean, scaler_scale)
@@ -0,0 +1,23 @@
+import collections
+import threading
+
+
+class ClientRegistry:
+    """Per-client state created on demand, dropping the least recently used client"""
+
+    def __init__(self, factory, max_clients=1024):
+        self.factory = factory
+        self.max_clients = max_clients
+        self._states = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, client_id):
+        with self._lock:
+            state = self._states.get(client_id)
+            if state is None:
+                state = self._states[client_id] = self.factory()
+                while len(self._states) > self.max_clients:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(client_id)
+            return state
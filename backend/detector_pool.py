@@ -0,0 +1,172 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from sign_detector import SignLanguageDetector
+
+
+class PoolExhausted(RuntimeError):
+    """Raised when no detector becomes free within the checkout timeout"""
+
+
+class _PooledDetector:
+    def __init__(self, detector, max_num_hands):
+        self.detector = detector
+        self.max_num_hands = max_num_hands
+        # The client whose frames the detector last tracked
+        self.client_id = None
+        self.used = False
+        self.in_use = False
+        self.last_used = time.monotonic()
+
+
+class DetectorPool:
+    """Bounded pool of SignLanguageDetector instances
+
+    MediaPipe's Hands object keeps tracking state between frames and must not
+    be used by two threads at once, so each request checks a detector out for
+    its exclusive use. A client that passes the same client_id gets the
+    detector it used last whenever that one is free, keeping its tracking
+    state. Otherwise it gets a detector nobody has used yet, a new one while
+    the pool has room, or else the longest idle one, which is reset first so
+    it never tracks another client's hands into this client's frames.
+    Requests without a client_id are treated as one stream. Detectors that
+    stay idle longer than idle_timeout are closed. MediaPipe fixes the
+    number of hands it looks for when a detector is built, so a checkout
+    only reuses detectors built for the same max_num_hands; factory is
+    called with it as a keyword argument.
+    """
+
+    def __init__(self, max_size=4, idle_timeout=300.0, checkout_timeout=5.0,
+                 factory=SignLanguageDetector):
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.factory = factory
+        self._entries = []
+        self._creating = 0
+        self._resets = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def checkout(self, client_id=None, max_num_hands=2):
+        """Check out a detector for the duration of a with-block"""
+        entry = self._acquire(client_id, max_num_hands)
+        try:
+            yield entry.detector
+        finally:
+            self._release(entry)
+
+    def _acquire(self, client_id, max_num_hands):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._condition:
+            while True:
+                self._evict_idle_locked()
+                free = [entry for entry in self._entries
+                        if not entry.in_use and entry.max_num_hands == max_num_hands]
+                entry = self._find_own_or_unused(free, client_id)
+                if entry is not None:
+                    self._claim_locked(entry, client_id)
+                    return entry
+
+                if len(self._entries) + self._creating >= self.max_size and not free:
+                    # Make room by closing a free detector built for another hand count
+                    other = min((entry for entry in self._entries if not entry.in_use),
+                                key=lambda entry: entry.last_used, default=None)
+                    if other is not None:
+                        self._entries.remove(other)
+                        other.detector.close()
+
+                if len(self._entries) + self._creating < self.max_size:
+                    self._creating += 1
+                    break
+
+                if free:
+                    # Take over the detector idle the longest; it tracked another client
+                    entry = min(free, key=lambda entry: entry.last_used)
+                    self._claim_locked(entry, client_id)
+                    self._resets += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f'All {self.max_size} detectors are busy')
+                self._condition.wait(remaining)
+
+        if entry is not None:
+            # Rebuilding MediaPipe's graph takes a while, so it happens outside the lock
+            try:
+                entry.detector.reset()
+            except BaseException:
+                with self._condition:
+                    self._entries.remove(entry)
+                    self._condition.notify()
+                entry.detector.close()
+                raise
+            return entry
+
+        # Build the new detector outside the lock, it takes a while
+        try:
+            entry = _PooledDetector(self.factory(max_num_hands=max_num_hands), max_num_hands)
+            entry.in_use = True
+            entry.used = True
+            entry.client_id = client_id
+        finally:
+            with self._condition:
+                self._creating -= 1
+                if entry is not None:
+                    self._entries.append(entry)
+                else:
+                    self._condition.notify()
+        return entry
+
+    @staticmethod
+    def _find_own_or_unused(free, client_id):
+        """The client's own detector, with its tracking state, or else one nobody has used"""
+        for entry in free:
+            if entry.used and entry.client_id == client_id:
+                return entry
+        for entry in free:
+            if not entry.used:
+                return entry
+        return None
+
+    @staticmethod
+    def _claim_locked(entry, client_id):
+        entry.in_use = True
+        entry.used = True
+        entry.client_id = client_id
+
+    def _release(self, entry):
+        with self._condition:
+            entry.in_use = False
+            entry.last_used = time.monotonic()
+            self._condition.notify()
+
+    def _evict_idle_locked(self):
+        now = time.monotonic()
+        expired = [entry for entry in self._entries
+                   if not entry.in_use and now - entry.last_used > self.idle_timeout]
+        for entry in expired:
+            self._entries.remove(entry)
+            entry.detector.close()
+
+    def evict_idle(self):
+        """Close detectors that have been idle longer than idle_timeout"""
+        with self._condition:
+            self._evict_idle_locked()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': len(self._entries),
+                'in_use': sum(entry.in_use for entry in self._entries),
+                'max_size': self.max_size,
+                'resets': self._resets
+            }
+
+    def close(self):
+        with self._condition:
+            for entry in self._entries:
+                entry.detector.close()
+            self._entries = []
@@ -0,0 +1,332 @@
+import collections
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from motion_gate import MotionGate
+from prediction_smoother import PredictionSmoother
+
+logger = logging.getLogger(__name__)
+
+# One published frame: the annotated BGR image (None when nobody watched the
+# video), what was detected in it, and its JPEG encodings by (width, quality)
+CapturedFrame = collections.namedtuple(
+    'CapturedFrame', ['seq', 'timestamp', 'image', 'landmarks', 'detection', 'jpegs'])
+
+
+class SyntheticSource:
+    """Stand-in for cv2.VideoCapture that generates frames, for tests and demos"""
+
+    def __init__(self, width=640, height=480, fps=30.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self._index = 0
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        # A square moving across a gradient background
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:] = np.linspace(0, 255, self.width, dtype=np.uint8)[np.newaxis, :, np.newaxis]
+        x = (self._index * 8) % max(1, self.width - 80)
+        cv2.rectangle(frame, (x, self.height // 2 - 40), (x + 80, self.height // 2 + 40), (0, 0, 255), -1)
+        self._index += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self._opened = False
+
+
+def open_source(source):
+    """Open a camera index, a video file path, or 'synthetic'"""
+    if source == 'synthetic':
+        return SyntheticSource()
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
+
+
+def is_live_camera(source):
+    return isinstance(source, int) or (isinstance(source, str) and source.isdigit())
+
+
+class FrameCapture:
+    """Shares one capture-and-detect thread between any number of subscribers
+
+    The camera is opened once, when the first subscriber arrives, and every
+    frame is detected and classified once. Frames are only annotated while a
+    subscriber wants images, and only JPEG-encoded when a client asks for
+    them, once per size and quality. The most recent frames are kept in a
+    small ring buffer that /video_feed clients and calibration read from.
+    The camera is released once nobody has been subscribed for idle_timeout
+    seconds.
+    """
+
+    def __init__(self, source, detector_factory, classifier_factory, buffer_size=8, idle_timeout=5.0,
+                 smoother=None, motion_gate=None, jpeg_quality=95):
+        self.source = source
+        # Both are called when the capture thread starts, so models are only
+        # loaded once somebody subscribes
+        self.detector_factory = detector_factory
+        self.classifier_factory = classifier_factory
+        # Debounces the letter reported alongside each frame
+        self.smoother = smoother or PredictionSmoother()
+        # Every frame is annotated, so only classification can be skipped
+        self.motion_gate = motion_gate or MotionGate(frame_threshold=0)
+        self.idle_timeout = idle_timeout
+        # Quality of encode() unless a client asks for another
+        self.jpeg_quality = jpeg_quality
+        self._frames = collections.deque(maxlen=buffer_size)
+        self._seq = 0
+        self._subscribers = 0
+        self._image_subscribers = 0
+        self._stats = collections.Counter()
+        self._last_unsubscribe = time.monotonic()
+        self._thread = None
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def subscription(self, images=False):
+        """Keep the capture thread running for the duration of a with-block
+
+        With images=True frames are annotated for display while the block
+        runs; otherwise only landmarks and detections are published.
+        """
+        with self._condition:
+            self._subscribers += 1
+            self._image_subscribers += images
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='frame-capture', daemon=True)
+                self._thread.start()
+        try:
+            yield self
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+                self._image_subscribers -= images
+                self._last_unsubscribe = time.monotonic()
+
+    def latest(self):
+        """Return the most recent frame, or None if nothing was captured yet"""
+        with self._condition:
+            return self._frames[-1] if self._frames else None
+
+    def wait_for_frame(self, after_seq=0, timeout=5.0):
+        """Wait for the newest frame with a sequence number above after_seq
+
+        Frames published while the caller was busy are skipped, so a slow
+        reader always gets the most recent one. Returns None on timeout or
+        when the capture thread stops.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._frames or self._frames[-1].seq <= after_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None:
+                    return None
+                self._condition.wait(remaining)
+            return self._frames[-1]
+
+    def encode(self, captured, width=None, quality=None):
+        """JPEG bytes of a frame's annotated image, or None if it has none
+
+        The image is scaled down to width if it is wider. Each width and
+        quality is encoded once per frame and shared by every client
+        asking for it.
+        """
+        if captured.image is None:
+            return None
+        height, full_width = captured.image.shape[:2]
+        width = min(int(width), full_width) if width else full_width
+        quality = int(quality or self.jpeg_quality)
+        key = (width, quality)
+        jpeg = captured.jpegs.get(key)
+        if jpeg is None:
+            image = captured.image
+            if width != full_width:
+                image = cv2.resize(image, (width, max(1, round(height * width / full_width))),
+                                   interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            # Two clients may race to encode the same variant; both get the first one stored
+            jpeg = captured.jpegs.setdefault(key, buffer.tobytes())
+            with self._condition:
+                self._stats['jpeg_encodes'] += 1
+        return jpeg
+
+    def stats(self):
+        with self._condition:
+            return {
+                'subscribers': self._subscribers,
+                'image_subscribers': self._image_subscribers,
+                'frames': self._stats['frames'],
+                'annotated_frames': self._stats['annotated_frames'],
+                'jpeg_encodes': self._stats['jpeg_encodes']
+            }
+
+    def grab(self, max_age=0.5, timeout=5.0):
+        """Return a frame no older than max_age seconds, starting capture if needed"""
+        with self.subscription():
+            latest = self.latest()
+            if latest is not None and time.monotonic() - latest.timestamp <= max_age:
+                return latest
+            return self.wait_for_frame(latest.seq if latest else 0, timeout)
+
+    def grab_landmarks(self, count, timeout=10.0):
+        """Collect landmarks from the next count frames that show a hand"""
+        samples = []
+        deadline = time.monotonic() + timeout
+        with self.subscription():
+            latest = self.latest()
+            last_seq = latest.seq if latest else 0
+            while len(samples) < count:
+                captured = self.wait_for_frame(last_seq, deadline - time.monotonic())
+                if captured is None:
+                    break
+                last_seq = captured.seq
+                if captured.landmarks is not None:
+                    samples.append(captured.landmarks)
+        return samples
+
+    def _is_idle(self):
+        with self._condition:
+            return (self._subscribers == 0
+                    and time.monotonic() - self._last_unsubscribe > self.idle_timeout)
+
+    def _run(self):
+        while True:
+            went_idle = self._capture()
+            with self._condition:
+                # Someone may have subscribed while the camera was released
+                if not (went_idle and self._subscribers > 0):
+                    self._thread = None
+                    self._condition.notify_all()
+                    return
+
+    def _capture(self):
+        """Capture until idle or the source fails; returns True when idle"""
+        logger.info(f"Opening capture source {self.source!r}")
+        with self._condition:
+            # Frames from an earlier run are stale
+            self._frames.clear()
+        self.smoother.reset()
+        cap = detector = None
+        try:
+            cap = open_source(self.source)
+            detector = self.detector_factory()
+            classifier = self.classifier_factory()
+            # Files and synthetic sources are replayed at their own frame rate
+            # instead of as fast as they decode
+            frame_interval = 0.0 if is_live_camera(self.source) else 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+            while not self._is_idle():
+                started = time.monotonic()
+                ret, frame = cap.read()
+                if not ret and not is_live_camera(self.source):
+                    # Loop video files
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ret, frame = cap.read()
+                if not ret:
+                    logger.error("Failed to capture frame")
+                    return False
+
+                self._publish(*self._process(detector, classifier, frame))
+
+                if frame_interval:
+                    time.sleep(max(0.0, frame_interval - (time.monotonic() - started)))
+            return True
+        except Exception:
+            # Stop like a failed read, so _run clears the thread and the next
+            # subscriber starts a new one instead of waiting on a dead one
+            logger.exception(f"Capture from {self.source!r} failed")
+            return False
+        finally:
+            logger.info("Releasing camera")
+            if cap is not None:
+                cap.release()
+            if detector is not None:
+                detector.close()
+
+    def _process(self, detector, classifier, frame):
+        with self._condition:
+            annotate = self._image_subscribers > 0
+            self._stats['frames'] += 1
+            self._stats['annotated_frames'] += annotate
+
+        # Every frame is detected the same way, whether or not it is displayed,
+        # so MediaPipe tracks hands through one consistent view of the stream
+        all_landmarks, handedness = detector.detect_all_landmarks(
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), mirror=True)
+        if annotate:
+            if all_landmarks is not None:
+                detector.draw_landmarks(frame, all_landmarks, mirror=True)
+        else:
+            frame = None
+        # Calibration uses the first hand
+        landmarks = None if all_landmarks is None else all_landmarks[0]
+
+        # Add status text
+        status_text = "No hand detected"
+        detected_sign = None
+        confidence = 0.0
+        hands = []
+
+        if all_landmarks is not None:
+            status_text = "Hand detected"
+            # Recognize every hand in one batch, reusing the last result while they hold still
+            self.motion_gate.count_frame()
+            gate_key = (id(classifier), classifier.revision)
+            cached = self.motion_gate.check_landmarks(all_landmarks, key=gate_key)
+            if cached is None:
+                cached = classifier.recognize_signs(all_landmarks)
+                self.motion_gate.store(all_landmarks, cached, key=gate_key)
+            signs, confidences = cached
+            hands = [
+                {'sign': sign, 'confidence': float(conf), 'handedness': hand}
+                for sign, conf, hand in zip(signs, confidences, handedness)
+            ]
+            best = int(np.argmax(confidences))
+            sign, conf = signs[best], float(confidences[best])
+            if sign:
+                detected_sign = sign
+                confidence = conf
+                status_text = f"Detected: {sign} ({conf:.2f})"
+        stable = self.smoother.update(detected_sign, confidence)
+
+        # Add text to frame
+        if frame is not None:
+            cv2.putText(frame, status_text,
+                        (10, frame.shape[0] - 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+
+        detection = {
+            'status': status_text,
+            'detected_sign': detected_sign,
+            'confidence': float(confidence) if confidence else 0.0,
+            'stable_letter': stable.letter,
+            'stable_confidence': stable.confidence,
+            'emitted_letter': stable.emitted,
+            'hands': hands
+        }
+        return frame, landmarks, detection
+
+    def _publish(self, image, landmarks, detection):
+        with self._condition:
+            self._seq += 1
+            self._frames.append(CapturedFrame(self._seq, time.monotonic(), image, landmarks, detection, {}))
+            self._condition.notify_all()
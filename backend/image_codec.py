@@ -0,0 +1,47 @@
+import base64
+
+import cv2
+import numpy as np
+
+# Decoding straight to RGB saves a colour conversion before MediaPipe
+IMREAD_COLOR_RGB = getattr(cv2, 'IMREAD_COLOR_RGB', None)
+
+
+class FrameDecodeError(ValueError):
+    """Raised when an uploaded frame cannot be decoded"""
+
+
+def decode_data_url(image_data, rgb=False):
+    """Decode a base64 data URL (as sent by the browser) into a BGR or RGB frame"""
+    encoded_data = image_data.split(',')[1]
+    return decode_image_bytes(base64.b64decode(encoded_data), rgb=rgb)
+
+
+def decode_image_bytes(payload, rgb=False):
+    """Decode raw JPEG/PNG bytes into a BGR frame, or an RGB one with rgb=True
+
+    The bytes are wrapped with np.frombuffer, so the only full-buffer copy
+    is the decoded image itself.
+    """
+    if not payload:
+        raise FrameDecodeError('Empty image payload')
+    buffer = np.frombuffer(payload, np.uint8)
+    if rgb and IMREAD_COLOR_RGB is not None:
+        frame = cv2.imdecode(buffer, IMREAD_COLOR_RGB)
+    else:
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if rgb and frame is not None:
+            # Older OpenCV builds can only decode to BGR; swap in place
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+    if frame is None:
+        raise FrameDecodeError('Could not decode image')
+    return frame
+
+
+def decode_raw_rgb(payload, width, height):
+    """Wrap raw packed RGB bytes as a (height, width, 3) frame without copying"""
+    expected = width * height * 3
+    if width <= 0 or height <= 0 or len(payload) != expected:
+        raise FrameDecodeError(
+            f'Expected {expected} bytes for a {width}x{height} RGB frame, got {len(payload)}')
+    return np.frombuffer(payload, np.uint8).reshape(height, width, 3)
@@ -0,0 +1,255 @@
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolFull(RuntimeError):
+    """Raised when every shared-memory frame slot is already in use"""
+
+
+def _worker_main(task_queue, result_conn, shm_name, slot_bytes, detectors_per_worker, idle_timeout):
+    """Worker process loop: run hand detection on frames placed in shared memory"""
+    # Imported here so only worker processes pay for loading MediaPipe
+    from detector_pool import DetectorPool
+    from sign_detector import SignLanguageDetector
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # A small pool per worker keeps each client's tracking state separate
+    pool = DetectorPool(max_size=detectors_per_worker, idle_timeout=idle_timeout, factory=SignLanguageDetector)
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            request_id, slot, shape, mirror, client_id, max_num_hands = task
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            try:
+                with pool.checkout(client_id, max_num_hands) as detector:
+                    hands = detector.detect_all_landmarks(frame, mirror=mirror)
+                result_conn.send((request_id, slot, hands, None))
+            except Exception as e:
+                result_conn.send((request_id, slot, None, str(e)))
+            finally:
+                del frame
+    finally:
+        pool.close()
+        shm.close()
+
+
+class WorkerDied(RuntimeError):
+    """Raised for the frames a worker process had not finished when it exited"""
+
+
+class _PendingResult:
+    def __init__(self):
+        self.event = threading.Event()
+        self.hands = None
+        self.error = None
+
+
+class InferenceWorkerPool:
+    """Runs hand detection in a pool of worker processes
+
+    Frames are written into fixed-size slots of one shared memory block and
+    only the slot number travels through the task queue, so a frame is never
+    pickled. The number of slots bounds the queue depth: when all of them
+    are taken, detection raises WorkerPoolFull instead of queueing more
+    work. Frames from the same client always go to the same worker, where
+    they get the same detector and its tracking state. Each worker sends
+    its results through a pipe of its own, so a worker that dies halfway
+    through sending cannot block the others. When a worker process exits,
+    the frames it had not finished fail with WorkerDied, their slots are
+    reclaimed and the worker is started again.
+    """
+
+    def __init__(self, num_workers, max_queue_depth=8, max_frame_bytes=1280 * 720 * 3,
+                 detectors_per_worker=4, idle_timeout=300.0, slot_timeout=0.0, check_interval=0.5):
+        self.num_workers = num_workers
+        self.max_queue_depth = max_queue_depth
+        self.slot_bytes = max_frame_bytes
+        self.slot_timeout = slot_timeout
+        self.check_interval = check_interval
+        self.restarts = 0
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max_queue_depth * max_frame_bytes)
+        self._free_slots = queue.Queue()
+        for slot in range(max_queue_depth):
+            self._free_slots.put(slot)
+
+        self._request_ids = itertools.count()
+        self._round_robin = itertools.count()
+        self._pending = {}
+        # Worker and slot of every frame a worker has not returned yet, by request id
+        self._in_flight = {}
+        self._pending_lock = threading.Lock()
+        self._closing = False
+
+        # Spawn rather than fork: MediaPipe and OpenCV threads do not survive a fork
+        self._context = multiprocessing.get_context('spawn')
+        self._worker_args = (self._shm.name, self.slot_bytes, detectors_per_worker, idle_timeout)
+        self._task_queues = [None] * num_workers
+        self._result_conns = [None] * num_workers
+        self._processes = [None] * num_workers
+        for worker in range(num_workers):
+            self._start_worker(worker)
+
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        logger.info(f"Started {num_workers} inference workers with {max_queue_depth} frame slots")
+
+    @property
+    def queue_depth(self):
+        """Number of frames currently queued or being processed"""
+        return self.max_queue_depth - self._free_slots.qsize()
+
+    def detect_landmarks(self, rgb_frame, mirror=True, client_id=None, timeout=10.0):
+        """Detect the first hand's landmarks in an RGB frame in a worker process"""
+        landmarks, _ = self.detect_all_landmarks(rgb_frame, mirror=mirror, client_id=client_id, timeout=timeout)
+        return None if landmarks is None else landmarks[0]
+
+    def detect_all_landmarks(self, rgb_frame, mirror=True, client_id=None, timeout=10.0, max_num_hands=2):
+        """Detect every hand in an RGB frame in a worker process
+
+        Runs SignLanguageDetector.detect_all_landmarks, so nothing is drawn
+        and mirroring is applied to the coordinates rather than the pixels.
+        Returns (H, 21, 3) landmarks and handedness, or (None, []).
+        """
+        frame = np.ascontiguousarray(rgb_frame, dtype=np.uint8)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f'Frame of {frame.nbytes} bytes exceeds the {self.slot_bytes} byte slot size')
+
+        try:
+            slot = self._free_slots.get(timeout=self.slot_timeout) if self.slot_timeout else self._free_slots.get_nowait()
+        except queue.Empty:
+            raise WorkerPoolFull(f'All {self.max_queue_depth} inference slots are busy')
+
+        pending = _PendingResult()
+        request_id = next(self._request_ids)
+        try:
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf,
+                              offset=slot * self.slot_bytes)
+            view[...] = frame
+            del view
+
+            # Under the lock, so the worker cannot be replaced in between
+            with self._pending_lock:
+                worker = self._pick_worker(client_id)
+                self._task_queues[worker].put((request_id, slot, frame.shape, mirror, client_id, max_num_hands))
+                self._pending[request_id] = pending
+                self._in_flight[request_id] = (worker, slot)
+        except Exception:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+                self._in_flight.pop(request_id, None)
+            self._free_slots.put(slot)
+            raise
+
+        # The slot is returned by the collector once the worker is done with it
+        if not pending.event.wait(timeout):
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise TimeoutError('Timed out waiting for an inference worker')
+        if isinstance(pending.error, Exception):
+            raise pending.error
+        if pending.error is not None:
+            raise RuntimeError(pending.error)
+        return pending.hands
+
+    def _pick_worker(self, client_id):
+        if client_id is None:
+            return next(self._round_robin) % self.num_workers
+        return hash(client_id) % self.num_workers
+
+    def _start_worker(self, worker):
+        # A fresh queue, so the new process never sees tasks meant for the old one
+        task_queue = self._context.Queue()
+        result_conn, worker_conn = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main, args=(task_queue, worker_conn, *self._worker_args), daemon=True)
+        process.start()
+        # Only the worker keeps the sending end open
+        worker_conn.close()
+        self._task_queues[worker] = task_queue
+        self._result_conns[worker] = result_conn
+        self._processes[worker] = process
+
+    def _collect_results(self):
+        while not self._closing:
+            try:
+                conns = list(self._result_conns)
+                # A process's sentinel becomes ready when it exits
+                ready = connection.wait(conns + [process.sentinel for process in self._processes],
+                                        timeout=self.check_interval)
+                for result_conn in conns:
+                    if result_conn in ready:
+                        self._receive(result_conn)
+                self._check_workers()
+            except Exception:
+                logger.exception("Error collecting inference results")
+
+    def _receive(self, result_conn):
+        """Complete the requests of every result waiting in a worker's pipe"""
+        try:
+            while result_conn.poll():
+                self._complete(*result_conn.recv())
+        except (EOFError, OSError):
+            # The worker exited; _check_workers restarts it
+            pass
+
+    def _complete(self, request_id, slot, hands, error):
+        with self._pending_lock:
+            # Frames of a worker that died were already failed and their slots reclaimed
+            if self._in_flight.pop(request_id, None) is None:
+                return
+            pending = self._pending.pop(request_id, None)
+        self._free_slots.put(slot)
+        if pending is not None:
+            pending.hands = hands
+            pending.error = error
+            pending.event.set()
+
+    def _check_workers(self):
+        """Fail the frames of worker processes that exited, reclaim their slots and restart them"""
+        for worker, process in enumerate(self._processes):
+            if self._closing or process.exitcode is None:
+                continue
+            logger.error(f"Inference worker {worker} exited with code {process.exitcode}, restarting it")
+            # Results it sent before exiting still count
+            self._receive(self._result_conns[worker])
+            self._result_conns[worker].close()
+            failed = []
+            with self._pending_lock:
+                lost = [request_id for request_id, (owner, _) in self._in_flight.items() if owner == worker]
+                for request_id in lost:
+                    _, slot = self._in_flight.pop(request_id)
+                    self._free_slots.put(slot)
+                    pending = self._pending.pop(request_id, None)
+                    if pending is not None:
+                        failed.append(pending)
+                self._start_worker(worker)
+                self.restarts += 1
+            for pending in failed:
+                pending.error = WorkerDied('The inference worker exited before finishing the frame')
+                pending.event.set()
+
+    def close(self):
+        with self._pending_lock:
+            self._closing = True
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._collector.join(timeout=5)
+        for result_conn in self._result_conns:
+            result_conn.close()
+        self._shm.close()
+        self._shm.unlink()
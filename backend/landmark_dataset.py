@@ -0,0 +1,153 @@
+"""Chunked on-disk dataset of labelled hand landmarks
+
+A dataset directory holds numbered chunk files, each an (N, 21, 3) float32
+.npy array, and a manifest.json that maps every source file to its label,
+its chunk and its rows there:
+
+    {
+      "version": 1,
+      "options": {...},             extraction options the rows depend on
+      "chunks": ["landmarks-00000.npy", ...],
+      "files": {
+        "A/clip1.mp4": {"label": "A", "size": 1234, "mtime_ns": 1700000000000000000,
+                        "frames": 120, "chunk": 0, "offset": 0, "count": 57},
+        ...
+      }
+    }
+
+Chunks are memory-mapped when read, so a dataset larger than memory can be
+read one label at a time. Files are added to the manifest only once their
+rows are in a chunk on disk, and both are written atomically, so an
+interrupted run loses at most the files of the chunk being filled.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+
+def _atomic_write(path, write):
+    """Write a file through a temporary file renamed over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.dataset-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class LandmarkDataset:
+    """Reads and appends to a landmark dataset directory"""
+
+    def __init__(self, directory, chunk_frames=8192):
+        self.directory = directory
+        # Rows buffered before a chunk is written
+        self.chunk_frames = chunk_frames
+        self.manifest = {'version': MANIFEST_VERSION, 'options': {}, 'chunks': [], 'files': {}}
+        self._chunks = {}
+        self._buffer = []
+        self._buffered_rows = 0
+        self._buffered_files = {}
+        path = os.path.join(directory, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported dataset version {manifest.get('version')} in {path}")
+            self.manifest = manifest
+
+    @property
+    def files(self):
+        return self.manifest['files']
+
+    def is_current(self, name, size, mtime_ns):
+        """True if the source file is in the dataset and unchanged since"""
+        entry = self.files.get(name)
+        return entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns
+
+    def remove(self, name):
+        """Forget a source file; its rows stay in their chunk, unreferenced"""
+        self.files.pop(name, None)
+
+    def add(self, name, label, size, mtime_ns, frames, landmarks):
+        """Buffer a source file's (N, 21, 3) landmarks, writing a chunk once enough are buffered"""
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+        entry = {'label': label, 'size': size, 'mtime_ns': mtime_ns, 'frames': frames,
+                 'chunk': None, 'offset': 0, 'count': len(landmarks)}
+        if len(landmarks):
+            entry['offset'] = self._buffered_rows
+            self._buffer.append(landmarks)
+            self._buffered_rows += len(landmarks)
+        self._buffered_files[name] = entry
+        if self._buffered_rows >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows as a new chunk and record their files in the manifest"""
+        if not self._buffered_files:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self._buffer:
+            chunk_index = len(self.manifest['chunks'])
+            chunk_name = f'landmarks-{chunk_index:05d}.npy'
+            rows = np.concatenate(self._buffer)
+            _atomic_write(os.path.join(self.directory, chunk_name), lambda f: np.save(f, rows))
+            self.manifest['chunks'].append(chunk_name)
+            for entry in self._buffered_files.values():
+                if entry['count']:
+                    entry['chunk'] = chunk_index
+        self.files.update(self._buffered_files)
+        self._buffer = []
+        self._buffered_rows = 0
+        self._buffered_files = {}
+        self.save_manifest()
+
+    def save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        data = json.dumps(self.manifest, indent=1, sort_keys=True).encode('utf-8')
+        _atomic_write(os.path.join(self.directory, MANIFEST_NAME), lambda f: f.write(data))
+
+    def _chunk(self, index):
+        chunk = self._chunks.get(index)
+        if chunk is None:
+            chunk = self._chunks[index] = np.load(
+                os.path.join(self.directory, self.manifest['chunks'][index]), mmap_mode='r')
+        return chunk
+
+    def labels(self):
+        return sorted({entry['label'] for entry in self.files.values()})
+
+    def file_landmarks(self, name):
+        """(N, 21, 3) landmarks of one source file, as a memory-mapped view"""
+        entry = self.files[name]
+        if not entry['count']:
+            return np.empty((0, 21, 3), dtype=np.float32)
+        return self._chunk(entry['chunk'])[entry['offset']:entry['offset'] + entry['count']]
+
+    def landmarks(self, label):
+        """All (N, 21, 3) landmarks of a label, in source file order"""
+        parts = [self.file_landmarks(name) for name, entry in sorted(self.files.items())
+                 if entry['label'] == label and entry['count']]
+        return np.concatenate(parts) if parts else np.empty((0, 21, 3), dtype=np.float32)
+
+    def stats(self):
+        counts = {}
+        for entry in self.files.values():
+            counts[entry['label']] = counts.get(entry['label'], 0) + entry['count']
+        return {
+            'files': len(self.files),
+            'chunks': len(self.manifest['chunks']),
+            'frames': sum(counts.values()),
+            'frames_per_label': dict(sorted(counts.items()))
+        }
@@ -1,7 +1,10 @@
 from sign_detector import SignLanguageDetector
 from sign_classifier import SignClassifier
 import cv2
-import time
+import numpy as np
+
+# Frames captured per letter when SPACE is pressed in calibration mode
+CALIBRATION_BURST_FRAMES = 30
 
 def main():
     detector = SignLanguageDetector()
@@ -25,6 +28,8 @@ def main():
     # Application state
     calibration_mode = False
     current_letter_index = 0
+    # Landmarks collected for the current letter, None when not capturing
+    burst_samples = None
     
     print("\nASL Alphabet Recognition System")
     print("============================")
@@ -67,8 +72,23 @@ def main():
                     # Display calibration instructions
                     cv2.putText(frame, f"Show sign for letter '{current_letter}'", 
                               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    cv2.putText(frame, "Press SPACE to capture", 
-                              (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+                    if burst_samples is None:
+                        cv2.putText(frame, "Press SPACE to capture", 
+                                  (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+                    else:
+                        # Collect a burst of frames, moving the hand slightly helps
+                        burst_samples.append(landmarks)
+                        cv2.putText(frame, f"Capturing {len(burst_samples)}/{CALIBRATION_BURST_FRAMES}", 
+                                  (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+                        if len(burst_samples) >= CALIBRATION_BURST_FRAMES:
+                            if classifier.add_reference_samples(current_letter, np.stack(burst_samples)):
+                                print(f"Captured sign for letter '{current_letter}'")
+                                current_letter_index += 1
+                                if current_letter_index < len(classifier.letters):
+                                    print(f"Now show sign for letter '{classifier.letters[current_letter_index]}'")
+                            else:
+                                print("Failed to capture sign. Please try again.")
+                            burst_samples = None
                 else:
                     calibration_mode = False
                     print("\nCalibration completed! Press 's' to save the calibration data.")
@@ -92,6 +112,7 @@ def main():
         elif key == ord('c'):
             calibration_mode = not calibration_mode
             current_letter_index = 0
+            burst_samples = None
             if calibration_mode:
                 print("\nEntering calibration mode...")
                 print("Show each letter sign and press SPACE to capture")
@@ -112,16 +133,10 @@ def main():
                 print("Reset to default calibration")
             else:
                 print("No default calibration available")
-        elif key == ord(' ') and calibration_mode and landmarks is not None:
+        elif key == ord(' ') and calibration_mode and burst_samples is None:
             if current_letter_index < len(classifier.letters):
-                current_letter = classifier.letters[current_letter_index]
-                if classifier.add_reference_sign(current_letter, landmarks):
-                    print(f"Captured sign for letter '{current_letter}'")
-                    current_letter_index += 1
-                    if current_letter_index < len(classifier.letters):
-                        print(f"Now show sign for letter '{classifier.letters[current_letter_index]}'")
-                else:
-                    print("Failed to capture sign. Please try again.")
+                # Start capturing a burst of frames for the current letter
+                burst_samples = []
     
     cap.release()
     cv2.destroyAllWindows()
@@ -0,0 +1,138 @@
+import collections
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingItem:
+    def __init__(self, classifier, landmarks):
+        self.classifier = classifier
+        self.landmarks = landmarks
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatchScheduler:
+    """Classifies the landmarks of concurrent requests together
+
+    Requests hand their landmarks to recognize_signs() and block while a
+    background thread collects them. Once max_batch_size requests are
+    waiting, or the oldest has waited max_wait_ms, the batch is classified
+    with one recognize_signs call per classifier (requests of different
+    profiles can share a batch) and each request gets its own rows back. max_wait_ms
+    bounds the latency a lone request pays for batching. With max_wait_ms=0
+    nothing is held back: a batch is whatever arrived while the previous
+    one ran, so batches only grow under load.
+    on_batch, if given, is called with each batch's size and its requests'
+    queue waits in seconds. A request that gets no answer within its timeout
+    raises TimeoutError instead of blocking forever.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait_ms=0.0, on_batch=None):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.on_batch = on_batch
+        self._pending = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stats = {'batches': 0, 'requests': 0, 'max_batch_size': 0, 'queue_wait_seconds': 0.0}
+
+    def recognize_signs(self, classifier, landmarks, timeout=10.0):
+        """Like classifier.recognize_signs(landmarks), run as part of a batch"""
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+        item = _PendingItem(classifier, landmarks)
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='micro-batch', daemon=True)
+                self._thread.start()
+            self._pending.append(item)
+            self._condition.notify()
+        if not item.done.wait(timeout):
+            with self._condition:
+                try:
+                    self._pending.remove(item)
+                except ValueError:
+                    pass
+            raise TimeoutError('Timed out waiting for the classification batch')
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # Keep the thread alive for the next batch; no request is left waiting
+                logger.exception("Error running classification batch")
+                for item in batch:
+                    if item.result is None and item.error is None:
+                        item.error = e
+            finally:
+                for item in batch:
+                    item.done.set()
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        waits = [started - item.enqueued for item in batch]
+
+        # One call per classifier over the concatenated landmarks
+        groups = collections.defaultdict(list)
+        for item in batch:
+            groups[id(item.classifier)].append(item)
+        for items in groups.values():
+            self._classify(items)
+
+        with self._condition:
+            self._stats['batches'] += 1
+            self._stats['requests'] += len(batch)
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+            self._stats['queue_wait_seconds'] += sum(waits)
+        if self.on_batch is not None:
+            self.on_batch(len(batch), waits)
+
+    def _next_batch(self):
+        """Wait for a full batch, or for the oldest request's wait to run out"""
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            deadline = self._pending[0].enqueued + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+
+    @staticmethod
+    def _classify(items):
+        try:
+            signs, confidences = items[0].classifier.recognize_signs(
+                np.concatenate([item.landmarks for item in items]))
+            offset = 0
+            for item in items:
+                end = offset + len(item.landmarks)
+                item.result = (signs[offset:end], confidences[offset:end])
+                offset = end
+        except Exception as e:
+            for item in items:
+                item.error = e
+        finally:
+            for item in items:
+                item.done.set()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._pending)
+        stats['mean_batch_size'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        stats['mean_queue_wait_ms'] = (1000 * stats.pop('queue_wait_seconds') / stats['requests']
+                                       if stats['requests'] else 0.0)
+        return stats
@@ -0,0 +1,114 @@
+import collections
+import threading
+
+import cv2
+import numpy as np
+
+
+class SkipCounter:
+    """Thread-safe counts of gated frames, shareable between gates"""
+
+    def __init__(self):
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            frames = self._counts['frames']
+            detections_skipped = self._counts['detections_skipped']
+            classifications_skipped = self._counts['classifications_skipped']
+        return {
+            'frames': frames,
+            'detections_skipped': detections_skipped,
+            'classifications_skipped': classifications_skipped,
+            'detection_skip_rate': detections_skipped / frames if frames else 0.0,
+            'classification_skip_rate': classifications_skipped / frames if frames else 0.0
+        }
+
+
+class MotionGate:
+    """Reuses the last result of a stream while its input stays the same
+
+    Before hand detection, a grayscale thumbnail of the frame is compared
+    with the one of the last fully processed frame; if no cell changed by
+    more than frame_threshold gray levels, MediaPipe is skipped as well. After
+    detection, landmarks that moved on average less than landmark_threshold
+    times the hand's size skip classification. Comparisons are always made
+    against the last processed frame, so slow drift cannot accumulate.
+    A threshold of 0 disables that check. A stream's concurrent requests
+    each carry their own frame thumbnail from check_frame to store.
+    """
+
+    def __init__(self, landmark_threshold=0.02, frame_threshold=6.0, thumbnail_size=16, totals=None):
+        self.landmark_threshold = landmark_threshold
+        self.frame_threshold = frame_threshold
+        self.thumbnail_size = thumbnail_size
+        self.counter = SkipCounter()
+        # Optional counter shared with other gates, e.g. server-wide totals
+        self.totals = totals
+        self._lock = threading.Lock()
+        self._thumbnail = None
+        self._landmarks = None
+        self._result = None
+        self._key = None
+
+    def _count(self, key):
+        self.counter.add(key)
+        if self.totals is not None:
+            self.totals.add(key)
+
+    def count_frame(self):
+        """Count a frame for the skip rates; check_frame does this itself"""
+        self._count('frames')
+
+    def thumbnail(self, rgb_frame):
+        """Grayscale thumbnail of a frame for check_frame and store, or None without frame checks"""
+        if not self.frame_threshold:
+            return None
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        size = (self.thumbnail_size, self.thumbnail_size)
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def check_frame(self, thumbnail, key=None):
+        """Return the cached result if a frame's thumbnail matches the last processed one, else None
+
+        key identifies how the result was computed (e.g. the classifier,
+        its revision and the request options); a result stored under a
+        different key is never reused.
+        """
+        self.count_frame()
+        with self._lock:
+            if (thumbnail is not None and self._thumbnail is not None and self._result is not None
+                    and self._key == key and np.abs(thumbnail - self._thumbnail).max() <= self.frame_threshold):
+                self._count('detections_skipped')
+                return self._result
+        return None
+
+    def check_landmarks(self, landmarks, key=None):
+        """Return the cached result if the hand has barely moved, else None"""
+        if not self.landmark_threshold or landmarks is None:
+            return None
+        with self._lock:
+            if (self._landmarks is None or self._result is None or self._key != key
+                    or self._landmarks.shape != np.shape(landmarks)):
+                return None
+            # Works for one hand's (21, 3) landmarks or a stack of hands
+            reference = self._landmarks.reshape(-1, 3)[:, :2]
+            moved = np.linalg.norm(np.reshape(landmarks, (-1, 3))[:, :2] - reference, axis=1).mean()
+            hand_size = np.ptp(reference, axis=0).max()
+            if moved <= self.landmark_threshold * hand_size:
+                self._count('classifications_skipped')
+                return self._result
+        return None
+
+    def store(self, landmarks, result, key=None, thumbnail=None):
+        """Remember a fully processed frame's landmarks, result and thumbnail"""
+        with self._lock:
+            self._key = key
+            self._landmarks = None if landmarks is None else np.array(landmarks, dtype=np.float32)
+            self._result = result
+            self._thumbnail = thumbnail
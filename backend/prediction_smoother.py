@@ -0,0 +1,63 @@
+import collections
+import threading
+
+SmoothedPrediction = collections.namedtuple('SmoothedPrediction', ['letter', 'confidence', 'emitted'])
+
+
+class PredictionSmoother:
+    """Debounces per-frame predictions from one stream into a stable letter
+
+    The last `window` predictions are kept in a ring buffer with a running
+    count per letter, so each update is O(1). A letter becomes stable once it
+    has enter_votes of the window and stays stable until it drops below
+    exit_votes, which keeps a single stray frame from flipping the result.
+    The stable letter's confidence is an exponential moving average with
+    weight alpha. update() reports the letter in `emitted` on the frame it
+    becomes stable.
+    """
+
+    def __init__(self, window=8, enter_votes=5, exit_votes=3, alpha=0.3):
+        self.window = max(1, window)
+        self.enter_votes = max(1, min(enter_votes, self.window))
+        self.exit_votes = max(1, min(exit_votes, self.enter_votes))
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._ring = [None] * self.window
+            self._position = 0
+            self._counts = collections.Counter()
+            self.stable_letter = None
+            self.stable_confidence = 0.0
+
+    def update(self, letter, confidence=0.0):
+        """Add one frame's prediction (None when nothing was recognized)"""
+        with self._lock:
+            # Replace the oldest prediction in the window
+            oldest = self._ring[self._position]
+            if oldest is not None:
+                self._counts[oldest] -= 1
+                if not self._counts[oldest]:
+                    del self._counts[oldest]
+            self._ring[self._position] = letter
+            self._position = (self._position + 1) % self.window
+            if letter is not None:
+                self._counts[letter] += 1
+
+            if self.stable_letter is not None and self._counts[self.stable_letter] < self.exit_votes:
+                self.stable_letter = None
+                self.stable_confidence = 0.0
+
+            emitted = None
+            if self.stable_letter is None:
+                if letter is not None and self._counts[letter] >= self.enter_votes:
+                    self.stable_letter = emitted = letter
+                    self.stable_confidence = float(confidence)
+            else:
+                observed = float(confidence) if letter == self.stable_letter else 0.0
+                self.stable_confidence += self.alpha * (observed - self.stable_confidence)
+
+            return SmoothedPrediction(self.stable_letter, self.stable_confidence, emitted)
+
@@ -0,0 +1,146 @@
+import collections
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from sign_classifier import SignClassifier
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class _CachedProfile:
+    def __init__(self, classifier):
+        self.classifier = classifier
+        # Requests currently using the classifier; it is not evicted while any are
+        self.leases = 0
+
+
+class ClassifierCache:
+    """LRU cache of per-profile SignClassifiers
+
+    Each profile keeps its calibration in <profile_dir>/<profile_id>.sbcal
+    and falls back to the shared default calibration until it saves its
+    own. Profiles are loaded lazily on first use, outside the cache's lock,
+    so a lookup never waits on another profile's disk I/O. Requests check a
+    profile out for as long as they use it, and only profiles nobody has
+    checked out are evicted, least recently used first, once there are more
+    than max_profiles of them or their reference matrices exceed max_bytes.
+    Profiles with unsaved calibration changes are evicted last, and their
+    changes are then dropped rather than saved unasked. Requests without a
+    profile use the default classifier, which is built by default_factory
+    on first use and never evicted.
+    """
+
+    def __init__(self, default_factory=SignClassifier, profile_dir='profiles', max_profiles=64,
+                 max_bytes=256 * 1024 * 1024):
+        self.default_factory = default_factory
+        self.profile_dir = profile_dir
+        self.max_profiles = max(1, max_profiles)
+        self.max_bytes = max_bytes
+        self._default_classifier = None
+        self._profiles = collections.OrderedDict()
+        # Profiles being loaded, each with an event set once it is done
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._default_lock = threading.Lock()
+
+    @property
+    def default_classifier(self):
+        """The shared classifier, loading it if needed"""
+        if self._default_classifier is None:
+            with self._default_lock:
+                if self._default_classifier is None:
+                    self._default_classifier = self.default_factory()
+        return self._default_classifier
+
+    @property
+    def default_loaded(self):
+        return self._default_classifier is not None
+
+    @contextmanager
+    def checkout(self, profile_id=None):
+        """Use the classifier for a profile for the duration of a with-block, loading it if needed"""
+        if profile_id is None:
+            yield self.default_classifier
+            return
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            raise ValueError(f'Invalid profile id {profile_id!r}')
+
+        profile = self._acquire(profile_id)
+        try:
+            yield profile.classifier
+        finally:
+            with self._lock:
+                profile.leases -= 1
+                self._evict_locked()
+
+    def _acquire(self, profile_id):
+        while True:
+            with self._lock:
+                profile = self._profiles.get(profile_id)
+                if profile is not None:
+                    profile.leases += 1
+                    self._profiles.move_to_end(profile_id)
+                    return profile
+                loading = self._loading.get(profile_id)
+                if loading is None:
+                    loading = self._loading[profile_id] = threading.Event()
+                    break
+            # Another request is loading the same profile
+            loading.wait()
+
+        try:
+            classifier = self._load(profile_id)
+            with self._lock:
+                profile = self._profiles[profile_id] = _CachedProfile(classifier)
+                profile.leases += 1
+                self._evict_locked()
+            return profile
+        finally:
+            with self._lock:
+                del self._loading[profile_id]
+            loading.set()
+
+    def _load(self, profile_id):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        default_classifier = self.default_classifier
+        return SignClassifier(
+            reference_file=os.path.join(self.profile_dir, f'{profile_id}.sbcal'),
+            default_reference_file=default_classifier.default_reference_file,
+            stage_timer=default_classifier.stage_timer,
+            engine=default_classifier.engine,
+            profile=True
+        )
+
+    def _evict_locked(self):
+        # The most recently used profile always stays, even on its own over the limits
+        for keep_unsaved in (True, False):
+            for profile_id, profile in list(self._profiles.items())[:-1]:
+                if not self._over_limits_locked():
+                    return
+                unsaved = profile.classifier.has_unsaved_changes
+                if profile.leases or (keep_unsaved and unsaved):
+                    continue
+                del self._profiles[profile_id]
+                if unsaved:
+                    logger.warning(f"Dropped unsaved calibration changes of evicted profile {profile_id}")
+
+    def _over_limits_locked(self):
+        return len(self._profiles) > self.max_profiles or self._total_bytes_locked() > self.max_bytes
+
+    def _total_bytes_locked(self):
+        return sum(profile.classifier.reference_matrix.nbytes for profile in self._profiles.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'profiles': len(self._profiles),
+                'in_use': sum(1 for profile in self._profiles.values() if profile.leases),
+                'bytes': self._total_bytes_locked(),
+                'max_profiles': self.max_profiles,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,49 @@
+import collections
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+
+
+class RequestProfiler:
+    """Profiles a random sample of requests, or requested ones, with cProfile
+
+    Only one request is profiled at a time, since the profiler slows down
+    the code it watches; requests arriving meanwhile run unprofiled. The
+    `keep` most recent profiles are kept as the top `top` functions by
+    cumulative time.
+    """
+
+    def __init__(self, sample_rate=0.0, keep=20, top=30):
+        self.sample_rate = sample_rate
+        self.top = top
+        self._profiles = collections.deque(maxlen=keep)
+        self._active = threading.Lock()
+
+    def start(self, forced=False):
+        """Start profiling the current request if it is sampled; returns the profile or None"""
+        if not forced and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+        if not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, label, duration):
+        """Stop a profile started by start() and keep its summary"""
+        profile.disable()
+        self._active.release()
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(self.top)
+        self._profiles.append({
+            'request': label,
+            'duration_ms': duration * 1000,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'stats': output.getvalue()
+        })
+
+    def recent(self):
+        return list(self._profiles)
@@ -0,0 +1,289 @@
+"""Recognition of motion signs (J, Z) from landmark sequences
+
+A stream's recent landmarks are kept in a SequenceBuffer. Every few frames,
+and only while the hand is moving, the buffer is compared with recorded
+motion templates using dynamic time warping (DTW) restricted to a band
+around the diagonal. Templates are ranked by their LB_Keogh lower bound
+first, and DTW stops early once a template cannot beat the best match so
+far, so most comparisons end after a handful of vectorized steps.
+"""
+import collections
+import os
+import tempfile
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Landmarks whose path is part of the features: wrist, index tip, pinky tip
+TRACKED_POINTS = [0, 8, 20]
+
+MotionMatch = collections.namedtuple('MotionMatch', ['letter', 'confidence', 'distance'])
+
+
+def sequence_features(landmarks):
+    """Turn an (N, 21, 3) landmark sequence into (N, 69) features
+
+    Each frame has its wrist-relative, unit-length hand pose followed by the
+    x/y path of the tracked points relative to the sequence's mean wrist
+    position, in units of hand size, so the same gesture matches wherever
+    and at whatever distance from the camera it is made.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+    relative = (landmarks - landmarks[:, :1, :]).reshape(len(landmarks), -1)
+    norms = np.linalg.norm(relative, axis=1, keepdims=True)
+    pose = relative / np.maximum(norms, 1e-6)
+
+    # Wrist to middle finger knuckle, robust to a few bad frames
+    hand_size = max(float(np.median(np.linalg.norm(landmarks[:, 9, :2] - landmarks[:, 0, :2], axis=1))), 1e-6)
+    path = (landmarks[:, TRACKED_POINTS, :2] - landmarks[:, 0, :2].mean(axis=0)) / hand_size
+    return np.hstack([pose, path.reshape(len(landmarks), -1)]).astype(np.float32)
+
+
+def motion_extent(landmarks):
+    """Distance travelled by the tracked fingertips, in units of hand size"""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if len(landmarks) < 2:
+        return 0.0
+    hand_size = max(float(np.median(np.linalg.norm(landmarks[:, 9, :2] - landmarks[:, 0, :2], axis=1))), 1e-6)
+    steps = np.linalg.norm(np.diff(landmarks[:, TRACKED_POINTS[1:], :2], axis=0), axis=2)
+    return float(steps.sum(axis=0).max()) / hand_size
+
+
+def resample(sequence, length):
+    """Resample a sequence to length frames by nearest-frame indexing"""
+    indexes = np.round(np.linspace(0, len(sequence) - 1, length)).astype(int)
+    return sequence[indexes]
+
+
+def envelope(sequence, band):
+    """Upper and lower LB_Keogh envelopes of a (T, D) sequence"""
+    padded = np.pad(sequence, ((band, band), (0, 0)), mode='edge')
+    windows = sliding_window_view(padded, 2 * band + 1, axis=0)
+    return windows.max(axis=2), windows.min(axis=2)
+
+
+def lb_keogh(query, upper, lower):
+    """Lower bound of the squared-distance DTW cost between query and a template"""
+    above = np.maximum(query - upper, 0.0)
+    below = np.maximum(lower - query, 0.0)
+    return float(np.einsum('ij,ij->', above, above) + np.einsum('ij,ij->', below, below))
+
+
+def banded_dtw(query, template, band, abandon_above=np.inf):
+    """Squared-distance DTW cost of two equal-length sequences within a Sakoe-Chiba band
+
+    Cells are filled one anti-diagonal at a time, each as a single vectorized
+    step. Every warping path crosses at least one of any two consecutive
+    anti-diagonals, so once both exceed abandon_above the result cannot be
+    below it and the search stops, returning inf.
+    """
+    length = len(query)
+    # Pairwise squared distances as one matrix product
+    cost = (np.einsum('ij,ij->i', query, query)[:, np.newaxis] + np.einsum('ij,ij->i', template, template)
+            - 2.0 * query.dot(template.T))
+    np.maximum(cost, 0.0, out=cost)
+
+    # Accumulated costs with a border of inf at row and column 0
+    accumulated = np.full((length + 1, length + 1), np.inf)
+    accumulated[0, 0] = 0.0
+    previous_minimum = np.inf
+    for diagonal in range(2, 2 * length + 1):
+        rows = np.arange(max(1, diagonal - length, (diagonal - band + 1) // 2),
+                         min(length, diagonal - 1, (diagonal + band) // 2) + 1)
+        if not len(rows):
+            continue
+        cols = diagonal - rows
+        best_step = np.minimum(np.minimum(accumulated[rows - 1, cols], accumulated[rows, cols - 1]),
+                               accumulated[rows - 1, cols - 1])
+        values = cost[rows - 1, cols - 1] + best_step
+        accumulated[rows, cols] = values
+
+        minimum = values.min()
+        if minimum > abandon_above and previous_minimum > abandon_above:
+            return np.inf
+        previous_minimum = minimum
+    return accumulated[length, length]
+
+
+class SequenceBuffer:
+    """Rolling buffer of one stream's landmarks for motion matching
+
+    Frames without a hand end the current sequence. Given several hands,
+    it follows the one closest to the hand in the previous frame. due() is
+    true every `stride` frames once the buffer holds enough frames to match.
+    """
+
+    def __init__(self, max_frames=48, min_frames=8, stride=3):
+        self.min_frames = min_frames
+        self.stride = max(1, stride)
+        self._frames = collections.deque(maxlen=max_frames)
+        self._since_match = 0
+        self._lock = threading.Lock()
+
+    def push(self, landmarks):
+        with self._lock:
+            if landmarks is None:
+                self._frames.clear()
+            else:
+                landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+                hand = 0
+                if len(landmarks) > 1 and self._frames:
+                    hand = int(np.argmin(np.linalg.norm(landmarks[:, 0, :2] - self._frames[-1][0, :2], axis=1)))
+                self._frames.append(landmarks[hand])
+            self._since_match += 1
+
+    def due(self):
+        with self._lock:
+            if len(self._frames) < self.min_frames or self._since_match < self.stride:
+                return False
+            self._since_match = 0
+            return True
+
+    def frames(self):
+        with self._lock:
+            return np.stack(self._frames) if self._frames else np.empty((0, 21, 3), dtype=np.float32)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+
+class SequenceMatcher:
+    """Motion templates for dynamic signs and DTW matching against them
+
+    Templates are stored as raw landmark sequences in an .npz file next to
+    the static calibration, falling back to the default templates.
+    """
+
+    def __init__(self, template_file='asl_motion_templates.npz',
+                 default_template_file='default_asl_motion_templates.npz'):
+        self.template_file = template_file
+        self.default_template_file = default_template_file
+        # Warping band as a fraction of the template length
+        self.band_fraction = 0.2
+        # Candidate windows are the template length scaled by these factors
+        self.speed_factors = (0.75, 1.0, 1.33)
+        # RMS per-frame feature distance at which confidence reaches zero
+        self.distance_threshold = 1.0
+        self.confidence_threshold = 0.3
+        # Fingertip travel, in hand sizes, below which no motion sign is tried
+        self.min_motion = 1.0
+        self.max_templates_per_letter = 8
+        # Longer recordings are resampled so matching stays within the frame budget
+        self.max_template_frames = 36
+        self.templates = {}
+        self._prepared = []
+        self.load_templates()
+
+    def load_templates(self, default_only=False):
+        """Load templates from the template file, or else the default one"""
+        paths = (self.default_template_file,) if default_only else (self.template_file, self.default_template_file)
+        for path in paths:
+            if path and os.path.exists(path):
+                try:
+                    with np.load(path) as data:
+                        templates = collections.defaultdict(list)
+                        for key in sorted(data.files):
+                            letter = key.rsplit('_', 1)[0]
+                            templates[letter].append(data[key].astype(np.float32))
+                    self.templates = dict(templates)
+                    self._prepare()
+                    return True
+                except Exception as e:
+                    print(f"Error loading motion templates from {path}: {str(e)}")
+        self.templates = {}
+        self._prepare()
+        return False
+
+    def _prepare(self):
+        """Precompute features and envelopes of every template"""
+        prepared = []
+        for letter, sequences in self.templates.items():
+            for sequence in sequences:
+                features = sequence_features(sequence)
+                band = max(1, int(round(self.band_fraction * len(features))))
+                upper, lower = envelope(features, band)
+                prepared.append((letter, features, band, upper, lower))
+        self._prepared = prepared
+
+    @property
+    def max_template_length(self):
+        return max((len(features) for _, features, _, _, _ in self._prepared), default=0)
+
+    def add_template(self, letter, landmarks, replace=True):
+        """Record an (N, 21, 3) landmark sequence as a template for a motion letter"""
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+        if len(landmarks) < 4:
+            return False
+        if len(landmarks) > self.max_template_frames:
+            landmarks = resample(landmarks, self.max_template_frames)
+        sequences = [] if replace else list(self.templates.get(letter, []))
+        sequences.append(landmarks)
+        self.templates[letter] = sequences[-self.max_templates_per_letter:]
+        self._prepare()
+        return True
+
+    def save_templates(self, path=None):
+        """Atomically write the templates to path (the template file by default)"""
+        path = path or self.template_file
+        arrays = {
+            f'{letter}_{i:03d}': sequence
+            for letter, sequences in self.templates.items()
+            for i, sequence in enumerate(sequences)
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.motion-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def match(self, landmarks):
+        """Match the end of an (N, 21, 3) landmark sequence against the templates
+
+        Returns a MotionMatch, or None when the hand did not move enough or
+        no template is close enough.
+        """
+        prepared = self._prepared
+        landmarks = np.asarray(landmarks, dtype=np.float32)
+        if not prepared or len(landmarks) < 4 or motion_extent(landmarks) < self.min_motion:
+            return None
+
+        # Candidate windows at a few speeds, resampled to each template's length
+        candidates = []
+        for letter, template, band, upper, lower in prepared:
+            length = len(template)
+            for factor in self.speed_factors:
+                window = int(round(length * factor))
+                if window > len(landmarks):
+                    continue
+                query = resample(sequence_features(landmarks[-window:]), length)
+                candidates.append((lb_keogh(query, upper, lower), letter, query, template, band))
+        if not candidates:
+            return None
+
+        # Cheapest lower bounds first, so DTW can abandon most of the rest
+        candidates.sort(key=lambda candidate: candidate[0])
+        best_cost, best_letter, best_length = np.inf, None, 1
+        for bound, letter, query, template, band in candidates:
+            if bound / len(template) >= best_cost / best_length:
+                break
+            cost = banded_dtw(query, template, band, abandon_above=best_cost / best_length * len(template))
+            if cost / len(template) < best_cost / best_length:
+                best_cost, best_letter, best_length = cost, letter, len(template)
+
+        if best_letter is None:
+            return None
+        distance = float(np.sqrt(best_cost / best_length))
+        confidence = float(np.clip(1 - distance / self.distance_threshold, 0, 1))
+        if confidence < self.confidence_threshold:
+            return None
+        return MotionMatch(best_letter, confidence, distance)
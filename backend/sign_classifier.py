@@ -1,77 +1,299 @@
 import numpy as np
-from sklearn.preprocessing import StandardScaler
+import calibration_store
+from sequence_matcher import SequenceMatcher
+from softmax_model import SoftmaxModel, fit_softmax_model
+import collections
+import contextlib
+import hashlib
+import itertools
 import json
 import os
 import pickle
 import logging
-import shutil
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class _LegacyScaler:
+    """Stands in for a pickled sklearn StandardScaler, keeping only its state"""
+
+
+class _LegacyScalerUnpickler(pickle.Unpickler):
+    """Reads a pickled StandardScaler's mean_ and scale_ without importing sklearn"""
+
+    def find_class(self, module, name):
+        if module.startswith('sklearn.') and name == 'StandardScaler':
+            return _LegacyScaler
+        return super().find_class(module, name)
+
+
+# Source of SignClassifier.revision, shared so that no two classifiers
+# ever report the same revision
+_revisions = itertools.count(1)
+
+# 'nearest' votes among the nearest reference samples; 'softmax' uses a
+# trained SoftmaxModel, falling back to 'nearest' while there is none or
+# the references changed since it was trained
+ENGINES = ('nearest', 'softmax')
+
+# Reference samples grouped by label: row_labels, matrix and sq_norms have one
+# entry per sample; labels and starts give each label and its first row
+ReferenceIndex = collections.namedtuple(
+    'ReferenceIndex', ['row_labels', 'matrix', 'sq_norms', 'labels', 'starts'])
+
 class SignClassifier:
-    def __init__(self):
-        self.scaler = StandardScaler()
+    def __init__(self, reference_file=None, default_reference_file=None, stage_timer=None, engine='nearest',
+                 profile=False, use_defaults=True):
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown classifier engine {engine!r}, expected one of {ENGINES}')
+        self.engine = engine
+        # Changes whenever the references, scaler, motion templates or model
+        # do, so results cached under it are never served after recalibration
+        self.revision = next(_revisions)
+        # Optional callable taking a stage name and returning a context
+        # manager that times it, e.g. a metrics histogram's time()
+        self.stage_timer = stage_timer
         self.is_scaler_fitted = False
-        # Dictionary to store reference hand poses for different signs
+        # Scaler mean and scale as float32 arrays for whole-array scaling
+        self._scaler_params = None
+        # Dictionary of reference hand poses for different signs, each an
+        # (n, 63) array of calibration samples or prototypes
         self.sign_references = {}
+        # Contiguous float32 view of sign_references, rebuilt only when the
+        # references change
+        self._reference_index = self._build_reference_index([], np.empty((0, 63), dtype=np.float32))
+        # Samples per letter to keep; larger bursts are reduced to this many
+        # k-means prototypes so matching cost stays bounded
+        self.max_samples_per_letter = 32
+        # Neighbours that vote on the recognized letter
+        self.k_neighbors = 5
+        # Set when references change and cleared when they are saved or loaded
+        self.has_unsaved_changes = False
         self.letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-        self.reference_file = 'asl_references.json'
-        self.default_reference_file = 'default_asl_references.json'
-        self.scaler_file = 'scaler.pkl'
-        self.default_scaler_file = 'default_scaler.pkl'
+        # Binary calibration files (see calibration_store.py)
+        self.reference_file = reference_file or 'asl_references.sbcal'
+        self.default_reference_file = default_reference_file or 'default_asl_references.sbcal'
+        # A user profile's classifier reads the shared defaults but never
+        # writes them, except through save_as_default
+        self.profile = profile
+        # Without defaults the classifier neither falls back to nor writes the
+        # default calibration, e.g. when building a calibration from a dataset
+        self.use_defaults = use_defaults
+        # JSON + pickle files from earlier versions, converted on first load.
+        # Only the working-directory calibration can have them.
+        self.legacy_reference_file = None if reference_file else 'asl_references.json'
+        self.legacy_scaler_file = 'scaler.pkl'
+        self.legacy_default_reference_file = 'default_asl_references.json'
+        self.legacy_default_scaler_file = 'default_scaler.pkl'
+        # Distance at which confidence drops to zero, and the minimum
+        # confidence for a match to be reported
+        self.distance_threshold = 10.0  # Adjust based on your calibration
+        self.confidence_threshold = 0.5  # Adjust as needed
         self.load_asl_alphabet_references()
+        # Motion templates for dynamic signs such as J and Z, kept next to the calibration
+        self.sequence_matcher = SequenceMatcher(
+            os.path.splitext(self.reference_file)[0] + '_motion.npz',
+            os.path.splitext(self.default_reference_file)[0] + '_motion.npz'
+        )
+        # Trained model for the 'softmax' engine, also kept next to the calibration
+        self.model_file = os.path.splitext(self.reference_file)[0] + '_model.npz'
+        self.default_model_file = os.path.splitext(self.default_reference_file)[0] + '_model.npz'
+        if not use_defaults:
+            self.sequence_matcher.default_template_file = None
+            self.default_model_file = None
+        self.model = None
+        # (reference index, digest) of the last reference_digest computed
+        self._digest = None
+        self.load_model()
+        
+    def load_model(self, default_only=False):
+        """Load the trained model from the model file, or else the default one"""
+        paths = (self.default_model_file,) if default_only else (self.model_file, self.default_model_file)
+        for path in paths:
+            if path and os.path.exists(path):
+                try:
+                    self.model = SoftmaxModel.load(path)
+                    self._changed()
+                    return True
+                except Exception as e:
+                    print(f"Error loading model from {path}: {str(e)}")
+        self.model = None
+        self._changed()
+        return False
         
     def load_asl_alphabet_references(self):
         """Load ASL alphabet reference data"""
         # First try to load user's calibrated data
-        if os.path.exists(self.reference_file):
-            try:
-                with open(self.reference_file, 'r') as f:
-                    self.sign_references = json.load(f)
-                if os.path.exists(self.scaler_file):
-                    with open(self.scaler_file, 'rb') as f:
-                        self.scaler = pickle.load(f)
-                        self.is_scaler_fitted = True
-                print("Loaded your calibrated ASL reference data")
-                return
-            except:
-                print("Could not load your calibrated data")
+        if self._load_calibration(self.reference_file, self.legacy_reference_file, self.legacy_scaler_file):
+            print("Loaded your calibrated ASL reference data")
+            return
         
         # If no user calibration exists, try to load default references
-        if os.path.exists(self.default_reference_file):
-            try:
-                with open(self.default_reference_file, 'r') as f:
-                    self.sign_references = json.load(f)
-                if os.path.exists(self.default_scaler_file):
-                    with open(self.default_scaler_file, 'rb') as f:
-                        self.scaler = pickle.load(f)
-                        self.is_scaler_fitted = True
-                print("Loaded default ASL reference data")
-                return
-            except:
-                print("Could not load default reference data")
+        if self.use_defaults and self._load_calibration(self.default_reference_file, self.legacy_default_reference_file,
+                                  self.legacy_default_scaler_file):
+            print("Loaded default ASL reference data")
+            return
         
+        self._rebuild_reference_index()
         print("No reference data found. Please use 'c' key to calibrate signs.")
         
+    def _load_calibration(self, path, legacy_reference_file, legacy_scaler_file):
+        """Load a binary calibration file, converting a legacy JSON one first if needed"""
+        if not os.path.exists(path) and legacy_reference_file and os.path.exists(legacy_reference_file):
+            try:
+                self._convert_legacy_calibration(legacy_reference_file, legacy_scaler_file, path)
+            except Exception as e:
+                print(f"Could not convert {legacy_reference_file}: {str(e)}")
+                
+        if not os.path.exists(path):
+            return False
+            
+        try:
+            data = calibration_store.load(path)
+        except calibration_store.CalibrationStoreError as e:
+            print(f"Could not load reference data: {str(e)}")
+            return False
+            
+        if data.scaler_mean is not None:
+            self._scaler_params = (data.scaler_mean, data.scaler_scale)
+            self.is_scaler_fitted = True
+        # The mapped matrix is used directly as the reference index
+        index = self._build_reference_index(data.labels, data.matrix)
+        self.sign_references = {
+            str(label): index.matrix[start:end]
+            for label, start, end in zip(index.labels, index.starts, list(index.starts[1:]) + [len(index.matrix)])
+        }
+        self._reference_index = index
+        self.has_unsaved_changes = False
+        self._changed()
+        return True
+        
+    def _convert_legacy_calibration(self, reference_file, scaler_file, path):
+        """Convert a JSON reference file and pickled StandardScaler to a binary calibration"""
+        with open(reference_file, 'r') as f:
+            references = json.load(f)
+        mean = scale = None
+        if os.path.exists(scaler_file):
+            with open(scaler_file, 'rb') as f:
+                scaler = _LegacyScalerUnpickler(f).load()
+            mean, scale = scaler.mean_, scaler.scale_
+        labels = list(references.keys())
+        calibration_store.save(path, labels, [references[label] for label in labels], mean, scale)
+        # Loads skip the checksum, so check the converted file once here
+        try:
+            calibration_store.load(path, verify=True)
+        except calibration_store.CalibrationStoreError:
+            os.unlink(path)
+            raise
+        print(f"Converted {reference_file} to {path}")
+        
+    def _save_calibration(self, path):
+        index = self._reference_index
+        mean, scale = self._scaler_params if self._scaler_params is not None else (None, None)
+        calibration_store.save(path, index.row_labels.tolist(), index.matrix, mean, scale)
+        
+    @staticmethod
+    def _build_reference_index(row_labels, matrix):
+        """Build a ReferenceIndex, grouping rows by label if they aren't already"""
+        row_labels = np.array(row_labels, dtype=str).reshape(-1)
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(len(row_labels), -1) if len(row_labels) \
+            else np.empty((0, 63), dtype=np.float32)
+        boundaries = np.flatnonzero(row_labels[1:] != row_labels[:-1]) + 1
+        starts = np.concatenate([[0], boundaries]) if len(row_labels) else np.empty(0, dtype=np.intp)
+        if len(np.unique(row_labels)) != len(starts):
+            # Labels are interleaved: sort rows so each label is one block
+            order = np.argsort(row_labels, kind='stable')
+            return SignClassifier._build_reference_index(row_labels[order], matrix[order])
+        matrix = np.ascontiguousarray(matrix)
+        return ReferenceIndex(row_labels, matrix, np.einsum('ij,ij->i', matrix, matrix),
+                              row_labels[starts], starts.astype(np.intp))
+        
+    def _rebuild_reference_index(self):
+        """Rebuild the float32 reference matrix from sign_references"""
+        samples = [np.asarray(self.sign_references[label], dtype=np.float32).reshape(-1, 63)
+                   for label in self.sign_references]
+        row_labels = [label for label, rows in zip(self.sign_references, samples) for _ in range(len(rows))]
+        matrix = np.concatenate(samples) if samples else np.empty((0, 63), dtype=np.float32)
+        # Swap in a single assignment so concurrent readers never see a
+        # matrix and label array from different versions
+        self._reference_index = self._build_reference_index(row_labels, matrix)
+        self._changed()
+        
+    def _changed(self):
+        """Give the classifier a new revision after its references or model changed"""
+        self.revision = next(_revisions)
+        
+    def fit_scaler(self, features):
+        """Fit the feature scaler (mean and unit variance) on (N, 63) normalized features
+        
+        Preprocessing fits it on the first frames it sees; fit it up front to
+        scale every sample of a large calibration the same way.
+        """
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        # Constant features are left unscaled
+        scale[scale == 0] = 1.0
+        self._scaler_params = (mean.astype(np.float32), scale.astype(np.float32))
+        self.is_scaler_fitted = True
+        self._changed()
+        
+    @property
+    def reference_labels(self):
+        return self._reference_index.row_labels
+        
+    @property
+    def reference_matrix(self):
+        return self._reference_index.matrix
+        
+    @property
+    def reference_digest(self):
+        """Digest of the reference samples, computed once per version of them"""
+        index = self._reference_index
+        cached = self._digest
+        if cached is None or cached[0] is not index:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update('\0'.join(index.row_labels.tolist()).encode('utf-8'))
+            digest.update(np.ascontiguousarray(index.matrix, dtype='<f4').data)
+            cached = self._digest = (index, digest.hexdigest())
+        return cached[1]
+        
+    @property
+    def active_model(self):
+        """The model the 'softmax' engine classifies with, or None to vote like 'nearest'
+        
+        A model is only used with the references it was trained alongside.
+        A profile that recalibrated, or that has its own references but
+        only the default model, votes among its references until
+        train_model is called again, so its own calibration always counts.
+        """
+        model = self.model
+        if self.engine != 'softmax' or model is None or model.references != self.reference_digest:
+            return None
+        return model
+        
     def save_references(self):
         """Save reference data to file"""
         try:
             # Save to user's calibration file
-            with open(self.reference_file, 'w') as f:
-                json.dump(self.sign_references, f)
-            with open(self.scaler_file, 'wb') as f:
-                pickle.dump(self.scaler, f)
+            self._save_calibration(self.reference_file)
+            matcher = self.sequence_matcher
+            if matcher.templates:
+                matcher.save_templates()
+            if self.model is not None:
+                self.model.save(self.model_file)
+            self.has_unsaved_changes = False
             print("Calibration data saved successfully")
             
             # Optionally save as default if it doesn't exist
-            if not os.path.exists(self.default_reference_file):
-                with open(self.default_reference_file, 'w') as f:
-                    json.dump(self.sign_references, f)
-                with open(self.default_scaler_file, 'wb') as f:
-                    pickle.dump(self.scaler, f)
+            writes_defaults = self.use_defaults and not self.profile
+            if writes_defaults and not os.path.exists(self.default_reference_file):
+                self._save_calibration(self.default_reference_file)
                 print("Also saved as default reference data")
+            if writes_defaults and matcher.templates and not os.path.exists(matcher.default_template_file):
+                matcher.save_templates(matcher.default_template_file)
+            if writes_defaults and self.model is not None and not os.path.exists(self.default_model_file):
+                self.model.save(self.default_model_file)
             return True
         except Exception as e:
             print(f"Error saving reference data: {str(e)}")
@@ -79,11 +301,15 @@ class SignClassifier:
         
     def save_as_default(self):
         """Save current references as default"""
+        if not self.use_defaults:
+            print("This calibration has no default to save to")
+            return False
         try:
-            with open(self.default_reference_file, 'w') as f:
-                json.dump(self.sign_references, f)
-            with open(self.default_scaler_file, 'wb') as f:
-                pickle.dump(self.scaler, f)
+            self._save_calibration(self.default_reference_file)
+            if self.sequence_matcher.templates:
+                self.sequence_matcher.save_templates(self.sequence_matcher.default_template_file)
+            if self.model is not None:
+                self.model.save(self.default_model_file)
             print("Saved as default reference data")
             return True
         except Exception as e:
@@ -92,94 +318,296 @@ class SignClassifier:
         
     def reset_to_default(self):
         """Reset to default references"""
-        if os.path.exists(self.default_reference_file):
-            try:
-                with open(self.default_reference_file, 'r') as f:
-                    self.sign_references = json.load(f)
-                if os.path.exists(self.default_scaler_file):
-                    with open(self.default_scaler_file, 'rb') as f:
-                        self.scaler = pickle.load(f)
-                        self.is_scaler_fitted = True
-                print("Reset to default reference data")
-                return True
-            except:
-                print("Could not reset to default reference data")
+        if self.use_defaults and self._load_calibration(self.default_reference_file, self.legacy_default_reference_file,
+                                  self.legacy_default_scaler_file):
+            self.sequence_matcher.load_templates(default_only=True)
+            self.load_model(default_only=True)
+            self._changed()
+            print("Reset to default reference data")
+            return True
+        print("Could not reset to default reference data")
         return False
         
+    def clear_references(self):
+        """Drop every reference, motion template and the scaler, e.g. before rebuilding a calibration"""
+        self.sign_references = {}
+        self._scaler_params = None
+        self.is_scaler_fitted = False
+        self._rebuild_reference_index()
+        self.sequence_matcher.templates = {}
+        self.sequence_matcher._prepare()
+        self.model = None
+        self.has_unsaved_changes = True
+        self._changed()
+        
     def preprocess_landmarks(self, landmarks):
         """Preprocess landmarks for better comparison"""
         try:
             if landmarks is None:
                 return None
                 
-            # Convert to relative coordinates
-            base_x, base_y, base_z = landmarks[0]  # Use wrist as base point
-            relative_landmarks = landmarks - np.array([base_x, base_y, base_z])
-            
-            # Normalize the coordinates
-            norm = np.linalg.norm(relative_landmarks)
-            if norm == 0:
+            features, valid = self.preprocess_landmarks_batch(np.asarray(landmarks)[np.newaxis])
+            if not valid[0]:
                 return None
-            normalized_landmarks = relative_landmarks / norm
-            
-            # Flatten the landmarks array
-            flattened = normalized_landmarks.flatten()
-            
-            # Scale the features if needed
-            if not self.is_scaler_fitted:
-                self.scaler.fit(flattened.reshape(1, -1))
-                self.is_scaler_fitted = True
-                return flattened
-            
-            return self.scaler.transform(flattened.reshape(1, -1))[0]
+            return features[0]
             
         except Exception as e:
             print(f"Error in preprocessing landmarks: {str(e)}")
             return None
+            
+    @staticmethod
+    def normalize_landmarks_batch(landmarks):
+        """Wrist-relative, unit-length (N, 63) features of an (N, 21, 3) landmark array
+        
+        Returns the features and a boolean mask of the rows that could be
+        normalized; invalid rows are left as zeros.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+        
+        # Convert to coordinates relative to the wrist
+        relative_landmarks = landmarks - landmarks[:, :1, :]
+        flattened = relative_landmarks.reshape(len(landmarks), -1)
+        
+        # Normalize each row to unit length
+        norms = np.linalg.norm(flattened, axis=1)
+        valid = norms > 0
+        features = flattened / np.where(valid, norms, 1.0)[:, np.newaxis]
+        features[~valid] = 0.0
+        return features, valid
+        
+    def preprocess_landmarks_batch(self, landmarks):
+        """Preprocess an (N, 21, 3) landmark array into scaled (N, 63) features
+        
+        Returns the features and a boolean mask of the rows that could be
+        normalized; invalid rows are left as zeros.
+        """
+        features, valid = self.normalize_landmarks_batch(landmarks)
+        
+        # Fit the scaler on every valid row if needed, so the whole burst
+        # ends up in the same feature space as later frames
+        if not self.is_scaler_fitted and valid.any():
+            self.fit_scaler(features[valid])
+        
+        # Scale the features
+        if self._scaler_params is not None:
+            mean, scale = self._scaler_params
+            features -= mean
+            features /= scale
+            features[~valid] = 0.0
+                
+        return features, valid
         
     def add_reference_sign(self, sign_name, landmarks):
-        """Add a reference hand pose for a sign"""
+        """Add a reference hand pose for a sign, replacing any earlier ones"""
         try:
-            processed_landmarks = self.preprocess_landmarks(landmarks)
-            if processed_landmarks is not None:
-                self.sign_references[sign_name] = processed_landmarks.tolist()  # Convert to list for JSON serialization
-                return True
-            return False
+            return self.add_reference_samples(sign_name, np.asarray(landmarks)[np.newaxis]) > 0
         except Exception as e:
             print(f"Error adding reference sign: {str(e)}")
             return False
             
-    def recognize_sign(self, landmarks):
+    def add_reference_samples(self, sign_name, landmarks, replace=True):
+        """Add a burst of (N, 21, 3) calibration frames for a sign
+        
+        Keeps every usable frame as a sample, or max_samples_per_letter
+        k-means prototypes when there are more. With replace=False the new
+        frames are added to the sign's existing samples. Returns the number
+        of usable frames.
+        """
+        features, valid = self.preprocess_landmarks_batch(landmarks)
+        features = features[valid]
+        if len(features) == 0:
+            return 0
+            
+        if not replace and sign_name in self.sign_references:
+            existing = np.asarray(self.sign_references[sign_name], dtype=np.float32).reshape(-1, 63)
+            samples = np.concatenate([existing, features])
+        else:
+            samples = features
+        if len(samples) > self.max_samples_per_letter:
+            samples = self._cluster_prototypes(samples, self.max_samples_per_letter)
+            
+        self.sign_references[sign_name] = samples
+        self._rebuild_reference_index()
+        self.has_unsaved_changes = True
+        return len(features)
+        
+    @staticmethod
+    def _cluster_prototypes(samples, count, iterations=10):
+        """Reduce samples to count k-means centroids"""
+        rng = np.random.default_rng(0)
+        centroids = samples[rng.choice(len(samples), count, replace=False)].copy()
+        sample_norms = np.einsum('ij,ij->i', samples, samples)[:, np.newaxis]
+        for _ in range(iterations):
+            sq_distances = sample_norms + np.einsum('ij,ij->i', centroids, centroids) - 2.0 * samples.dot(centroids.T)
+            assignment = np.argmin(sq_distances, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, samples)
+            sizes = np.bincount(assignment, minlength=count)
+            # Empty clusters keep their previous centroid
+            filled = sizes > 0
+            centroids[filled] = sums[filled] / sizes[filled, np.newaxis]
+        return centroids.astype(np.float32)
+            
+    def _reference_distances(self, features):
+        """Euclidean distances from (N, 63) features to every reference sample"""
+        index = self._reference_index
+        features = np.asarray(features, dtype=np.float32).reshape(-1, index.matrix.shape[1])
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab, done as one matrix product
+        sq_distances = (np.einsum('ij,ij->i', features, features)[:, np.newaxis]
+                        + index.sq_norms - 2.0 * features.dot(index.matrix.T))
+        return index, np.sqrt(np.maximum(sq_distances, 0.0))
+        
+    def rank_signs(self, landmarks, k=None):
+        """Return the k closest reference signs as (letter, distance) pairs
+        
+        Each sign's distance is that of its closest sample.
+        """
         if not self.sign_references:
-            return None, 0.0
+            return []
             
         processed_landmarks = self.preprocess_landmarks(landmarks)
         if processed_landmarks is None:
-            return None, 0.0
+            return []
+            
+        index, distances = self._reference_distances(processed_landmarks)
+        label_distances = np.minimum.reduceat(distances[0], index.starts)
+        order = np.argsort(label_distances, kind='stable')
+        if k is not None:
+            order = order[:k]
+        return [(str(index.labels[i]), float(label_distances[i])) for i in order]
+        
+    def recognize_signs(self, landmarks):
+        """Recognize signs for an (N, 21, 3) batch of landmarks
         
-        best_match = None
-        best_score = float('inf')
+        The k_neighbors nearest reference samples vote for their sign,
+        weighted by inverse distance. The matrix of distances to every
+        sample is one BLAS product, which at 63 dimensions outperforms tree
+        indexes; the per-letter sample cap keeps it small.
         
-        # Compare with reference signs
-        for letter, ref_features in self.sign_references.items():
-            # Convert stored reference back to numpy array if needed
-            ref_array = np.array(ref_features)
+        With the 'softmax' engine and a model trained alongside the current
+        references (see active_model), the model's calibrated probability of
+        the most likely letter is the confidence instead, at a cost that
+        does not depend on the number of samples.
+        
+        Returns a list of N letters (None where nothing matched) and an
+        array of N confidences.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+        count = len(landmarks)
+        model = self.active_model
+        if (model is None and not self.sign_references) or count == 0:
+            return [None] * count, np.zeros(count, dtype=np.float32)
+            
+        if model is not None:
+            with self._timed('preprocess'):
+                features, valid = self.normalize_landmarks_batch(landmarks)
+            with self._timed('match'):
+                return self._predict(model, features, valid)
             
-            # Simple Euclidean distance as a similarity measure
-            distance = np.linalg.norm(processed_landmarks - ref_array)
+        with self._timed('preprocess'):
+            features, valid = self.preprocess_landmarks_batch(landmarks)
+        
+        with self._timed('match'):
+            return self._vote(features, valid)
             
-            if distance < best_score:
-                best_score = distance
-                best_match = letter
+    def _timed(self, stage):
+        return self.stage_timer(stage) if self.stage_timer is not None else contextlib.nullcontext()
+        
+    def _vote(self, features, valid):
+        """Letters and confidences for preprocessed features by k-nearest-neighbour voting"""
+        count = len(features)
+        
+        # Compare every row with every reference sample at once
+        index, distances = self._reference_distances(features)
+        label_ids = np.repeat(np.arange(len(index.labels)), np.diff(np.append(index.starts, len(index.matrix))))
+        
+        # Weighted vote among the k nearest samples
+        k = min(self.k_neighbors, distances.shape[1])
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        weights = 1.0 / (distances[np.arange(count)[:, np.newaxis], nearest] + 1e-6)
+        votes = np.zeros((count, len(index.labels)))
+        np.add.at(votes, (np.arange(count)[:, np.newaxis], label_ids[nearest]), weights)
+        best_labels = np.argmax(votes, axis=1)
         
-        # Convert score to a confidence value (0-1)
+        # Score each winner by its closest sample
+        best_scores = np.minimum.reduceat(distances, index.starts, axis=1)[np.arange(count), best_labels]
+        
+        # Convert scores to confidence values (0-1)
         # Lower distance = higher confidence
-        threshold = 10.0  # Adjust based on your calibration
-        confidence = max(0, min(1, 1 - (best_score / threshold)))
+        confidences = np.clip(1 - best_scores / self.distance_threshold, 0, 1)
+        
+        # Only keep the recognized signs whose confidence is above the threshold
+        matched = valid & (confidences >= self.confidence_threshold)
+        confidences = np.where(matched, confidences, 0.0).astype(np.float32)
+        signs = [str(index.labels[i]) if ok else None for i, ok in zip(best_labels, matched)]
+        return signs, confidences
+            
+    def _predict(self, model, features, valid):
+        """Letters and confidences for normalized features from a trained model"""
+        probabilities = model.predict_proba(features)
+        best_labels = np.argmax(probabilities, axis=1)
+        confidences = probabilities[np.arange(len(features)), best_labels]
+        matched = valid & (confidences >= self.confidence_threshold)
+        confidences = np.where(matched, confidences, 0.0).astype(np.float32)
+        signs = [str(model.labels[i]) if ok else None for i, ok in zip(best_labels, matched)]
+        return signs, confidences
+        
+    def train_model(self, landmarks_by_label=None, hidden_units=0, **options):
+        """Fit a SoftmaxModel for the 'softmax' engine
+        
+        Trains on a {letter: (N, 21, 3) landmarks} dict, or by default on
+        the reference samples. hidden_units=0 fits softmax regression, more
+        adds a hidden layer of that size; further options are passed to
+        fit_softmax_model. The model is tied to the current references, so
+        add them before training. Returns its report.
+        """
+        if landmarks_by_label is None:
+            labels = self.reference_labels
+            features = np.asarray(self.reference_matrix, dtype=np.float32)
+            # The references are stored scaled; the model takes normalized features
+            if self._scaler_params is not None:
+                mean, scale = self._scaler_params
+                features = features * scale + mean
+        else:
+            labels, parts = [], []
+            for label, landmarks in landmarks_by_label.items():
+                features, valid = self.normalize_landmarks_batch(landmarks)
+                parts.append(features[valid])
+                labels.extend([label] * int(valid.sum()))
+            features = np.concatenate(parts) if parts else np.empty((0, 63), dtype=np.float32)
+            
+        model, report = fit_softmax_model(features, labels, hidden_units=hidden_units, **options)
+        model.references = self.reference_digest
+        self.model = model
+        self.has_unsaved_changes = True
+        self._changed()
+        return report
         
-        # Only return the recognized sign if confidence is above a threshold
-        confidence_threshold = 0.5  # Adjust as needed
-        if confidence < confidence_threshold:
+    def add_motion_template(self, sign_name, landmarks, replace=True):
+        """Record an (N, 21, 3) landmark sequence of a motion sign such as J or Z"""
+        try:
+            if not self.sequence_matcher.add_template(sign_name, landmarks, replace=replace):
+                return False
+            self.has_unsaved_changes = True
+            self._changed()
+            return True
+        except Exception as e:
+            print(f"Error adding motion template: {str(e)}")
+            return False
+            
+    def recognize_motion(self, landmarks):
+        """Match the end of an (N, 21, 3) landmark sequence against the motion templates
+        
+        Returns a MotionMatch or None.
+        """
+        return self.sequence_matcher.match(landmarks)
+        
+    def recognize_sign(self, landmarks):
+        if landmarks is None:
+            return None, 0.0
+            
+        signs, confidences = self.recognize_signs(np.asarray(landmarks)[np.newaxis])
+        if signs[0] is None:
             return None, 0.0
             
-        return best_match, confidence 
\ No newline at end of file
+        return signs[0], float(confidences[0]) 
\ No newline at end of file
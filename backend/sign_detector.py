@@ -1,22 +1,47 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 
 class SignLanguageDetector:
-    def __init__(self):
-        # Initialize mediapipe hands module
+    def __init__(self, max_num_hands=2, static_image_mode=False):
+        self.max_num_hands = max_num_hands
+        # Unrelated images (rather than a video's frames) are each detected
+        # from scratch, without tracking the hands from the previous one
+        self.static_image_mode = static_image_mode
+        
+        # Initialize mediapipe hands module. MediaPipe is imported here rather
+        # than at module level since importing it takes longer than anything
+        # else at startup, and processes that never detect never need it.
+        import mediapipe as mp
         self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=2,
+        self.hands = self._make_hands()
+        self.mp_draw = mp.solutions.drawing_utils
+        
+    def _make_hands(self):
+        return self.mp_hands.Hands(
+            static_image_mode=self.static_image_mode,
+            max_num_hands=self.max_num_hands,
             min_detection_confidence=0.7,
             min_tracking_confidence=0.5
         )
-        self.mp_draw = mp.solutions.drawing_utils
         
-    def detect_hands(self, frame):
-        # Convert BGR image to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def reset(self):
+        """Forget the tracked hands, before detecting the frames of another stream
+        
+        MediaPipe's graph tracks hands from one frame to the next, so it is
+        rebuilt rather than fed an unrelated frame.
+        """
+        self.hands.close()
+        self.hands = self._make_hands()
+        
+    def detect_hands(self, frame, rgb=False):
+        """Draw every detected hand and return the frame with the first hand's landmarks"""
+        frame, landmarks, _ = self.detect_all_hands(frame, rgb=rgb)
+        return frame, None if landmarks is None else landmarks[0]
+        
+    def detect_all_hands(self, frame, rgb=False):
+        """Draw every detected hand and return the frame, (H, 21, 3) landmarks and handedness"""
+        # Convert BGR image to RGB, unless the frame is already RGB
+        rgb_frame = frame if rgb else cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
         # Get image dimensions
         height, width, _ = rgb_frame.shape
@@ -24,28 +49,94 @@ class SignLanguageDetector:
         # Process the frame and detect hands
         results = self.hands.process(rgb_frame)
         
-        # Draw hand landmarks if detected
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                # Draw landmarks on the frame
-                self.mp_draw.draw_landmarks(
-                    frame,
-                    hand_landmarks,
-                    self.mp_hands.HAND_CONNECTIONS
-                )
-                
-                # Get landmark coordinates and normalize them by image dimensions
-                landmarks = []
-                for landmark in hand_landmarks.landmark:
-                    # Convert normalized coordinates to pixel coordinates
-                    x = landmark.x * width
-                    y = landmark.y * height
-                    z = landmark.z * width  # Use width for z to maintain aspect ratio
-                    landmarks.append([x, y, z])
-                
-                return frame, np.array(landmarks)
+        if not results.multi_hand_landmarks:
+            return frame, None, []
+            
+        # Draw hand landmarks
+        for hand_landmarks in results.multi_hand_landmarks:
+            self.mp_draw.draw_landmarks(
+                frame,
+                hand_landmarks,
+                self.mp_hands.HAND_CONNECTIONS
+            )
+            
+        # Normalized to pixel coordinates, using width for z to maintain aspect ratio
+        landmarks, handedness = self._read_results(results)
+        landmarks, handedness = self._left_to_right(landmarks * np.array([width, height, width]), handedness)
+        return frame, landmarks, handedness
+
+    def detect_landmarks(self, rgb_frame, mirror=True):
+        """Headless detection of the first hand; see detect_all_landmarks"""
+        landmarks, _ = self.detect_all_landmarks(rgb_frame, mirror=mirror)
+        return None if landmarks is None else landmarks[0]
+        
+    def detect_all_landmarks(self, rgb_frame, mirror=True):
+        """Headless detection: landmarks only, for frames that are never displayed
+        
+        Takes an RGB frame and does no drawing or colour conversion. Returns
+        an (H, 21, 3) array with every detected hand, ordered left to right,
+        and their handedness ('Left' or 'Right'), or (None, []). With
+        mirror=True the x coordinates are mirrored numerically, giving the
+        same landmarks and handedness as flipping the frame before
+        detect_all_hands without touching any pixels.
+        """
+        height, width = rgb_frame.shape[:2]
+        landmarks, handedness = self._process_frame(rgb_frame)
+        
+        if landmarks is None:
+            return None, []
+        if mirror:
+            landmarks[:, :, 0] = width - landmarks[:, :, 0]
+            # MediaPipe labels hands as if the frame were mirrored already
+            handedness = ['Left' if label == 'Right' else 'Right' for label in handedness]
+        return self._left_to_right(landmarks, handedness)
+        
+    def draw_landmarks(self, frame, landmarks, mirror=False):
+        """Draw (H, 21, 3) pixel landmarks and their connections onto a BGR frame
+        
+        With mirror=True the landmarks are taken to come from
+        detect_all_landmarks(mirror=True) and are mirrored back onto the
+        unflipped frame.
+        """
+        width = frame.shape[1]
+        for hand in landmarks:
+            points = [(int(round(width - x if mirror else x)), int(round(y))) for x, y, _ in hand]
+            for start, end in self.mp_hands.HAND_CONNECTIONS:
+                cv2.line(frame, points[start], points[end], (224, 224, 224), 2)
+            for point in points:
+                cv2.circle(frame, point, 2, (0, 0, 255), -1)
+        return frame
+        
+    @staticmethod
+    def _left_to_right(landmarks, handedness):
+        """Order hands by the x coordinate of their wrist"""
+        order = np.argsort(landmarks[:, 0, 0], kind='stable')
+        return landmarks[order], [handedness[i] for i in order]
+        
+    def _read_results(self, results):
+        """Stack MediaPipe's normalized hand landmarks and handedness labels"""
+        landmarks = np.array([
+            [(landmark.x, landmark.y, landmark.z) for landmark in hand_landmarks.landmark]
+            for hand_landmarks in results.multi_hand_landmarks
+        ])
+        handedness = [hand.classification[0].label for hand in results.multi_handedness]
+        return landmarks, handedness
+        
+    def _process_frame(self, rgb_frame):
+        """Run MediaPipe on a frame and return pixel landmarks and handedness"""
+        height, width = rgb_frame.shape[:2]
+        # MediaPipe needs C-contiguous pixels, which flipped or cropped views are not
+        results = self.hands.process(np.ascontiguousarray(rgb_frame))
+        if not results.multi_hand_landmarks:
+            return None, []
+            
+        landmarks, handedness = self._read_results(results)
+        # Normalized to pixel coordinates, using width for z as detect_hands does
+        return landmarks * np.array([width, height, width]), handedness
         
-        return frame, None
+    def close(self):
+        """Release the MediaPipe graph and its tracking state"""
+        self.hands.close()
 
     def start_detection(self):
         cap = cv2.VideoCapture(0)
@@ -0,0 +1,222 @@
+"""Compact trained classifiers over landmark features
+
+A SoftmaxModel is softmax regression, or an MLP with a hidden ReLU layer,
+stored as plain float32 weight arrays in an .npz file. Inference is one
+matrix product per layer for the whole batch, whatever the number of
+training samples. Feature standardization is folded into the first layer,
+and the logits are divided by a temperature fitted on held-out samples, so
+the reported probabilities are calibrated: of the predictions made with
+probability 0.8, about 80% are right.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _log_softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+
+
+def _nll(logits, targets):
+    """Mean negative log-likelihood of integer targets"""
+    return float(-_log_softmax(logits)[np.arange(len(targets)), targets].mean())
+
+
+def calibration_error(probabilities, targets, bins=10):
+    """Expected calibration error: mean gap between confidence and accuracy over confidence bins"""
+    confidences = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == targets
+    edges = np.minimum((confidences * bins).astype(int), bins - 1)
+    error = 0.0
+    for b in range(bins):
+        in_bin = edges == b
+        if in_bin.any():
+            error += in_bin.mean() * abs(confidences[in_bin].mean() - correct[in_bin].mean())
+    return float(error)
+
+
+class SoftmaxModel:
+    """Softmax classifier with optional hidden ReLU layers
+
+    layers is a list of (weights, bias) pairs; every layer but the last is
+    followed by a ReLU. Probabilities are softmax(logits / temperature).
+    references optionally identifies the reference samples the model was
+    trained alongside (see SignClassifier.reference_digest).
+    """
+
+    def __init__(self, labels, layers, temperature=1.0, references=None):
+        self.labels = np.asarray(labels, dtype=str)
+        self.layers = [(np.asarray(weights, dtype=np.float32), np.asarray(bias, dtype=np.float32))
+                       for weights, bias in layers]
+        self.temperature = float(temperature)
+        self.references = references
+
+    @property
+    def hidden_units(self):
+        return [len(bias) for _, bias in self.layers[:-1]]
+
+    def logits(self, features):
+        x = np.asarray(features, dtype=np.float32)
+        for i, (weights, bias) in enumerate(self.layers):
+            x = x.dot(weights) + bias
+            if i < len(self.layers) - 1:
+                np.maximum(x, 0.0, out=x)
+        return x
+
+    def predict_proba(self, features):
+        """(N, classes) probabilities for (N, features) rows"""
+        return softmax(self.logits(features) / self.temperature)
+
+    def save(self, path):
+        """Atomically write the model to an .npz file"""
+        arrays = {'labels': self.labels, 'temperature': np.float32(self.temperature),
+                  'references': np.array(self.references or '')}
+        for i, (weights, bias) in enumerate(self.layers):
+            arrays[f'weights_{i}'] = weights
+            arrays[f'bias_{i}'] = bias
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.model-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            count = sum(1 for key in data.files if key.startswith('weights_'))
+            layers = [(data[f'weights_{i}'], data[f'bias_{i}']) for i in range(count)]
+            references = str(data['references']) if 'references' in data.files else ''
+            return cls(data['labels'], layers, float(data['temperature']), references or None)
+
+
+def _fit_temperature(logits, targets):
+    """Temperature minimizing the held-out negative log-likelihood"""
+    # Coarse grid over log T, then golden-section search around the best point
+    grid = np.linspace(np.log(0.05), np.log(20.0), 40)
+    losses = [_nll(logits / np.exp(t), targets) for t in grid]
+    best = int(np.argmin(losses))
+    low, high = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(30):
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        if _nll(logits / np.exp(a), targets) < _nll(logits / np.exp(b), targets):
+            high = b
+        else:
+            low = a
+    return float(np.exp((low + high) / 2))
+
+
+def fit_softmax_model(features, labels, hidden_units=0, epochs=500, learning_rate=0.01, l2=1e-4,
+                      validation_fraction=0.2, patience=50, seed=0):
+    """Fit a SoftmaxModel with full-batch Adam, then its temperature on held-out samples
+
+    features is an (N, D) array and labels N class names. hidden_units=0
+    gives softmax regression; otherwise one hidden ReLU layer of that size.
+    Training stops once the held-out loss has not improved for `patience`
+    epochs, keeping the best weights. Returns the model and a report of its
+    held-out accuracy, log-likelihood and calibration error. With fewer
+    than about five samples per label nothing is held out and the
+    probabilities are left uncalibrated.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    classes, targets = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    if len(classes) < 2:
+        raise ValueError('At least two labels are needed to train a model')
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(features))
+    held_out = int(len(features) * validation_fraction) if len(features) * validation_fraction >= len(classes) else 0
+    validation, training = order[:held_out], order[held_out:]
+    if not held_out:
+        # Too few samples to hold any out; the report then describes the
+        # training data and the temperature is left at 1, since fitting it
+        # on samples the model has learned would only make it overconfident
+        validation = training
+
+    mean = features[training].mean(axis=0)
+    scale = features[training].std(axis=0)
+    scale[scale == 0] = 1.0
+    standardized = (features - mean) / scale
+    x_train, y_train = standardized[training], targets[training]
+    x_valid, y_valid = standardized[validation], targets[validation]
+
+    sizes = [features.shape[1]] + ([hidden_units] if hidden_units else []) + [len(classes)]
+    params = []
+    for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+        params.append(rng.normal(0, np.sqrt(2.0 / fan_in), (fan_in, fan_out)).astype(np.float32))
+        params.append(np.zeros(fan_out, dtype=np.float32))
+
+    def forward(x, params):
+        activations = [x]
+        for i in range(0, len(params), 2):
+            x = x.dot(params[i]) + params[i + 1]
+            if i + 2 < len(params):
+                x = np.maximum(x, 0.0)
+            activations.append(x)
+        return activations
+
+    one_hot = np.eye(len(classes), dtype=np.float32)[y_train]
+    moments = [np.zeros_like(p) for p in params]
+    velocities = [np.zeros_like(p) for p in params]
+    best_loss, best_params, since_best = np.inf, [p.copy() for p in params], 0
+    epoch = 0
+    for epoch in range(1, epochs + 1):
+        activations = forward(x_train, params)
+        delta = (softmax(activations[-1]) - one_hot) / len(x_train)
+        gradients = [None] * len(params)
+        for layer in range(len(params) // 2 - 1, -1, -1):
+            gradients[2 * layer] = activations[layer].T.dot(delta) + l2 * params[2 * layer]
+            gradients[2 * layer + 1] = delta.sum(axis=0)
+            if layer:
+                delta = delta.dot(params[2 * layer].T) * (activations[layer] > 0)
+        for i, gradient in enumerate(gradients):
+            moments[i] = 0.9 * moments[i] + 0.1 * gradient
+            velocities[i] = 0.999 * velocities[i] + 0.001 * gradient ** 2
+            corrected = moments[i] / (1 - 0.9 ** epoch)
+            params[i] -= learning_rate * corrected / (np.sqrt(velocities[i] / (1 - 0.999 ** epoch)) + 1e-8)
+
+        loss = _nll(forward(x_valid, params)[-1], y_valid)
+        if loss < best_loss - 1e-5:
+            best_loss, best_params, since_best = loss, [p.copy() for p in params], 0
+        else:
+            since_best += 1
+            if since_best >= patience:
+                break
+
+    # Fold the standardization into the first layer: ((x - mean) / scale) W = x (W / scale) - (mean / scale) W
+    layers = [(best_params[i], best_params[i + 1]) for i in range(0, len(best_params), 2)]
+    first_weights, first_bias = layers[0]
+    layers[0] = (first_weights / scale[:, np.newaxis], first_bias - (mean / scale).dot(first_weights))
+    model = SoftmaxModel(classes, layers)
+
+    if held_out:
+        model.temperature = _fit_temperature(model.logits(features[validation]), y_valid)
+    probabilities = model.predict_proba(features[validation])
+    report = {
+        'samples': len(features),
+        'held_out': int(held_out),
+        'epochs': epoch,
+        'temperature': model.temperature,
+        'calibrated': bool(held_out),
+        'validation_accuracy': float((probabilities.argmax(axis=1) == y_valid).mean()),
+        'validation_nll': _nll(np.log(np.maximum(probabilities, 1e-12)), y_valid),
+        'calibration_error': calibration_error(probabilities, y_valid)
+    }
+    return model, report
@@ -0,0 +1,44 @@
+import itertools
+
+from simple_websocket import ConnectionClosed
+
+from motion_gate import MotionGate
+from prediction_smoother import PredictionSmoother
+from sequence_matcher import SequenceBuffer
+
+_session_ids = itertools.count(1)
+
+
+class StreamSession:
+    """Per-connection state for a client streaming frames over a WebSocket"""
+
+    def __init__(self, smoother=None, motion_gate=None, sequence=None):
+        # Client id of the connection, for the detector pool's affinity;
+        # prefixed so it never matches an X-Client-Id
+        self.client_id = f'ws:{next(_session_ids)}'
+        self.smoother = smoother or PredictionSmoother()
+        self.motion_gate = motion_gate or MotionGate()
+        self.sequence = sequence or SequenceBuffer()
+        self.frames_received = 0
+        self.frames_dropped = 0
+
+    def next_message(self, ws):
+        """Wait for the next message, skipping any older frames still queued
+
+        Clients push frames at camera rate; when detection falls behind, only
+        the newest frame is worth processing.
+        """
+        message = ws.receive()
+        while message is not None:
+            try:
+                newer = ws.receive(timeout=0)
+            except ConnectionClosed:
+                break
+            if newer is None:
+                break
+            message = newer
+            self.frames_received += 1
+            self.frames_dropped += 1
+        if message is not None:
+            self.frames_received += 1
+        return message
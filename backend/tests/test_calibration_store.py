@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+import calibration_store
+from calibration_store import CalibrationStoreError
+
+
+def write(tmp_path, **kwargs):
+    path = str(tmp_path / 'references.sbcal')
+    rng = np.random.default_rng(0)
+    labels = ['A', 'B', 'B', 'Ñ']
+    matrix = rng.normal(size=(len(labels), 63)).astype(np.float32)
+    calibration_store.save(path, labels, matrix, **kwargs)
+    return path, labels, matrix
+
+
+def test_round_trip(tmp_path):
+    mean, scale = np.arange(63, dtype=np.float32), np.ones(63, dtype=np.float32)
+    path, labels, matrix = write(tmp_path, scaler_mean=mean, scaler_scale=scale)
+
+    data = calibration_store.load(path, verify=True)
+    assert data.labels == labels
+    np.testing.assert_array_equal(data.matrix, matrix)
+    np.testing.assert_array_equal(data.scaler_mean, mean)
+    np.testing.assert_array_equal(data.scaler_scale, scale)
+
+
+def test_round_trip_without_scaler(tmp_path):
+    path, labels, matrix = write(tmp_path)
+    data = calibration_store.load(path)
+    assert data.scaler_mean is None and data.scaler_scale is None
+    np.testing.assert_array_equal(data.matrix, matrix)
+
+
+def test_empty_calibration(tmp_path):
+    path = str(tmp_path / 'empty.sbcal')
+    calibration_store.save(path, [], [])
+    data = calibration_store.load(path, verify=True)
+    assert data.labels == [] and data.matrix.shape == (0, 63)
+
+
+def test_corruption_is_caught_when_verifying(tmp_path):
+    path, _, _ = write(tmp_path)
+    with open(path, 'r+b') as f:
+        f.seek(calibration_store.HEADER.size + 5)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    # The checksum is only read when asked for
+    calibration_store.load(path)
+    with pytest.raises(CalibrationStoreError, match='checksum'):
+        calibration_store.load(path, verify=True)
+
+
+def test_truncated_file(tmp_path):
+    path, _, _ = write(tmp_path)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 1)
+    with pytest.raises(CalibrationStoreError, match='expected'):
+        calibration_store.load(path)
+
+    with open(path, 'r+b') as f:
+        f.truncate(10)
+    with pytest.raises(CalibrationStoreError, match='too short'):
+        calibration_store.load(path)
+
+
+def test_wrong_magic_and_version(tmp_path):
+    path, _, _ = write(tmp_path)
+    with open(path, 'r+b') as f:
+        f.write(b'NOTCALIB')
+    with pytest.raises(CalibrationStoreError, match='not a calibration file'):
+        calibration_store.load(path)
+
+    path, _, _ = write(tmp_path)
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write((99).to_bytes(2, 'little'))
+    with pytest.raises(CalibrationStoreError, match='version 99'):
+        calibration_store.load(path)
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(CalibrationStoreError):
+        calibration_store.load(str(tmp_path / 'missing.sbcal'))
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import app as backend
+from profile_cache import ClassifierCache
+
+WIDTH, HEIGHT = 640, 480
+
+
+def pixel_hands(count, seed):
+    """Hands in the server's mirrored (selfie view) pixel coordinates"""
+    rng = np.random.default_rng(seed)
+    hand = rng.uniform(100, 400, size=(21, 3)).astype(np.float32)
+    return hand + rng.normal(0, 1.0, size=(count, 21, 3)).astype(np.float32)
+
+
+def client_view(landmarks, mirrored=False):
+    """What a client tracking the camera frame reports: coordinates normalized to [0, 1]"""
+    normalized = landmarks / np.array([WIDTH, HEIGHT, WIDTH], dtype=np.float32)
+    if not mirrored:
+        normalized[..., 0] = 1.0 - normalized[..., 0]
+    return normalized
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(backend, 'classifiers', ClassifierCache(profile_dir=str(tmp_path / 'profiles')))
+    client = backend.app.test_client()
+    for letter, seed in (('A', 0), ('B', 1)):
+        response = client.post(f'/api/calibrate_landmarks/{letter}',
+                               json={'landmarks': pixel_hands(6, seed).tolist(), 'mirror': 0})
+        assert response.get_json()['success']
+    return client
+
+
+def classify(client, landmarks, **options):
+    response = client.post('/api/classify_landmarks',
+                           json={'landmarks': landmarks.tolist(), 'width': WIDTH, 'height': HEIGHT, **options})
+    return response.get_json()
+
+
+def test_camera_frame_landmarks_are_mirrored_to_the_selfie_view(client):
+    for letter, seed in (('A', 0), ('B', 1)):
+        hand = pixel_hands(1, seed)[0]
+        assert classify(client, client_view(hand))['letter'] == letter
+        assert classify(client, client_view(hand, mirrored=True), mirror=0)['letter'] == letter
+
+
+def test_mirroring_every_hand_of_a_batch(client):
+    hands = np.stack([pixel_hands(1, 1)[0], pixel_hands(1, 0)[0]])
+    result = classify(client, client_view(hands))
+    assert [hand['letter'] for hand in result['results']] == ['B', 'A']
+
+
+def test_binary_payload_takes_the_mirror_query_parameter(client):
+    hand = client_view(pixel_hands(1, 0)[0], mirrored=True)
+    response = client.post('/api/classify_landmarks',
+                           query_string={'width': WIDTH, 'height': HEIGHT, 'mirror': 0},
+                           data=hand.astype('<f4').tobytes(), content_type='application/octet-stream')
+    assert response.get_json()['letter'] == 'A'
+
+
+def test_normalized_landmarks_without_a_frame_size_mirror_around_one():
+    landmarks = np.random.default_rng(2).uniform(0, 1, size=(21, 3)).astype(np.float32)
+    with backend.app.test_request_context(json={'landmarks': landmarks.tolist()}):
+        parsed = backend.parse_landmark_payload()
+    np.testing.assert_allclose(parsed[0, :, 0], 1.0 - landmarks[:, 0], rtol=1e-6)
+    np.testing.assert_array_equal(parsed[0, :, 1:], landmarks[:, 1:])
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from detector_pool import DetectorPool, PoolExhausted
+
+
+class FakeDetector:
+    def __init__(self, max_num_hands=2):
+        self.max_num_hands = max_num_hands
+        self.resets = 0
+        self.closed = False
+
+    def reset(self):
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_client_gets_its_own_detector_back():
+    pool = DetectorPool(max_size=2, factory=FakeDetector)
+    with pool.checkout('a') as first:
+        pass
+    with pool.checkout('b') as second:
+        pass
+    assert first is not second
+    with pool.checkout('a') as again:
+        assert again is first
+    assert first.resets == 0 and second.resets == 0
+
+
+def test_taken_over_detector_is_reset():
+    pool = DetectorPool(max_size=1, factory=FakeDetector)
+    with pool.checkout('a') as first:
+        pass
+    with pool.checkout('b') as second:
+        assert second is first and first.resets == 1
+    with pool.checkout('b'):
+        pass
+    assert first.resets == 1
+    assert pool.stats() == {'size': 1, 'in_use': 0, 'max_size': 1, 'resets': 1}
+
+
+def test_hand_counts_get_separate_detectors():
+    pool = DetectorPool(max_size=1, factory=FakeDetector)
+    with pool.checkout('a', max_num_hands=2) as two_hands:
+        pass
+    with pool.checkout('a', max_num_hands=1) as one_hand:
+        assert one_hand.max_num_hands == 1
+    assert two_hands.closed and pool.stats()['size'] == 1
+
+
+def test_checkout_times_out_when_every_detector_is_busy():
+    pool = DetectorPool(max_size=1, checkout_timeout=0.05, factory=FakeDetector)
+    with pool.checkout('a'):
+        with pytest.raises(PoolExhausted):
+            with pool.checkout('b'):
+                pass
+
+
+def test_waiting_checkout_gets_the_released_detector():
+    pool = DetectorPool(max_size=1, checkout_timeout=5, factory=FakeDetector)
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.checkout('a'):
+            checked_out.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    checked_out.wait()
+    threading.Timer(0.05, release.set).start()
+    with pool.checkout('b') as detector:
+        assert detector.resets == 1
+    thread.join()
+
+
+def test_idle_detectors_are_closed():
+    pool = DetectorPool(max_size=2, idle_timeout=0, factory=FakeDetector)
+    with pool.checkout('a') as detector:
+        pass
+    pool.evict_idle()
+    assert detector.closed and pool.stats()['size'] == 0
@@ -0,0 +1,31 @@
+import frame_capture
+from frame_capture import FrameCapture
+
+
+class NoHandDetector:
+    def detect_all_landmarks(self, rgb_frame, mirror=True):
+        return None, []
+
+    def close(self):
+        pass
+
+
+def test_failed_start_lets_the_next_subscriber_start_again(monkeypatch):
+    opened = []
+
+    def open_source(source):
+        opened.append(source)
+        if len(opened) == 1:
+            raise OSError('camera busy')
+        return frame_capture.SyntheticSource(width=64, height=48, fps=200.0)
+
+    monkeypatch.setattr(frame_capture, 'open_source', open_source)
+    capture = FrameCapture('synthetic', NoHandDetector, lambda: None, idle_timeout=0.0)
+
+    assert capture.grab(timeout=2.0) is None
+    assert capture._thread is None
+
+    captured = capture.grab(timeout=2.0)
+    assert captured is not None
+    assert captured.detection['status'] == 'No hand detected'
+    assert len(opened) == 2
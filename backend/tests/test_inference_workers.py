@@ -0,0 +1,52 @@
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from inference_workers import InferenceWorkerPool, WorkerDied
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def pool():
+    pool = InferenceWorkerPool(1, max_queue_depth=2, max_frame_bytes=64 * 64 * 3, check_interval=0.05)
+    yield pool
+    pool.close()
+
+
+def test_dead_worker_fails_its_frames_and_is_restarted(pool):
+    frame = np.zeros((64, 64, 3), np.uint8)
+    process = pool._processes[0]
+    # Stop the worker so the frame is still in flight when it dies
+    os.kill(process.pid, signal.SIGSTOP)
+    outcome = {}
+
+    def detect():
+        try:
+            outcome['result'] = pool.detect_all_landmarks(frame, client_id='a')
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=detect)
+    thread.start()
+    wait_for(lambda: pool.queue_depth == 1)
+    os.kill(process.pid, signal.SIGKILL)
+    thread.join(timeout=30)
+
+    assert isinstance(outcome.get('error'), WorkerDied)
+    assert pool.restarts == 1 and pool.queue_depth == 0
+    assert pool._processes[0] is not process and pool._processes[0].is_alive()
+
+    # The replacement worker serves the next frames
+    assert pool.detect_all_landmarks(frame, client_id='a', timeout=60) == (None, [])
+    assert pool.queue_depth == 0
@@ -0,0 +1,65 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from landmark_dataset import LandmarkDataset
+
+
+def landmarks(count, value):
+    return np.full((count, 21, 3), value, dtype=np.float32)
+
+
+def test_add_flush_and_read(tmp_path):
+    dataset = LandmarkDataset(str(tmp_path), chunk_frames=5)
+    dataset.add('A/one.mp4', 'A', 10, 1, 30, landmarks(3, 1))
+    dataset.add('B/one.mp4', 'B', 20, 2, 30, landmarks(4, 2))  # fills the first chunk
+    dataset.add('A/two.mp4', 'A', 30, 3, 30, landmarks(2, 3))
+    dataset.add('A/empty.mp4', 'A', 40, 4, 30, landmarks(0, 0))
+    dataset.flush()
+
+    reopened = LandmarkDataset(str(tmp_path))
+    assert reopened.labels() == ['A', 'B']
+    assert reopened.stats() == {'files': 4, 'chunks': 2, 'frames': 9, 'frames_per_label': {'A': 5, 'B': 4}}
+    np.testing.assert_array_equal(reopened.file_landmarks('B/one.mp4'), landmarks(4, 2))
+    np.testing.assert_array_equal(reopened.landmarks('A')[:, 0, 0], [1, 1, 1, 3, 3])
+    assert reopened.file_landmarks('A/empty.mp4').shape == (0, 21, 3)
+
+
+def test_interrupted_run_resumes_from_the_last_chunk(tmp_path):
+    dataset = LandmarkDataset(str(tmp_path), chunk_frames=4)
+    dataset.add('A/one.mp4', 'A', 10, 1, 30, landmarks(4, 1))  # written as chunk 0
+    dataset.add('A/two.mp4', 'A', 20, 2, 30, landmarks(2, 2))  # still buffered
+    # The process stops here without flushing
+
+    resumed = LandmarkDataset(str(tmp_path), chunk_frames=4)
+    assert resumed.is_current('A/one.mp4', 10, 1)
+    assert not resumed.is_current('A/two.mp4', 20, 2)
+    assert not resumed.is_current('A/one.mp4', 10, 5)
+
+    resumed.add('A/two.mp4', 'A', 20, 2, 30, landmarks(2, 2))
+    resumed.flush()
+    assert LandmarkDataset(str(tmp_path)).stats()['frames'] == 6
+
+
+def test_changed_file_is_replaced(tmp_path):
+    dataset = LandmarkDataset(str(tmp_path))
+    dataset.add('A/one.mp4', 'A', 10, 1, 30, landmarks(3, 1))
+    dataset.flush()
+
+    dataset = LandmarkDataset(str(tmp_path))
+    dataset.remove('A/one.mp4')
+    dataset.add('A/one.mp4', 'A', 11, 2, 30, landmarks(2, 5))
+    dataset.flush()
+
+    reopened = LandmarkDataset(str(tmp_path))
+    np.testing.assert_array_equal(reopened.landmarks('A'), landmarks(2, 5))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_unsupported_version(tmp_path):
+    with open(tmp_path / 'manifest.json', 'w') as f:
+        json.dump({'version': 99}, f)
+    with pytest.raises(ValueError, match='version 99'):
+        LandmarkDataset(str(tmp_path))
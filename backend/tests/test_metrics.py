@@ -0,0 +1,65 @@
+import pytest
+
+from metrics import Registry
+
+
+def test_counter_and_gauge_rendering():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests served', labels=('endpoint',))
+    idle = registry.counter('idle_total', 'Unlabelled counter')
+    registry.gauge('pool_size', 'Detectors in the pool', function=lambda: 3)
+    requests.inc('/api/detect')
+    requests.inc('/api/detect', amount=2)
+    requests.inc('say "hi"\n')
+
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests served',
+        '# TYPE requests_total counter',
+        'requests_total{endpoint="/api/detect"} 3',
+        'requests_total{endpoint="say \\"hi\\"\\n"} 1',
+        '# HELP idle_total Unlabelled counter',
+        '# TYPE idle_total counter',
+        'idle_total 0',
+        '# HELP pool_size Detectors in the pool',
+        '# TYPE pool_size gauge',
+        'pool_size 3',
+    ]
+    assert idle.samples() == [('idle_total', (), (), 0)]
+
+
+def test_labelled_function_gauge():
+    registry = Registry()
+    registry.gauge('clients', 'Clients per kind', labels=('kind',), function=lambda: {'ws': 2, 'poll': 5})
+    assert 'clients{kind="ws"} 2' in registry.render()
+    assert 'clients{kind="poll"} 5' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 2.65',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_histogram_time():
+    registry = Registry()
+    latency = registry.histogram('step_seconds', 'Step', labels=('step',))
+    with latency.time('decode'):
+        pass
+    assert 'step_seconds_count{step="decode"} 1' in registry.render()
+
+
+def test_wrong_label_count():
+    registry = Registry()
+    counter = registry.counter('errors_total', 'Errors', labels=('kind',))
+    with pytest.raises(ValueError):
+        counter.inc()
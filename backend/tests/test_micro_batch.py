@@ -0,0 +1,80 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from micro_batch import MicroBatchScheduler
+
+
+class FakeClassifier:
+    """Labels each hand with its wrist x coordinate and records batch sizes"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def recognize_signs(self, landmarks):
+        time.sleep(self.delay)
+        self.calls.append(len(landmarks))
+        return [str(int(x)) for x in landmarks[:, 0, 0]], [1.0] * len(landmarks)
+
+
+def hands(*xs):
+    landmarks = np.zeros((len(xs), 21, 3), dtype=np.float32)
+    landmarks[:, 0, 0] = xs
+    return landmarks
+
+
+def test_single_request():
+    scheduler = MicroBatchScheduler()
+    signs, confidences = scheduler.recognize_signs(FakeClassifier(), hands(1, 2))
+    assert list(signs) == ['1', '2'] and list(confidences) == [1.0, 1.0]
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_rows():
+    classifier = FakeClassifier()
+    scheduler = MicroBatchScheduler(max_batch_size=8, max_wait_ms=200)
+    results = {}
+
+    def request(x):
+        results[x] = scheduler.recognize_signs(classifier, hands(x, x + 100))
+
+    threads = [threading.Thread(target=request, args=(x,)) for x in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for x in range(8):
+        assert list(results[x][0]) == [str(x), str(x + 100)]
+    assert classifier.calls == [16]
+    stats = scheduler.stats()
+    assert stats['batches'] == 1 and stats['requests'] == 8 and stats['max_batch_size'] == 8
+
+
+def test_classifier_errors_reach_the_caller():
+    class Failing:
+        def recognize_signs(self, landmarks):
+            raise ValueError('no references')
+
+    scheduler = MicroBatchScheduler()
+    with pytest.raises(ValueError, match='no references'):
+        scheduler.recognize_signs(Failing(), hands(1))
+    assert list(scheduler.recognize_signs(FakeClassifier(), hands(3))[0]) == ['3']
+
+
+def test_failing_on_batch_does_not_stop_the_scheduler():
+    def on_batch(size, waits):
+        raise RuntimeError('metrics are broken')
+
+    scheduler = MicroBatchScheduler(on_batch=on_batch)
+    for x in range(3):
+        assert list(scheduler.recognize_signs(FakeClassifier(), hands(x))[0]) == [str(x)]
+    assert scheduler._thread.is_alive()
+
+
+def test_timeout():
+    scheduler = MicroBatchScheduler()
+    with pytest.raises(TimeoutError):
+        scheduler.recognize_signs(FakeClassifier(delay=0.5), hands(1), timeout=0.05)
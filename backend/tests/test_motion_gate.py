@@ -0,0 +1,62 @@
+import numpy as np
+
+from motion_gate import MotionGate, SkipCounter
+from sign_classifier import SignClassifier
+
+
+def hand(seed=0, shift=0.0):
+    landmarks = np.random.default_rng(seed).uniform(100, 300, size=(21, 3)).astype(np.float32)
+    landmarks[:, 0] += shift
+    return landmarks
+
+
+def frame(level):
+    return np.full((48, 64, 3), level, dtype=np.uint8)
+
+
+def test_still_hand_reuses_the_result_stored_under_the_same_key():
+    gate = MotionGate()
+    gate.store(hand(), ('A', 0.9), key='k')
+    assert gate.check_landmarks(hand(shift=0.5), key='k') == ('A', 0.9)
+    # Moved by more than 2% of the hand's size
+    assert gate.check_landmarks(hand(shift=10.0), key='k') is None
+
+
+def test_result_stored_under_another_key_is_never_reused():
+    gate = MotionGate()
+    gate.store(hand(), ('A', 0.9), key=('profile-a', 1))
+    assert gate.check_landmarks(hand(), key=('profile-b', 1)) is None
+    assert gate.check_landmarks(hand(), key=('profile-a', 2)) is None
+
+    thumbnail = gate.thumbnail(frame(100))
+    gate.store(hand(), ('A', 0.9), key='k', thumbnail=thumbnail)
+    assert gate.check_frame(gate.thumbnail(frame(102)), key='k') == ('A', 0.9)
+    assert gate.check_frame(gate.thumbnail(frame(102)), key='other') is None
+    assert gate.check_frame(gate.thumbnail(frame(120)), key='k') is None
+
+
+def test_recalibration_changes_the_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    classifier = SignClassifier()
+    classifier.add_reference_samples('A', np.stack([hand(1), hand(2)]))
+    gate = MotionGate()
+    gate.store(hand(), ('A', 0.9), key=(id(classifier), classifier.revision))
+
+    classifier.add_reference_samples('B', np.stack([hand(3), hand(4)]))
+    assert gate.check_landmarks(hand(), key=(id(classifier), classifier.revision)) is None
+
+
+def test_skips_are_counted_per_gate_and_in_shared_totals():
+    totals = SkipCounter()
+    gate = MotionGate(totals=totals)
+    thumbnail = gate.thumbnail(frame(100))
+    gate.store(hand(), 'result', thumbnail=thumbnail)
+    gate.check_frame(thumbnail)
+    gate.count_frame()
+    gate.check_landmarks(hand())
+
+    for stats in (gate.counter.snapshot(), totals.snapshot()):
+        assert stats['frames'] == 2
+        assert stats['detections_skipped'] == 1
+        assert stats['classifications_skipped'] == 1
+        assert stats['detection_skip_rate'] == 0.5
@@ -0,0 +1,46 @@
+import pytest
+
+from prediction_smoother import PredictionSmoother
+
+
+def feed(smoother, letters, confidence=0.9):
+    return [smoother.update(letter, confidence) for letter in letters]
+
+
+def test_letter_becomes_stable_after_enter_votes_and_is_emitted_once():
+    smoother = PredictionSmoother(window=8, enter_votes=5, exit_votes=3)
+    results = feed(smoother, 'AAAAAAA')
+    assert [result.letter for result in results] == [None] * 4 + ['A'] * 3
+    assert [result.emitted for result in results] == [None] * 4 + ['A', None, None]
+
+
+def test_stray_frames_do_not_flip_the_stable_letter():
+    smoother = PredictionSmoother(window=8, enter_votes=5, exit_votes=3)
+    feed(smoother, 'AAAAAAAA')
+    results = feed(smoother, ['B', None, 'B'])
+    assert all(result.letter == 'A' and result.emitted is None for result in results)
+
+
+def test_stable_letter_is_dropped_below_exit_votes_before_the_next_enters():
+    smoother = PredictionSmoother(window=8, enter_votes=5, exit_votes=3)
+    feed(smoother, 'AAAAAAAA')
+    results = feed(smoother, 'BBBBB')
+    # A falls below 3 of the last 8 on the sixth B, one frame after B has 5
+    assert [result.letter for result in results] == ['A'] * 5
+    result = smoother.update('B', 0.9)
+    assert (result.letter, result.emitted) == ('B', 'B')
+
+
+def test_confidence_is_a_moving_average_of_the_stable_letter():
+    smoother = PredictionSmoother(window=4, enter_votes=2, exit_votes=1, alpha=0.5)
+    feed(smoother, 'AA', confidence=0.8)
+    assert smoother.update('A', 0.4).confidence == pytest.approx(0.6)
+    # Frames of other letters count as zero confidence
+    assert smoother.update('B', 0.9).confidence == pytest.approx(0.3)
+
+
+def test_reset_forgets_the_window():
+    smoother = PredictionSmoother(window=8, enter_votes=5, exit_votes=3)
+    feed(smoother, 'AAAAA')
+    smoother.reset()
+    assert smoother.update('A', 0.9).letter is None
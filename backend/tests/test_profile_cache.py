@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from profile_cache import ClassifierCache
+
+
+def hands(count, seed):
+    return np.random.default_rng(seed).normal(size=(count, 21, 3)).astype(np.float32)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # The shared calibration files live in the working directory
+    monkeypatch.chdir(tmp_path)
+    return ClassifierCache(profile_dir=str(tmp_path / 'profiles'), max_profiles=2)
+
+
+def test_profiles_fall_back_to_the_default_calibration(cache):
+    cache.default_classifier.add_reference_samples('A', hands(3, 0))
+    assert cache.default_classifier.save_references()
+
+    with cache.checkout('alice') as classifier:
+        assert classifier is not cache.default_classifier
+        assert classifier.reference_labels.tolist() == ['A'] * 3
+
+
+def test_profile_saves_never_become_the_default(cache):
+    with cache.checkout('alice') as classifier:
+        classifier.add_reference_samples('A', hands(3, 0))
+        classifier.add_motion_template('J', hands(20, 1))
+        classifier.train_model({'A': hands(10, 2), 'B': hands(10, 3)}, epochs=5)
+        assert classifier.save_references()
+
+    assert os.path.exists(os.path.join('profiles', 'alice.sbcal'))
+    assert os.path.exists(os.path.join('profiles', 'alice_motion.npz'))
+    assert not os.path.exists('default_asl_references.sbcal')
+    assert not os.path.exists('default_asl_references_motion.npz')
+    assert os.path.exists(os.path.join('profiles', 'alice_model.npz'))
+    assert not os.path.exists('default_asl_references_model.npz')
+
+    # The shared classifier still seeds the defaults when they are missing
+    cache.default_classifier.add_reference_samples('B', hands(3, 4))
+    assert cache.default_classifier.save_references()
+    assert os.path.exists('default_asl_references.sbcal')
+
+
+def test_least_recently_used_idle_profile_is_evicted(cache):
+    for profile_id in ('a', 'b', 'c'):
+        with cache.checkout(profile_id):
+            pass
+    assert list(cache._profiles) == ['b', 'c']
+
+
+def test_leased_profiles_are_not_evicted(cache):
+    with cache.checkout('a') as first:
+        for profile_id in ('b', 'c'):
+            with cache.checkout(profile_id):
+                pass
+        assert 'a' in cache._profiles
+        assert cache.stats()['in_use'] == 1
+    with cache.checkout('a') as again:
+        assert again is first
+
+
+def test_unsaved_profiles_are_evicted_last(cache):
+    with cache.checkout('a') as classifier:
+        classifier.add_reference_samples('A', hands(3, 0))
+    with cache.checkout('b'):
+        pass
+    with cache.checkout('c'):
+        pass
+    assert list(cache._profiles) == ['a', 'c']
+
+
+def test_invalid_profile_id(cache):
+    with pytest.raises(ValueError):
+        with cache.checkout('../etc'):
+            pass
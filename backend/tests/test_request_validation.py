@@ -0,0 +1,36 @@
+import pytest
+
+import app as backend
+from profile_cache import ClassifierCache
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(backend, 'classifiers', ClassifierCache(profile_dir=str(tmp_path / 'profiles')))
+    return backend.app.test_client()
+
+
+@pytest.mark.parametrize('max_hands', ['abc', 1.5, [2]])
+def test_invalid_max_hands_is_a_bad_request(client, max_hands):
+    response = client.post('/api/detect', json={'image': 'data:,', 'max_hands': max_hands})
+    assert response.status_code == 400
+    assert 'max_hands' in response.get_json()['error']
+
+    response = client.post('/api/detect_frame', query_string={'max_hands': 'abc'}, data=b'x')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('path', ['/api/detect', '/detect_letter', '/api/classify_landmarks',
+                                  '/api/calibrate_landmarks/A', '/api/calibrate_motion/J'])
+def test_invalid_profile_id_is_a_bad_request(client, path):
+    response = client.post(path, json={'image': 'data:,', 'landmarks': [], 'profile_id': '../x'})
+    assert response.status_code == 400
+    assert 'profile id' in response.get_json()['error']
+
+
+def test_valid_max_hands_still_reaches_the_handler(client):
+    # A bad image is the handler's own error, not a rejected request
+    response = client.post('/api/detect', json={'image': 'data:,', 'max_hands': '1'})
+    assert response.status_code == 200
+    assert response.get_json()['success'] is False
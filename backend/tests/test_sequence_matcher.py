@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from sequence_matcher import banded_dtw, envelope, lb_keogh, resample
+
+
+def reference_dtw(query, template, band):
+    """Plain O(n^2) DTW over squared distances, restricted to |i - j| <= band"""
+    length = len(query)
+    accumulated = np.full((length + 1, length + 1), np.inf)
+    accumulated[0, 0] = 0.0
+    for i in range(1, length + 1):
+        for j in range(max(1, i - band), min(length, i + band) + 1):
+            cost = float(((query[i - 1] - template[j - 1]) ** 2).sum())
+            accumulated[i, j] = cost + min(accumulated[i - 1, j], accumulated[i, j - 1],
+                                           accumulated[i - 1, j - 1])
+    return accumulated[length, length]
+
+
+def sequences(seed, length=24, dim=5):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(length, dim)), rng.normal(size=(length, dim))
+
+
+@pytest.mark.parametrize('band', [0, 1, 3, 8, 23])
+def test_banded_dtw_matches_reference(band):
+    query, template = sequences(band)
+    assert banded_dtw(query, template, band) == pytest.approx(reference_dtw(query, template, band))
+
+
+def test_banded_dtw_of_identical_sequences_is_zero():
+    query, _ = sequences(0)
+    assert banded_dtw(query, query, 4) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_banded_dtw_abandons_only_above_the_threshold():
+    query, template = sequences(1)
+    cost = banded_dtw(query, template, 4)
+    assert banded_dtw(query, template, 4, abandon_above=cost * 1.01) == pytest.approx(cost)
+    assert banded_dtw(query, template, 4, abandon_above=cost / 10) == np.inf
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_lb_keogh_is_a_lower_bound(seed):
+    query, template = sequences(seed)
+    for band in (1, 3, 6):
+        upper, lower = envelope(template, band)
+        assert lb_keogh(query, upper, lower) <= banded_dtw(query, template, band) + 1e-9
+
+
+def test_envelope_bounds_the_template():
+    _, template = sequences(2)
+    upper, lower = envelope(template, 2)
+    assert upper.shape == lower.shape == template.shape
+    assert (upper >= template).all() and (lower <= template).all()
+    assert lb_keogh(template, upper, lower) == 0.0
+
+
+def test_resample_keeps_the_ends():
+    sequence = np.arange(10)[:, np.newaxis]
+    resampled = resample(sequence, 4)
+    assert len(resampled) == 4
+    assert resampled[0, 0] == 0 and resampled[-1, 0] == 9
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+import sign_classifier
+from sign_classifier import SignClassifier
+
+
+def hands(count, seed):
+    return np.random.default_rng(seed).normal(size=(count, 21, 3)).astype(np.float32)
+
+
+@pytest.fixture
+def classifier(tmp_path, monkeypatch):
+    # No calibration files: the classifier starts empty, without a scaler
+    monkeypatch.chdir(tmp_path)
+    return SignClassifier()
+
+
+def test_burst_is_scaled_like_single_frames(classifier):
+    burst = hands(8, 0)
+    burst[3] = 0.0  # a frame without a usable hand
+    features, valid = classifier.preprocess_landmarks_batch(burst)
+    assert classifier.is_scaler_fitted
+    assert valid.tolist() == [True] * 3 + [False] + [True] * 4
+
+    for row, frame in enumerate(burst):
+        single = classifier.preprocess_landmarks(frame)
+        if valid[row]:
+            np.testing.assert_allclose(features[row], single, rtol=1e-5, atol=1e-6)
+        else:
+            assert single is None and not features[row].any()
+
+
+def test_scaler_is_fitted_on_the_whole_first_burst(classifier):
+    burst = hands(10, 1)
+    classifier.add_reference_samples('A', burst)
+    normalized, _ = classifier.normalize_landmarks_batch(burst)
+    mean, scale = classifier._scaler_params
+    np.testing.assert_allclose(mean, normalized.mean(axis=0), rtol=1e-5, atol=1e-6)
+    # The wrist is always at the origin; constant features keep a scale of 1
+    expected_scale = normalized.std(axis=0)
+    expected_scale[expected_scale == 0] = 1.0
+    np.testing.assert_allclose(scale, expected_scale, rtol=1e-5, atol=1e-6)
+
+
+def test_training_on_references_recovers_the_normalized_features(classifier, monkeypatch):
+    bursts = {'A': hands(6, 2), 'B': hands(6, 3)}
+    for label, burst in bursts.items():
+        classifier.add_reference_samples(label, burst)
+
+    trained_on = {}
+    fit = sign_classifier.fit_softmax_model
+
+    def spy(features, labels, **options):
+        trained_on['features'], trained_on['labels'] = features, list(labels)
+        return fit(features, labels, **options)
+
+    monkeypatch.setattr(sign_classifier, 'fit_softmax_model', spy)
+    classifier.train_model(epochs=5)
+
+    expected = np.concatenate([classifier.normalize_landmarks_batch(burst)[0] for burst in bursts.values()])
+    assert trained_on['labels'] == ['A'] * 6 + ['B'] * 6
+    np.testing.assert_allclose(trained_on['features'], expected, rtol=1e-4, atol=1e-5)
+    assert classifier.model.references == classifier.reference_digest
+
+
+def test_without_defaults_only_the_given_calibration_is_read_and_written(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shared = SignClassifier()
+    shared.add_reference_samples('A', hands(3, 0))
+    assert shared.save_references()
+    defaults = sorted(path.name for path in tmp_path.iterdir())
+    (tmp_path / 'default_asl_references.json').write_text('{"B": [[0.0]]}')
+
+    built = SignClassifier(reference_file='dataset.sbcal', use_defaults=False)
+    assert len(built.reference_labels) == 0
+    assert not built.is_scaler_fitted
+    assert not built.reset_to_default()
+
+    built.fit_scaler(built.normalize_landmarks_batch(hands(8, 1))[0])
+    built.add_reference_samples('C', hands(3, 2))
+    assert built.save_references()
+    assert not built.save_as_default()
+    written = sorted(path.name for path in tmp_path.iterdir())
+    assert written == sorted(defaults + ['dataset.sbcal', 'default_asl_references.json'])
+    assert SignClassifier().reference_labels.tolist() == ['A'] * 3
+
+
+def poses(count, seed, noise=0.05):
+    """count noisy takes of one hand pose"""
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(21, 3)).astype(np.float32) + rng.normal(0, noise, size=(count, 21, 3)).astype(np.float32)
+
+
+def test_reference_matrix_distances_match_each_sample(classifier):
+    for seed, label in enumerate('ABC'):
+        classifier.add_reference_samples(label, poses(4, seed))
+
+    for query in poses(3, 1, noise=0.2):
+        features = classifier.preprocess_landmarks(query)
+        expected = {label: min(np.linalg.norm(features - sample) for sample in samples)
+                    for label, samples in classifier.sign_references.items()}
+        ranked = classifier.rank_signs(query)
+        assert [label for label, _ in ranked] == sorted(expected, key=expected.get)
+        for label, distance in ranked:
+            assert distance == pytest.approx(expected[label], rel=1e-4, abs=1e-4)
+
+
+@pytest.mark.parametrize('engine', ['nearest', 'softmax'])
+def test_batch_recognition_matches_one_hand_at_a_time(tmp_path, monkeypatch, engine):
+    monkeypatch.chdir(tmp_path)
+    classifier = SignClassifier(engine=engine)
+    references = {label: poses(6, seed) for seed, label in enumerate('ABC')}
+    classifier.fit_scaler(classifier.normalize_landmarks_batch(np.concatenate(list(references.values())))[0])
+    for label, samples in references.items():
+        classifier.add_reference_samples(label, samples)
+    if engine == 'softmax':
+        classifier.train_model(epochs=50)
+        assert classifier.active_model is not None
+
+    batch = np.concatenate([poses(2, seed, noise=0.2) for seed in range(3)] + [hands(2, 9)])
+    batch[4] = 0.0  # a frame without a usable hand
+    signs, confidences = classifier.recognize_signs(batch)
+    assert len(signs) == len(confidences) == len(batch)
+    assert signs[:4] == ['A', 'A', 'B', 'B'] and signs[4] is None
+    for row, hand in enumerate(batch):
+        sign, confidence = classifier.recognize_sign(hand)
+        assert sign == signs[row]
+        assert confidence == pytest.approx(float(confidences[row]), rel=1e-5, abs=1e-6)
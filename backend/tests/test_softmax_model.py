@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from softmax_model import SoftmaxModel, calibration_error, fit_softmax_model, softmax
+
+
+def clusters(per_label=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = {'A': [0, 0, 0, 0], 'B': [4, 0, 0, 0], 'C': [0, 4, 0, 0]}
+    features = np.vstack([rng.normal(center, 0.5, size=(per_label, 4)) for center in centers.values()])
+    labels = np.repeat(list(centers), per_label)
+    return features, labels
+
+
+def test_softmax_rows_sum_to_one():
+    probabilities = softmax(np.array([[1.0, 2.0, 3.0], [1000.0, 1000.0, 0.0]]))
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0)
+    np.testing.assert_allclose(probabilities[1], [0.5, 0.5, 0.0], atol=1e-12)
+
+
+@pytest.mark.parametrize('hidden_units', [0, 16])
+def test_fit_separates_clusters(hidden_units):
+    features, labels = clusters()
+    model, report = fit_softmax_model(features, labels, hidden_units=hidden_units, epochs=300)
+    assert model.hidden_units == ([hidden_units] if hidden_units else [])
+    predicted = model.labels[model.predict_proba(features).argmax(axis=1)]
+    assert (predicted == labels).mean() > 0.95
+    assert report['validation_accuracy'] > 0.9 and report['calibrated']
+
+
+def test_fit_with_no_epochs():
+    features, labels = clusters(per_label=10)
+    model, report = fit_softmax_model(features, labels, epochs=0)
+    assert report['epochs'] == 0
+    assert model.predict_proba(features).shape == (len(features), 3)
+
+
+def test_fit_needs_two_labels():
+    with pytest.raises(ValueError):
+        fit_softmax_model(np.zeros((4, 2)), ['A'] * 4)
+
+
+def test_save_and_load(tmp_path):
+    features, labels = clusters(per_label=10)
+    model, _ = fit_softmax_model(features, labels, hidden_units=8, epochs=20)
+    model.references = 'abc123'
+    path = str(tmp_path / 'model.npz')
+    model.save(path)
+
+    loaded = SoftmaxModel.load(path)
+    assert list(loaded.labels) == list(model.labels)
+    assert loaded.temperature == pytest.approx(model.temperature)
+    assert loaded.references == 'abc123'
+    np.testing.assert_allclose(loaded.predict_proba(features), model.predict_proba(features), rtol=1e-6)
+
+
+def test_load_without_references(tmp_path):
+    model = SoftmaxModel(['A', 'B'], [(np.eye(2), np.zeros(2))])
+    path = str(tmp_path / 'model.npz')
+    model.save(path)
+    assert SoftmaxModel.load(path).references is None
+
+
+def test_calibration_error():
+    targets = np.array([0, 1, 0, 1])
+    confident = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 0.0], [0.0, 1.0]])
+    assert calibration_error(confident, targets) == pytest.approx(0.0)
+    wrong = confident[:, ::-1]
+    assert calibration_error(wrong, targets) == pytest.approx(1.0)
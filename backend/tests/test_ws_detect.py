@@ -0,0 +1,96 @@
+import json
+import threading
+
+import cv2
+import numpy as np
+import pytest
+from simple_websocket import Client, ConnectionClosed
+from werkzeug.serving import make_server
+
+import app as backend
+from detector_pool import DetectorPool
+
+
+class FakeDetector:
+    """Finds one hand in every frame"""
+
+    def __init__(self, max_num_hands=2):
+        self.frames = 0
+
+    def detect_all_landmarks(self, rgb_frame, mirror=True):
+        self.frames += 1
+        landmarks = np.random.default_rng(self.frames).normal(size=(1, 21, 3)).astype(np.float32)
+        return landmarks, ['Right']
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(backend, 'detector_pool',
+                        DetectorPool(max_size=1, checkout_timeout=0.2, factory=FakeDetector))
+    monkeypatch.setenv('INFERENCE_WORKERS', '0')
+    http = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    thread = threading.Thread(target=http.serve_forever, daemon=True)
+    thread.start()
+    yield f'ws://127.0.0.1:{http.server_port}/ws/detect'
+    http.shutdown()
+
+
+def frame_bytes(seed=0):
+    # Different frames each time, so the motion gate never skips one
+    frame = np.random.default_rng(seed).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    return cv2.imencode('.png', frame)[1].tobytes()
+
+
+def test_connection_holds_a_pooled_detector(server):
+    first = Client.connect(server)
+    try:
+        first.send(frame_bytes())
+        response = json.loads(first.receive(timeout=5))
+        assert response['frame'] == 1
+        assert backend.detector_pool.stats()['in_use'] == 1
+
+        # The pool's only detector belongs to the first connection
+        second = Client.connect(server)
+        refused = json.loads(second.receive(timeout=5))
+        assert not refused['success'] and 'busy' in refused['error']
+        with pytest.raises(ConnectionClosed):
+            second.receive(timeout=5)
+    finally:
+        first.close()
+
+
+class FakeWorkers:
+    """Stands in for InferenceWorkerPool, recording the client id of each frame"""
+
+    queue_depth = 0
+
+    def __init__(self):
+        self.client_ids = []
+
+    def detect_all_landmarks(self, rgb_frame, mirror=True, client_id=None, timeout=10.0, max_num_hands=2):
+        self.client_ids.append(client_id)
+        return FakeDetector().detect_all_landmarks(rgb_frame)
+
+
+def test_frames_go_to_the_inference_workers(server, monkeypatch):
+    workers = FakeWorkers()
+    monkeypatch.setattr(backend, 'get_inference_workers', lambda: workers)
+    clients = [Client.connect(server) for _ in range(2)]
+    try:
+        for seed, client in enumerate(clients * 2):
+            client.send(frame_bytes(seed))
+            assert json.loads(client.receive(timeout=5))['success']
+    finally:
+        for client in clients:
+            client.close()
+
+    # Each connection sends its frames under its own client id, and none holds a pooled detector
+    first, second = workers.client_ids[:2]
+    assert first != second and workers.client_ids == [first, second, first, second]
+    assert backend.detector_pool.stats()['size'] == 0
@@ -1,6 +1,9 @@
 import React, { useEffect, useState, useRef } from 'react';
 import { Button } from './ui/button';
 
+// How often frames are pushed over the detection stream
+const STREAM_FRAME_INTERVAL_MS = 100;
+
 interface CameraFeedProps {
   onDetection?: (letter: string, confidence: number) => void;
   className?: string;
@@ -11,6 +14,8 @@ export function CameraFeed({ onDetection, className = '' }: CameraFeedProps) {
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const [isStreaming, setIsStreaming] = useState(false);
   const [error, setError] = useState<string>('');
+  // Lets the backend hand this feed the same detector on every request
+  const clientId = useRef(Math.random().toString(36).slice(2));
 
   useEffect(() => {
     let stream: MediaStream | null = null;
@@ -88,6 +93,7 @@ export function CameraFeed({ onDetection, className = '' }: CameraFeedProps) {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'X-Client-Id': clientId.current,
         },
         body: JSON.stringify({ image: imageData }),
       });
@@ -108,13 +114,72 @@ export function CameraFeed({ onDetection, className = '' }: CameraFeedProps) {
   };
 
   useEffect(() => {
-    let interval: NodeJS.Timeout;
+    if (!isStreaming) return;
+
+    let interval: NodeJS.Timeout | undefined;
+    let socket: WebSocket | null = null;
+    let awaitingReply = false;
+
+    const startPolling = () => {
+      if (!interval) {
+        interval = setInterval(captureFrame, 1000); // Check every second
+      }
+    };
+
+    const sendFrame = () => {
+      const video = videoRef.current;
+      const canvas = canvasRef.current;
+      const context = canvas?.getContext('2d');
+      if (!socket || socket.readyState !== WebSocket.OPEN || awaitingReply || !video || !canvas || !context) return;
+
+      canvas.width = video.videoWidth;
+      canvas.height = video.videoHeight;
+      context.drawImage(video, 0, 0, canvas.width, canvas.height);
+
+      // Only keep one frame in flight so the server never falls behind
+      awaitingReply = true;
+      canvas.toBlob((blob) => {
+        if (blob && socket?.readyState === WebSocket.OPEN) {
+          socket.send(blob);
+        } else {
+          awaitingReply = false;
+        }
+      }, 'image/jpeg');
+    };
 
-    if (isStreaming) {
-      interval = setInterval(captureFrame, 1000); // Check every second
+    try {
+      // Stream frames over one persistent connection instead of polling
+      const url = new URL(`${process.env.NEXT_PUBLIC_API_URL ?? ''}/ws/detect`, window.location.href);
+      url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+      socket = new WebSocket(url.toString());
+
+      socket.onopen = () => {
+        interval = setInterval(sendFrame, STREAM_FRAME_INTERVAL_MS);
+      };
+      socket.onmessage = (event) => {
+        awaitingReply = false;
+        const data = JSON.parse(event.data);
+        if (data.success && onDetection) {
+          onDetection(data.letter, data.confidence);
+        }
+      };
+      socket.onclose = () => {
+        // Fall back to polling the HTTP endpoint
+        if (interval) clearInterval(interval);
+        interval = undefined;
+        socket = null;
+        startPolling();
+      };
+    } catch (err) {
+      console.error('Detection stream unavailable, polling instead:', err);
+      startPolling();
     }
 
     return () => {
+      if (socket) {
+        socket.onclose = null;
+        socket.close();
+      }
       if (interval) {
         clearInterval(interval);
       }